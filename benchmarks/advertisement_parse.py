@@ -0,0 +1,141 @@
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+'''Benchmarks reading site advertisements, on synthetic advertisements.
+Compares geni-lib's `pgad.Advertisement` (full document tree) against the streaming parser (`manifest.advertisement`), and against reading a stored snapshot (`adsnapshot`).
+Every measurement runs in a fresh process, so peak memory (max RSS) is not polluted by earlier runs.
+
+Usage (with the python2 interpreter used for GENI operations):
+    python2 benchmarks/advertisement_parse.py [--nodes 2000 10000] [--repeat 3]'''
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_py2dir = os.path.join(_root, 'metareserve_geni', 'internal', 'gni', 'py2')
+sys.path[:0] = [_py2dir, os.path.join(os.path.dirname(_py2dir), 'shared')]
+
+_node_template = '''  <node component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" component_name="ms{idx:05d}" component_id="urn:publicid:IDN+utah.cloudlab.us+node+ms{idx:05d}" exclusive="{exclusive}">
+    <hardware_type name="{hw_type}"><emulab:node_type type_slots="1"/></hardware_type>
+    <hardware_type name="pcvm"><emulab:node_type type_slots="100"/></hardware_type>
+    <sliver_type name="raw-pc"><disk_image name="urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD" os="Linux" version="20.04" description="standard image"/></sliver_type>
+    <sliver_type name="emulab-xen"/>
+    <available now="{available}"/>
+    <cloudlab:status>{status}</cloudlab:status>
+    <emulab:fd name="cpu-speed" weight="0.0"/>
+    <emulab:fd name="{hw_type}" weight="0.0"/>
+    <location country="US" latitude="40.750714" longitude="-111.893288"/>
+    <interface component_id="urn:publicid:IDN+utah.cloudlab.us+interface+ms{idx:05d}:eth0" role="control"/>
+    <interface component_id="urn:publicid:IDN+utah.cloudlab.us+interface+ms{idx:05d}:eth1" role="experimental"/>
+  </node>
+'''
+_hw_types = ['m400', 'm510', 'xl170', 'c6525-25g', 'd6515']
+
+
+def make_advertisement(num_nodes):
+    '''Returns a synthetic ProtoGENI advertisement RSpec with `num_nodes` nodes, as a string. Every third node is in use.'''
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<rspec xmlns="http://www.geni.net/resources/rspec/3" xmlns:emulab="http://www.protogeni.net/resources/rspec/ext/emulab/1" xmlns:cloudlab="http://www.protogeni.net/resources/rspec/ext/cloudlab/1" type="advertisement">\n']
+    parts.extend(_node_template.format(idx=idx, hw_type=_hw_types[idx%len(_hw_types)], exclusive='true' if idx%7 else 'false', available='false' if idx%3 == 0 else 'true', status='up') for idx in range(num_nodes))
+    parts.append('</rspec>\n')
+    return ''.join(parts)
+
+
+def parse_genilib(text, tmpdir):
+    '''geni-lib: full document tree, then an `AdNode` object per node.'''
+    import geni.rspec.pgad as pgad
+    free = dict()
+    for node in pgad.Advertisement(xml=text).nodes:
+        if node.available and node.exclusive:
+            for hw_type in node.hardware_types:
+                free[hw_type] = free.get(hw_type, 0) + 1
+    return free
+
+
+def parse_stream(text, tmpdir):
+    import adsnapshot
+    import manifest.advertisement as advertisement
+    return adsnapshot.index(advertisement.records(text, 'bench'))
+
+
+def parse_stream_store(text, tmpdir):
+    import capacity
+    return capacity.index(text, 'bench', tmpdir)
+
+
+def read_snapshot(text, tmpdir):
+    import adsnapshot
+    return adsnapshot.Snapshot(adsnapshot.path(tmpdir, 'bench')).index()
+
+
+_parsers = {'genilib': parse_genilib, 'stream': parse_stream, 'stream+store': parse_stream_store, 'snapshot': read_snapshot}
+
+
+def _measure(parser, num_nodes, repeat):
+    '''Runs in a child process. Prints "<best seconds> <max RSS growth in KiB>".'''
+    import adsnapshot
+    import manifest.advertisement as advertisement
+    text = make_advertisement(num_nodes)
+    expected = adsnapshot.index(advertisement.records(text, 'bench'))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        adsnapshot.write(tmpdir, 'bench', advertisement.records(text, 'bench'))
+        func = _parsers[parser]
+        func(make_advertisement(2) if parser != 'snapshot' else text, tmpdir) # Imports modules before we measure.
+        if parser == 'snapshot':
+            del text # Snapshot queries never see the XML.
+            text = None
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        best = None
+        for x in range(repeat):
+            start = time.time()
+            result = func(text, tmpdir)
+            elapsed = time.time() - start
+            assert result == expected, 'Parser "{}" counted {}, expected {}'.format(parser, result, expected)
+            best = elapsed if best == None else min(best, elapsed)
+        print('{} {}'.format(best, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def _sizes(num_nodes):
+    '''Returns the size in bytes of a synthetic advertisement, and of its snapshot.'''
+    import adsnapshot
+    import manifest.advertisement as advertisement
+    text = make_advertisement(num_nodes)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        adsnapshot.write(tmpdir, 'bench', advertisement.records(text, 'bench'))
+        return (len(text), os.path.getsize(adsnapshot.path(tmpdir, 'bench')))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark advertisement parsing.')
+    parser.add_argument('--nodes', metavar='amount', type=int, nargs='+', default=[2000, 10000], help='Advertisement sizes to benchmark (default=2000 10000).')
+    parser.add_argument('--repeat', metavar='amount', type=int, default=3, help='Number of runs per measurement. We report the fastest (default=3).')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _measure(args.child[0], int(args.child[1]), args.repeat)
+        return
+
+    print('{:>7} {:>10} {:>13} {:>10} {:>12}'.format('nodes', 'XML KiB', 'parser', 'seconds', 'peak KiB'))
+    for num_nodes in args.nodes:
+        xml_size, snapshot_size = _sizes(num_nodes)
+        for name in sorted(_parsers):
+            try:
+                out = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--repeat', str(args.repeat), '--child', name, str(num_nodes)], stderr=subprocess.STDOUT)
+                seconds, memory = out.decode('utf-8').split()[-2:]
+                print('{:>7} {:>10} {:>13} {:>10.3f} {:>12}'.format(num_nodes, xml_size//1024, name, float(seconds), memory))
+            except subprocess.CalledProcessError as e:
+                print('{:>7} {:>10} {:>13} failed: {}'.format(num_nodes, xml_size//1024, name, e.output.decode('utf-8').strip().split('\n')[-1]))
+        print('{:>7} snapshot size: {} KiB'.format(num_nodes, snapshot_size//1024))
+
+
+if __name__ == '__main__':
+    main()
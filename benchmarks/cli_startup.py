@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+'''Benchmarks CLI startup: import time of `geni-reserve` for common invocations, measured with `python -X importtime`.
+Also guards against regressions: every scenario lists modules it must not import (because only the selected subcommand's dependencies should load).
+Exits with status 1 if a scenario imports a forbidden module, or (with "--budget-ms") takes longer than the budget.
+
+Usage (with the python3 interpreter geni-reserve runs on):
+    python3 benchmarks/cli_startup.py [--repeat 5] [--budget-ms 150] [--python2 python2]'''
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_py2dir = os.path.join(_root, 'metareserve_geni', 'internal', 'gni', 'py2')
+
+# (arguments, modules which must not be imported). Help output stops before any command runs, so no GENI calls are made.
+_scenarios = [
+    (['-h'], ['metareserve', 'asyncio', 'sqlite3', 'internal.gni.py2bridge', 'cli.allocate', 'cli.batch', 'cli.capacity', 'cli.deallocate', 'cli.doctor', 'cli.listing', 'cli.renewd', 'cli.resize']),
+    (['list', '-h'], ['cli.allocate', 'cli.batch', 'cli.capacity', 'cli.deallocate', 'cli.doctor', 'cli.renewd', 'cli.resize', 'internal.gni.scheduler', 'internal.util.ui']),
+    (['allocate', '-h'], ['cli.batch', 'cli.deallocate', 'cli.doctor', 'cli.listing', 'cli.renewd', 'cli.resize']),
+]
+
+# Modules the python2 CLI must not import to handle "list".
+_py2_list_forbidden = ['allocate', 'geni.rspec.pg', 'geni.aggregate.cloudlab']
+
+_bootstrap = '''import sys
+sys.path.insert(0, {root!r})
+sys.argv = ['geni-reserve'] + {args!r}
+from metareserve_geni.cli import entrypoint
+try:
+    entrypoint.main()
+except SystemExit:
+    pass
+'''
+
+
+def _parse_importtime(output):
+    '''Parses "-X importtime" output.
+    Returns:
+        (`int`, `set(str)`): Total import time in microseconds (sum of "self" times), and names of all imported modules.'''
+    total = 0
+    modules = set()
+    for line in output.split('\n'):
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        total += int(self_us)
+        modules.add(name.strip())
+    return (total, modules)
+
+
+def measure(args, repeat):
+    '''Starts the CLI `repeat` times with given arguments.
+    Returns:
+        (`int`, `set(str)`): Median total import time in microseconds, and names of all imported modules.'''
+    totals = []
+    modules = set()
+    for x in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', _bootstrap.format(root=_root, args=args)], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        total, modules = _parse_importtime(process.stderr)
+        totals.append(total)
+    return (sorted(totals)[len(totals)//2], modules)
+
+
+def check_py2(executable):
+    '''Builds the python2 CLI parser for "list" and reports which forbidden modules got imported. python2 has no "-X importtime", so we inspect `sys.modules` instead.
+    Returns:
+        list of forbidden modules that got imported, or `None` if the python2 CLI could not be loaded (e.g. geni-lib is missing).'''
+    code = '''import argparse, json, sys
+sys.path[:0] = [{py2dir!r}, {shared!r}]
+import cli
+cli.subparser(argparse.ArgumentParser(), ['list'])
+print(json.dumps(sorted(sys.modules)))
+'''.format(py2dir=_py2dir, shared=os.path.join(os.path.dirname(_py2dir), 'shared'))
+    try:
+        out = subprocess.check_output([executable, '-c', code], stderr=subprocess.STDOUT, universal_newlines=True)
+        modules = json.loads(out.strip().split('\n')[-1])
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        return None
+    return [x for x in _py2_list_forbidden if x in modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark geni-reserve startup.')
+    parser.add_argument('--repeat', metavar='amount', type=int, default=5, help='Number of runs per scenario. We report the median (default=5).')
+    parser.add_argument('--budget-ms', dest='budget_ms', metavar='milliseconds', type=float, default=None, help='If set, fails when the median import time of a scenario exceeds this.')
+    parser.add_argument('--python2', metavar='executable', default=None, help='If set, also checks that the python2 CLI loads no allocation modules for "list".')
+    args = parser.parse_args()
+
+    ok = True
+    print('{:>16} {:>10} {:>8}  {}'.format('command', 'import ms', 'modules', 'forbidden imports'))
+    for cli_args, forbidden in _scenarios:
+        total, modules = measure(cli_args, args.repeat)
+        found = [x for x in forbidden if x in modules]
+        over_budget = args.budget_ms != None and total/1000.0 > args.budget_ms
+        ok = ok and not found and not over_budget
+        print('{:>16} {:>10.1f} {:>8}  {}{}'.format(' '.join(cli_args), total/1000.0, len(modules), ', '.join(found) or '-', ' (over budget)' if over_budget else ''))
+    if args.python2:
+        found = check_py2(args.python2)
+        if found == None:
+            print('python2 "list": skipped, could not load the python2 CLI with {}.'.format(args.python2))
+        else:
+            ok = ok and not found
+            print('python2 "list": forbidden imports: {}'.format(', '.join(found) or '-'))
+    return ok
+
+
+if __name__ == '__main__':
+    exit(0 if main() else 1)
@@ -0,0 +1,105 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+'''Benchmarks manifest parsing on synthetic manifests.
+Compares the streaming parser (`manifest.stream`) against the previous approach (`xmltodict` to nested dicts, then walking the dicts per node).
+Every measurement runs in a fresh process, so peak memory (max RSS) is not polluted by earlier runs.
+
+Usage (with the python2 interpreter used for GENI operations, or python3):
+    python2 benchmarks/manifest_parse.py [--nodes 1000 5000] [--repeat 3]'''
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_py2dir = os.path.join(_root, 'metareserve_geni', 'internal', 'gni', 'py2')
+sys.path[:0] = [_py2dir, os.path.join(os.path.dirname(_py2dir), 'shared')]
+
+_node_template = '''  <node client_id="node{idx}" component_id="urn:publicid:IDN+utah.cloudlab.us+node+ms{idx:04d}" component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" exclusive="true" sliver_id="urn:publicid:IDN+utah.cloudlab.us+sliver+{idx}">
+    <sliver_type name="raw-pc"><disk_image name="urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD"/></sliver_type>
+    <hardware_type name="m510"/>
+    <interface client_id="node{idx}:if0" component_id="urn:publicid:IDN+utah.cloudlab.us+interface+ms{idx:04d}:eth1" sliver_id="urn:publicid:IDN+utah.cloudlab.us+sliver+{idx}1" mac_address="0123456789ab">
+      <ip address="10.{hi}.{lo}.1" type="ipv4" netmask="255.0.0.0"/>
+    </interface>
+    <services><login authentication="ssh-keys" hostname="ms{idx:04d}.utah.cloudlab.us" port="22" username="someuser"/></services>
+    <emulab:vnode name="ms{idx:04d}" hardware_type="m510"/>
+    <host name="node{idx}.slice.project.utah.cloudlab.us" ipv4="128.110.{hi}.{lo}"/>
+  </node>
+'''
+
+
+def make_manifest(num_nodes):
+    '''Returns a synthetic ProtoGENI manifest RSpec with `num_nodes` nodes in one LAN, as a string.'''
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<rspec xmlns="http://www.geni.net/resources/rspec/3" xmlns:emulab="http://www.protogeni.net/resources/rspec/ext/emulab/1" type="manifest" expires="2030-01-01T12:00:00Z">\n']
+    parts.extend(_node_template.format(idx=idx, hi=idx//250, lo=idx%250+1) for idx in range(num_nodes))
+    parts.append('  <link client_id="lan0">\n')
+    parts.extend('    <interface_ref client_id="node{}:if0"/>\n'.format(idx) for idx in range(num_nodes))
+    parts.append('  </link>\n</rspec>\n')
+    return ''.join(parts)
+
+
+def parse_legacy(text):
+    '''Previous implementation: full dict tree, walked several times per node.'''
+    import xmltodict
+    from connectinfo import RawConnectInfo
+    data = xmltodict.parse(text)
+    nodes = data['rspec']['node']
+    return data, [RawConnectInfo(
+        str(nodes[idx]['@client_id']),
+        str(nodes[idx]['services']['login']['@username']),
+        str(nodes[idx]['interface']['ip']['@address']),
+        str(nodes[idx]['host']['@ipv4']),
+        str(nodes[idx]['services']['login']['@port'])) for idx in range(len(nodes))]
+
+
+def parse_stream(text):
+    from manifest.manifest import Manifest
+    manifest = Manifest(text)
+    return manifest, manifest.get_connect_info()
+
+
+_parsers = {'legacy': parse_legacy, 'stream': parse_stream}
+
+
+def _measure(parser, num_nodes, repeat):
+    '''Runs in a child process. Prints "<best seconds> <max RSS growth in KiB>".'''
+    text = make_manifest(num_nodes)
+    func = _parsers[parser]
+    func(make_manifest(2)) # Imports modules before we measure.
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best = None
+    for x in range(repeat):
+        start = time.time()
+        result = func(text)
+        elapsed = time.time() - start
+        assert len(result[1]) == num_nodes
+        del result
+        best = elapsed if best == None else min(best, elapsed)
+    print('{} {}'.format(best, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark manifest parsing.')
+    parser.add_argument('--nodes', metavar='amount', type=int, nargs='+', default=[1000, 5000], help='Manifest sizes to benchmark (default=1000 5000).')
+    parser.add_argument('--repeat', metavar='amount', type=int, default=3, help='Number of runs per measurement. We report the fastest (default=3).')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _measure(args.child[0], int(args.child[1]), args.repeat)
+        return
+
+    print('{:>7} {:>8} {:>10} {:>12}'.format('nodes', 'parser', 'seconds', 'peak KiB'))
+    for num_nodes in args.nodes:
+        for name in sorted(_parsers):
+            try:
+                out = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--repeat', str(args.repeat), '--child', name, str(num_nodes)], stderr=subprocess.STDOUT)
+                seconds, memory = out.decode('utf-8').split()[-2:]
+                print('{:>7} {:>8} {:>10.3f} {:>12}'.format(num_nodes, name, float(seconds), memory))
+            except subprocess.CalledProcessError as e:
+                print('{:>7} {:>8} failed: {}'.format(num_nodes, name, e.output.decode('utf-8').strip().split('\n')[-1]))
+
+
+if __name__ == '__main__':
+    main()
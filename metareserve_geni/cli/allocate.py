@@ -1,12 +1,17 @@
 import argparse
 import datetime
 
+import internal.gni.capacity as capacity
+import internal.gni.placement as placement
 import internal.gni.py2bridge as py2bridge
+import internal.gni.scheduler as scheduler
+from internal.gni.shared.topology import TopologyOptions
 from internal.util.printer import *
 import internal.util.fs as fs
 import internal.util.location as loc
+import internal.util.retryargs as retryargs
 import internal.util.ui as ui
-from reservation import GENINode, GENIReservationProfile, GENIReservationRequest
+from reservation import GENINode, GENINodeRange, GENIReservationProfile, GENIReservationRequest, GENITimeSlotReservationRequest
 
 
 '''CLI module to start a cluster.'''
@@ -36,6 +41,12 @@ def build_profile_interactive(node_amount):
     cached_hwtype = None
     cached_image = 'urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD'
     picked_names = []
+    if node_amount > 1 and ui.ask_bool('Use the same hardware type and image for all nodes? [N]:', empty_ok=True):
+        prefix = _cached(ui.ask_string('\tname prefix (lowercase) [node]:', empty_ok=True), 'node').lower()
+        cached_hwtype = ui.ask_string('\thwtype:')
+        cached_image = _cached(ui.ask_string('\timage [{}]:'.format(cached_image), empty_ok=True), cached_image)
+        profile.add(GENINodeRange('{}[0-{}]'.format(prefix, node_amount-1), cached_hwtype, cached_image))
+        node_amount = 0 # All nodes are in the profile now.
     for idx in range(node_amount):
         print('Processing node {}/{}'.format(idx+1, node_amount))
         
@@ -73,24 +84,174 @@ def build_profile_interactive(node_amount):
     return profile
 
 
-def check_and_allocate(time_alloc, node_amount, location, slicename, conf):
+def clamp_time(time_alloc):
+    '''Returns given allocation time in minutes, lowered to the maximum GENI allows if needed.'''
     if not _check_time(time_alloc):
         printw('''Provided time "{}" is too far away in the future. Max allocation time is 7199 minutes.
-To hold a reservation for longer, periodically rerun this command to renew the reservation.
+To hold a reservation for longer, run `geni-reserve renewd`, which renews reservations before they expire.
 Set allocation time to 7199'''.format(time_alloc))
-        time_alloc = 7199
+        return 7199
+    return time_alloc
+
+
+def load_profile(conf):
+    '''Loads a stored profile.
+    Args:
+        conf (str): Name of the profile. The ".cfg" extension is optional.
+
+    Returns:
+        `GENIReservationProfile` on success, `None` if no such profile exists.'''
+    if not conf.endswith('.cfg'):
+        conf += '.cfg'
+    if not fs.isfile(loc.profiledir(), conf):
+        printe('Profile config named "{}" does not exist.'.format(conf))
+        return None
+    with open(fs.join(loc.profiledir(), conf), 'r') as f:
+        try:
+            return GENIReservationProfile.from_string(''.join(f.readlines()))
+        except (TypeError, ValueError) as e:
+            printe('Malformed profile config "{}": {}'.format(conf, e))
+            return None
+
+
+def parse_time(string):
+    '''Parses a local time for argparse. Accepts "YYYY-mm-ddTHH:MM" and "YYYY-mm-dd HH:MM".'''
+    for time_format in ('%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.datetime.strptime(string, time_format)
+        except ValueError as e:
+            pass
+    raise argparse.ArgumentTypeError('Cannot parse time "{}". Use format "YYYY-mm-ddTHH:MM".'.format(string))
+
+
+def _wait_for_slot(reservation_request):
+    '''Waits until it is time to request the sliver for a time-slot reservation.
+    Returns:
+        Sliver expiration time in minutes from now on success, `None` if the slot cannot be planned.'''
+    try:
+        schedule = scheduler.plan(reservation_request)
+    except ValueError as e:
+        printe(str(e))
+        return None
+    print('Time slot schedule: {}.'.format(schedule))
+    if schedule.submit > datetime.datetime.now():
+        print('Waiting until {} to request nodes...'.format(schedule.submit.strftime('%Y-%m-%d %H:%M')))
+        scheduler.sleep_until(schedule.submit)
+    expiration_date = schedule.expiration()
+    if expiration_date < schedule.end:
+        printw('GENI lets slivers expire at most {} minutes away. Nodes expire at {}, before the slot ends. Run `geni-reserve renewd --until <slot end>` to renew the reservation before then, or reserve with `GENIReservationInterface`, which renews automatically.'.format(scheduler.max_expiration, expiration_date))
+    return scheduler.minutes_until(expiration_date)
+
+
+def _pick_locations(profile, location, hedge=None, pick=None):
+    '''Checks which candidate locations advertise enough available nodes for given profile.
+    Args:
+        profile (GENIReservationProfile): Nodes we want to allocate.
+        location (str): Preferred location.
+        hedge (optional list(str)): Additional candidate locations to request slivers at simultaneously.
+        pick (optional list(str)): Fallback locations to use when `location` lacks nodes.
+
+    Returns:
+        (`str`, `list(str)`): Location to allocate at and remaining hedge locations, or (`None`, `None`) if no candidate location has enough available nodes.'''
+    candidates = [location]+[x for x in (hedge or pick or []) if x != location]
+    usable = capacity.feasible(profile, candidates)
+    if not usable:
+        printe('No location has enough available nodes{}.'.format(' (checked {})'.format(', '.join(candidates)) if len(candidates) > 1 else ''))
+        return (None, None)
+    if usable[0] != location:
+        print('Location "{}" lacks nodes. Allocating at location "{}" instead.'.format(location, usable[0]))
+    return (usable[0], usable[1:] if hedge else None)
+
+
+def _quorum_printer():
+    '''Returns an event callback (see `py2bridge.allocate`) printing the ready nodes as soon as a quorum of nodes is ready.'''
+    state = {'expect_manifest': False, 'printing': False}
+    def _print(event):
+        if event['type'] == 'quorum':
+            print('{} nodes ready, {} pending ({}). Ready nodes:'.format(len(event['ready']), len(event['pending']), ', '.join(event['pending'])))
+            state['expect_manifest'] = True
+        elif event['type'] == 'manifest':
+            state['printing'] = state['expect_manifest']
+            if state['printing']:
+                print('node_id,node_name,ip_local,ip_public,port,extra_info')
+            state['expect_manifest'] = False
+        elif event['type'] == 'node' and state['printing']:
+            print(str(event['node']))
+    return _print
+
+
+def _print_settled(nodes):
+    '''Prints the cluster once `py2bridge.settle` handled the nodes that were not ready at quorum.'''
+    if not nodes:
+        printe('Could not handle the remaining nodes. Use "geni-reserve list" to see the current cluster.')
+        return
+    print('All remaining nodes handled. Ready nodes:')
+    print('node_id,node_name,ip_local,ip_public,port,extra_info')
+    for x in nodes:
+        print(str(x))
+
+
+def _allocate_placed(time_alloc, slicename, profile, locations, topology=None, spares=0, max_sites=None):
+    '''Splits a profile across sites with enough available nodes (see `placement.plan`), and allocates a sliver at every picked site.
+    Args:
+        locations (list(str)): Candidate sites, in order of preference.
+
+    Returns:
+        `True` on success, `False` otherwise.'''
+    sites = capacity.get(locations)
+    for location, site in sites.items():
+        if not site:
+            printw('Could not check availability at {}. Not placing nodes there.'.format(location))
+    chosen = placement.plan(profile, sites, max_sites, spares=spares)
+    if not chosen:
+        printe('No combination of {}sites has enough available nodes (checked {}).'.format('at most {} '.format(max_sites) if max_sites else '', ', '.join(locations)))
+        return False
+    print('Placement: {}.'.format(chosen))
+    reservation = placement.allocate(clamp_time(time_alloc), chosen, slicename, topology, spares)
+    if not reservation:
+        printe('There was an error during allocation.')
+        return False
+    print('node_id,node_name,ip_local,ip_public,port,extra_info')
+    for x in reservation.nodes:
+        print(str(x))
+    print('Allocated at {}. Use these locations to list or deallocate the reservation.'.format(', '.join(chosen.locations)))
+    prints('Reservation success')
+    return True
+
+
+def check_and_allocate(time_alloc, node_amount, location, slicename, conf, hedge=None, hedge_delay=0, topology=None, start=None, end=None, check_capacity=False, pick=None, min_ready=None, replace_failed=False, spares=0, place=None, max_sites=None):
     if conf:
-        if not conf.endswith('.cfg'):
-            conf += '.cfg'
-        if fs.isfile(loc.profiledir(), conf):
-            with open(fs.join(loc.profiledir(), conf), 'r') as f:
-                reservation_request = GENIReservationRequest(time_alloc, location, slicename, GENIReservationProfile.from_string(''.join(f.readlines())))
-        else:
-            printe('Profile config named "{}" does not exist.'.format(conf))
+        profile = load_profile(conf)
+        if not profile:
             return False
     else:
-        reservation_request = GENIReservationRequest(time_alloc, location, slicename, build_profile_interactive(node_amount))
-    nodes = py2bridge.allocate(time_alloc, reservation_request)
+        profile = build_profile_interactive(node_amount)
+    if min_ready and min_ready > len(profile):
+        printe('Cannot wait for {} ready nodes: profile has only {} nodes.'.format(min_ready, len(profile)))
+        return False
+    if place != None:
+        return _allocate_placed(time_alloc, slicename, profile, [location]+[x for x in (place or capacity.known_locations) if x != location], topology, spares, max_sites)
+    if check_capacity or pick:
+        if start:
+            printw('Checking currently available nodes. Availability may differ when the time slot starts.')
+        location, hedge = _pick_locations(profile, location, hedge, pick)
+        if not location:
+            return False
+    if start:
+        reservation_request = GENITimeSlotReservationRequest(start, end or start+datetime.timedelta(minutes=time_alloc), location, slicename, profile, topology=topology, spares=spares)
+        time_alloc = _wait_for_slot(reservation_request)
+        if not time_alloc:
+            return False
+    else:
+        time_alloc = clamp_time(time_alloc)
+        reservation_request = GENIReservationRequest(time_alloc, location, slicename, profile, topology=topology, spares=spares)
+    if hedge:
+        candidates = [location]+[x for x in hedge if x != location]
+        location, nodes = py2bridge.allocate_hedged(time_alloc, reservation_request, candidates, stagger=hedge_delay)
+        if location:
+            print('Allocated at location "{}". Use this location to list or deallocate the reservation.'.format(location))
+    else:
+        nodes = py2bridge.allocate(time_alloc, reservation_request, callback=_quorum_printer() if spares else None, min_ready=min_ready, replace_failed=replace_failed, settled=_print_settled)
 
     if not nodes:
         printe('There was an error during allocation.')
@@ -98,7 +259,12 @@ Set allocation time to 7199'''.format(time_alloc))
     print('node_id,node_name,ip_local,ip_public,port,extra_info')
     for x in nodes:
         print(str(x))
+    if start:
+        ahead = (start - datetime.datetime.now()).total_seconds()
+        print('Nodes ready {:.0f} minutes {} the slot starts.'.format(abs(ahead)/60, 'before' if ahead >= 0 else 'after'))
     prints('Reservation success')
+    if min_ready and not spares and len(nodes) < len(profile):
+        print('Waiting for {} remaining node(s) in the background. Nodes that do not get ready are {}.'.format(len(profile)-len(nodes), 'replaced' if replace_failed else 'released'))
     return True
 
 
@@ -131,8 +297,29 @@ def subparser(subparsers):
     allocateparser.add_argument('-l', '--location', metavar='location', nargs='?', default='cl-utah', const='cl-utah', help='Location of allocation (default="cl-utah", which is CloudLab, Utah site)')
     allocateparser.add_argument('-n', '--name', metavar='name', default='metareserve', help='Name for slice on US resource (default="metareserve")')
 
-    allocateparser.add_argument('-c', '--conf', metavar='name', default=None, help='Read the request information from a named profile instead of providing it manually. Replaces the need for `amount` option.')
+    allocateparser.add_argument('--hedge', metavar='location', nargs='+', default=None, help='Additional candidate locations. Requests slivers at "--location" and all given locations, keeps the first one to get ready, and deallocates the others.')
+    allocateparser.add_argument('--hedge-delay', dest='hedge_delay', metavar='seconds', default=0, type=int, help='With "--hedge", number of seconds to wait before requesting at each next candidate location (default=0, request everywhere at once).')
+
+    allocateparser.add_argument('-c', '--conf', metavar='name', default=None, help='Read the request information from a named profile instead of providing it manually. Replaces the need for `amount` option. Profiles have one "name|hw_type|image" line per node, or per range of nodes (e.g. "node[0-199]|c6525-25g|<image>").')
     allocateparser.add_argument('-cl', '--conf-list', dest='conf_list', nargs='?', default='', const='_', help='Print stored reservation profiles. If a name is given, prints given profile.')
+    slotgroup = allocateparser.add_argument_group('time slot options')
+    slotgroup.add_argument('--start', metavar='time', default=None, type=parse_time, help='Local time ("YYYY-mm-ddTHH:MM") at which nodes must be ready. We request nodes ahead of time, based on earlier observed boot times, and wait until then.')
+    slotgroup.add_argument('--end', metavar='time', default=None, type=parse_time, help='With "--start", local time ("YYYY-mm-ddTHH:MM") at which nodes expire (default: "--time" minutes after "--start").')
+    topologygroup = allocateparser.add_argument_group('topology options')
+    topologygroup.add_argument('--lan-size', dest='lan_size', metavar='nodes', default=None, type=int, help='Split the experiment network into LANs of at most this many nodes (default: one LAN for all nodes).')
+    topologygroup.add_argument('--lan-group', dest='lan_group', choices=TopologyOptions.group_options, default=None, help='Build one LAN per hardware type ("hw_type"), or per node name without trailing digits ("prefix").')
+    topologygroup.add_argument('--bandwidth', metavar='kbps', default=None, type=int, help='Bandwidth hint for every LAN interface, in kbps.')
+    topologygroup.add_argument('--best-effort', dest='best_effort', help='Allow mapping LANs over oversubscribed links. Helps to get large LANs mapped.', action='store_true')
+    capacitygroup = allocateparser.add_argument_group('capacity options')
+    capacitygroup.add_argument('--check-capacity', dest='check_capacity', help='Before allocating, check whether "--location" advertises enough available nodes, and fail fast if not. With "--hedge", only requests slivers at candidate locations with enough available nodes.', action='store_true')
+    capacitygroup.add_argument('--place', metavar='location', nargs='*', default=None, help='Split the profile across "--location" and given locations (default: all known sites), using the fewest sites with enough available nodes, then the fastest expected boot times. Requests a sliver at every picked site at once, in the same slice.')
+    capacitygroup.add_argument('--max-sites', dest='max_sites', metavar='amount', default=None, type=int, help='With "--place", use at most this many sites.')
+    capacitygroup.add_argument('--pick-location', dest='pick_location', metavar='location', nargs='+', default=None, help='Fallback locations. Allocates at the first of "--location" and given locations that advertises enough available nodes.')
+    quorumgroup = allocateparser.add_argument_group('quorum options')
+    quorumgroup.add_argument('--min-ready', dest='min_ready', metavar='nodes', default=None, type=int, help='Print connect info for ready nodes as soon as this many nodes are ready, instead of waiting for all nodes. Remaining nodes get more time in the background. Nodes that fail, or are still not ready by then, are released.')
+    quorumgroup.add_argument('--spare', metavar='nodes', default=0, type=int, help='Over-provision: request this many extra nodes for every group of nodes sharing hardware type and image, keep the first nodes to get ready, and release the slowest. Spares that stand in for slow nodes are listed under the names of the nodes they replace.')
+    quorumgroup.add_argument('--replace-failed', dest='replace_failed', help='With "--min-ready", replace nodes that do not get ready with fresh nodes, instead of releasing them.', action='store_true')
+    retryargs.add_arguments(allocateparser)
     # subsubparsers = allocateparser.add_subparsers(help='Sub2commands', dest='subcommand')
     return [allocateparser]
 
@@ -150,4 +337,41 @@ def deploy(parsers, args):
     if args.conf_list:
         print_profiles(args.conf_list)
         return True
-    return check_and_allocate(args.time, args.amount, args.location, args.name, args.conf)
\ No newline at end of file
+    if not retryargs.apply(args):
+        return False
+    if args.end and not args.start:
+        printe('"--end" requires "--start".')
+        return False
+    if args.end and args.end <= args.start:
+        printe('Time slot must end after it starts.')
+        return False
+    if args.min_ready != None and args.min_ready < 1:
+        printe('"--min-ready" must be at least 1.')
+        return False
+    if args.replace_failed and not args.min_ready:
+        printe('"--replace-failed" requires "--min-ready".')
+        return False
+    if args.spare < 0:
+        printe('"--spare" cannot be negative.')
+        return False
+    if args.spare and args.min_ready:
+        printe('Cannot combine "--spare" with "--min-ready".')
+        return False
+    if (args.min_ready or args.spare) and args.hedge:
+        printe('Cannot combine "--min-ready" or "--spare" with "--hedge".')
+        return False
+    if args.place != None and (args.hedge or args.pick_location or args.min_ready or args.start):
+        printe('Cannot combine "--place" with "--hedge", "--pick-location", "--min-ready" or "--start".')
+        return False
+    if args.max_sites != None and (args.place == None or args.max_sites < 1):
+        printe('"--max-sites" requires "--place", and must be at least 1.')
+        return False
+    if args.pick_location and args.hedge:
+        printe('Cannot combine "--pick-location" with "--hedge". Use "--hedge" with "--check-capacity" instead.')
+        return False
+    try:
+        topology = TopologyOptions(args.lan_size, args.lan_group, args.bandwidth, args.best_effort)
+    except ValueError as e:
+        printe('Invalid topology options: {}'.format(e))
+        return False
+    return check_and_allocate(args.time, args.amount, args.location, args.name, args.conf, args.hedge, args.hedge_delay, topology, args.start, args.end, args.check_capacity, args.pick_location, args.min_ready, args.replace_failed, args.spare, args.place, args.max_sites)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import concurrent.futures
+import time
+
+import cli.allocate as allocate
+import internal.gni.py2bridge as py2bridge
+import internal.util.fs as fs
+from internal.util.printer import *
+import internal.util.retryargs as retryargs
+from reservation import GENIReservationRequest
+
+
+'''CLI module to allocate many clusters at once.
+A batch file contains one entry per line, formatted as "slicename|location|profile|minutes".
+"profile" is the name of a stored profile (see `geni-reserve allocate -cl`). Empty lines and lines starting with "#" are ignored.'''
+
+
+class BatchEntry(object):
+    '''Trivial object holding a single batch allocation.'''
+    def __init__(self, slicename, location, profile, duration_minutes):
+        self.slicename = slicename
+        self.location = location
+        self.profile = profile
+        self.duration_minutes = int(duration_minutes)
+
+    @staticmethod
+    def from_string(string):
+        '''Constructs a `BatchEntry` from a string.'''
+        return BatchEntry(*(x.strip() for x in string.split('|')))
+
+
+def read_batch(path):
+    '''Reads a batch file.
+    Returns:
+        list of `BatchEntry` on success, `None` on failure.'''
+    if not fs.isfile(path):
+        printe('Batch file "{}" does not exist.'.format(path))
+        return None
+    entries = []
+    with open(path, 'r') as f:
+        for idx, line in enumerate(f):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                entries.append(BatchEntry.from_string(line))
+            except (TypeError, ValueError) as e:
+                printe('Malformed batch entry on line {}: "{}" (expected "slicename|location|profile|minutes").'.format(idx+1, line))
+                return None
+    if len(set(x.slicename for x in entries)) != len(entries):
+        printe('Batch entries must have unique slicenames.')
+        return None
+    return entries
+
+
+def _allocate_entry(entry):
+    '''Allocates a single batch entry. Called from a pool thread.
+    Returns:
+        (`list(metareserve.Node)` or `None`, `float`): Allocated nodes (or `None` on failure), and the number of seconds it took.'''
+    start = time.time()
+    profile = allocate.load_profile(entry.profile)
+    if not profile:
+        return (None, time.time()-start)
+    time_alloc = allocate.clamp_time(entry.duration_minutes)
+    reservation_request = GENIReservationRequest(time_alloc, entry.location, entry.slicename, profile)
+    return (py2bridge.allocate(time_alloc, reservation_request), time.time()-start)
+
+
+def batch_allocate(path, jobs):
+    '''Allocates all entries of a batch file, at most `jobs` at the same time. All allocations share one python2 worker.
+    Prints a line for every entry as soon as it finishes, and a summary table at the end.
+
+    Returns:
+        `True` if all entries were allocated, `False` otherwise.'''
+    entries = read_batch(path)
+    if entries == None:
+        return False
+    print('Allocating {} entries, {} at a time...'.format(len(entries), jobs))
+    results = dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_allocate_entry, x): x for x in entries}
+        for future in concurrent.futures.as_completed(futures):
+            entry = futures[future]
+            try:
+                nodes, elapsed = future.result()
+            except Exception as e:
+                printe('[{}] Allocation raised {}: {}'.format(entry.slicename, type(e).__name__, e))
+                nodes, elapsed = None, 0.0
+            results[entry.slicename] = (nodes, elapsed)
+            if nodes:
+                prints('[{}] Allocated {} nodes at {} ({:.0f}s)'.format(entry.slicename, len(nodes), entry.location, elapsed))
+                print('node_id,node_name,ip_local,ip_public,port,extra_info')
+                for x in nodes:
+                    print(str(x))
+            else:
+                printe('[{}] Allocation at {} failed ({:.0f}s)'.format(entry.slicename, entry.location, elapsed))
+
+    print('')
+    print('{:<30} {:<16} {:<20} {:>6} {:>8}  {}'.format('slicename', 'location', 'profile', 'nodes', 'seconds', 'status'))
+    for entry in entries:
+        nodes, elapsed = results[entry.slicename]
+        status = format('OK', Color.GRN) if nodes else format('FAILED', Color.RED)
+        print('{:<30} {:<16} {:<20} {:>6} {:>8.0f}  {}'.format(entry.slicename, entry.location, entry.profile, len(nodes) if nodes else 0, elapsed, status))
+    num_success = sum(1 for nodes, _ in results.values() if nodes)
+    if num_success == len(entries):
+        prints('All {} batch entries allocated'.format(len(entries)))
+        return True
+    printe('{}/{} batch entries failed'.format(len(entries)-num_success, len(entries)))
+    return False
+
+
+def subparser(subparsers):
+    '''Register subparser modules'''
+    batchparser = subparsers.add_parser('batch', help='Allocate many clusters at once, as listed in a batch file.')
+    batchparser.add_argument('path', metavar='path', help='Batch file. Contains one "slicename|location|profile|minutes" entry per line. "profile" is the name of a stored profile.')
+    batchparser.add_argument('-j', '--jobs', metavar='amount', default=4, type=int, help='Maximum number of concurrent allocations (default=4).')
+    retryargs.add_arguments(batchparser)
+    return [batchparser]
+
+
+def deploy_args_set(args):
+    '''Indicates whether we will handle command parse output in this module.
+    `deploy()` function will be called if set.
+
+    Returns:
+        `True` if we found arguments used by this subsubparser, `False` otherwise.'''
+    return args.command == 'batch'
+
+
+def deploy(parsers, args):
+    if args.jobs < 1:
+        printe('Need at least 1 job, found {}.'.format(args.jobs))
+        return False
+    if not retryargs.apply(args):
+        return False
+    return batch_allocate(args.path, args.jobs)
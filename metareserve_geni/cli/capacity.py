@@ -0,0 +1,81 @@
+import internal.gni.capacity as capacity
+from internal.util.printer import *
+import internal.util.retryargs as retryargs
+
+'''CLI module to show how many nodes GENI sites have available.'''
+
+
+def print_capacity(locations=None, hw_types=None, max_age=capacity.default_max_age):
+    '''Prints the number of available nodes per hardware type for given sites.
+    Args:
+        locations (optional list(str)): Sites to check. Defaults to `capacity.known_locations`.
+        hw_types (optional list(str)): If set, only prints these hardware types.
+        max_age (optional int): Maximal age in seconds of cached availability indices we use.
+
+    Returns:
+        `True` if we could check at least one site, `False` otherwise.'''
+    sites = capacity.get(locations, max_age=max_age)
+    for location, site in sites.items():
+        if not site:
+            printe('{}: could not fetch advertisement.'.format(location))
+            continue
+        print('{} (fetched {:.0f} seconds ago):'.format(location, site.age))
+        free = sorted((hw_type, amount) for hw_type, amount in site.free.items() if not hw_types or hw_type in hw_types)
+        for hw_type, amount in free:
+            print('\t{}: {}'.format(hw_type, amount))
+        if not free:
+            print('\tno available nodes{}'.format(' of requested types' if hw_types else ''))
+    return any(sites.values())
+
+
+def print_nodes(locations=None, hw_types=None, max_age=capacity.default_max_age):
+    '''Prints the names of available nodes for given sites, answered from stored advertisement snapshots where possible.
+    Args:
+        locations (optional list(str)): Sites to check. Defaults to `capacity.known_locations`.
+        hw_types (optional list(str)): If set, only prints nodes with these hardware types.
+        max_age (optional int): Maximal age in seconds of advertisement snapshots we use.
+
+    Returns:
+        `True` if we could check at least one site, `False` otherwise.'''
+    found = False
+    sites = capacity.get(locations, max_age=max_age) # Fetches all stale sites in parallel.
+    for location in sites:
+        nodes = capacity.available_nodes(location, hw_types, max_age=max_age) if sites[location] else None
+        if nodes == None:
+            printe('{}: could not fetch advertisement.'.format(location))
+            continue
+        found = True
+        print('{}: {} available nodes'.format(location, len(nodes)))
+        for node in nodes:
+            print('\t{} ({})'.format(node.name, ', '.join(node.hw_types)))
+    return found
+
+
+def subparser(subparsers):
+    '''Register subparser modules'''
+    capacityparser = subparsers.add_parser('capacity', help='Show how many nodes GENI sites have available, per hardware type.')
+    capacityparser.add_argument('-l', '--location', metavar='location', nargs='+', default=None, help='Sites to check (default: {}).'.format(', '.join(capacity.known_locations)))
+    capacityparser.add_argument('-t', '--hw-type', dest='hw_type', metavar='hw_type', nargs='+', default=None, help='Only show these hardware types.')
+    capacityparser.add_argument('--max-age', dest='max_age', metavar='seconds', type=int, default=capacity.default_max_age, help='Reuse availability fetched at most this many seconds ago (default={}).'.format(capacity.default_max_age))
+    capacityparser.add_argument('--nodes', help='List available nodes by name, instead of counting them per hardware type.', action='store_true')
+    capacityparser.add_argument('--refresh', help='Fetch availability from all sites, even if we fetched it recently.', action='store_true')
+    retryargs.add_arguments(capacityparser)
+    return [capacityparser]
+
+
+def deploy_args_set(args):
+    '''Indicates whether we will handle command parse output in this module.
+    `deploy()` function will be called if set.
+
+    Returns:
+        `True` if we found arguments used by this subsubparser, `False` otherwise.'''
+    return args.command == 'capacity'
+
+
+def deploy(parsers, args):
+    if not retryargs.apply(args):
+        return False
+    max_age = 0 if args.refresh else args.max_age
+    if args.nodes:
+        return print_nodes(args.location, args.hw_type, max_age)
+    return print_capacity(args.location, args.hw_type, max_age)
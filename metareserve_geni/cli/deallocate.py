@@ -1,5 +1,6 @@
 import internal.gni.py2bridge as py2bridge
 from internal.util.printer import *
+import internal.util.retryargs as retryargs
 
 '''CLI module to deallocate a cluster.'''
 
@@ -10,6 +11,7 @@ def subparser(subparsers):
     deallocateparser = subparsers.add_parser('deallocate', help='deallocate cluster on U.S. federal government clusters.')
     deallocateparser.add_argument('-n', '--name', metavar='name', default='metareserve', help='Name for slice on US resource (default="metareserve")')
     deallocateparser.add_argument('-l', '--location', metavar='location', nargs='?', default='cl-utah', const='cl-utah', help='Location of allocation (default="cl-utah", which is CloudLab, Utah site)')
+    retryargs.add_arguments(deallocateparser)
     
     return [deallocateparser]
 
@@ -24,6 +26,8 @@ def deploy_args_set(args):
 
 
 def deploy(parsers, args):
+    if not retryargs.apply(args):
+        return False
     if py2bridge.deallocate(args.name, args.location):
         prints('Resource deallocation success')
         return True
@@ -0,0 +1,28 @@
+import internal.gni.py2bridge as py2bridge
+from internal.util.printer import *
+
+'''CLI module to verify the python2 environment.'''
+
+
+def subparser(subparsers):
+    '''Register subparser modules'''
+    doctorparser = subparsers.add_parser('doctor', help='Verify the python2 environment used for GENI operations.')
+    doctorparser.add_argument('--refresh', help='Discard the stored environment fingerprint and check all python2 dependencies again.', action='store_true')
+    return [doctorparser]
+
+
+def deploy_args_set(args):
+    '''Indicates whether we will handle command parse output in this module.
+    `deploy()` function will be called if set.
+
+    Returns:
+        `True` if we found arguments used by this subsubparser, `False` otherwise.'''
+    return args.command == 'doctor'
+
+
+def deploy(parsers, args):
+    if py2bridge.doctor(refresh=args.refresh):
+        prints('python2 environment is usable')
+        return True
+    printe('python2 environment is not usable')
+    return False
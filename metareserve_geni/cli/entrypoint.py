@@ -1,5 +1,5 @@
 import argparse
-
+import importlib
 import os
 import sys
 
@@ -9,24 +9,48 @@ import sys
 sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__)))) # Appends main project root as importpath.
 
 
-def _get_modules():
-    import cli.allocate as allocate
-    import cli.deallocate as deallocate
-    import cli.listing as listing
-    return [allocate, deallocate, listing]
+# Subcommands, with the module implementing them and their help text. Modules are only imported when their subcommand is selected.
+_commands = [
+    ('allocate', 'cli.allocate', 'Allocate nodes for a cluster directly on U.S. federal government clusters.'),
+    ('batch', 'cli.batch', 'Allocate many clusters at once, as listed in a batch file.'),
+    ('capacity', 'cli.capacity', 'Show how many nodes GENI sites have available, per hardware type.'),
+    ('deallocate', 'cli.deallocate', 'deallocate cluster on U.S. federal government clusters.'),
+    ('doctor', 'cli.doctor', 'Verify the python2 environment used for GENI operations.'),
+    ('list', 'cli.listing', 'List cluster info for U.S. federal government clusters.'),
+    ('renewd', 'cli.renewd', 'Keep reservations allocated, renewing them in batches before they expire.'),
+    ('resize', 'cli.resize', 'Grow or shrink a running cluster in place, keeping its running nodes.'),
+]
+
+
+def _selected_command(argv):
+    '''Returns the subcommand in given commandline arguments, or `None` if there is none.
+    The main parser has no options taking values, so the first non-option argument is the subcommand.'''
+    return next((x for x in argv if not x.startswith('-')), None)
 
 
 # Register subparser modules
-def subparser(parser):
+def subparser(parser, argv):
+    '''Registers all subcommands. Only the module of the selected subcommand is imported, and registers its full parser.
+    Other subcommands get a placeholder parser, so they still show up in "geni-reserve -h".
+
+    Returns:
+        (`module`, `list(argparse.ArgumentParser)`): Module of the selected subcommand and the parsers it registered, or `(None, None)` if no subcommand was selected.'''
     subparsers = parser.add_subparsers(help='Subcommands', dest='command')
-    return [x.subparser(subparsers) for x in _get_modules()]
+    selected = _selected_command(argv)
+    module, parsers = None, None
+    for name, modulename, helptext in _commands:
+        if name == selected:
+            module = importlib.import_module(modulename)
+            parsers = module.subparser(subparsers)
+        else:
+            subparsers.add_parser(name, help=helptext)
+    return (module, parsers)
 
 
 # Processing of deploy commandline args occurs here
-def deploy(mainparser, parsers, args):
-    for parsers_for_module, module in zip(parsers, _get_modules()):
-        if module.deploy_args_set(args):
-            return module.deploy(parsers_for_module, args)
+def deploy(mainparser, module, parsers, args):
+    if module and module.deploy_args_set(args):
+        return module.deploy(parsers, args)
     mainparser.print_help()
     return True
 
@@ -38,10 +62,10 @@ def main():
         description='Simple GENI reservations'
     )
     retval = True
-    geniparsers = subparser(parser)
+    module, geniparsers = subparser(parser, sys.argv[1:])
 
     args = parser.parse_args()
-    retval = deploy(parser, geniparsers, args)
+    retval = deploy(parser, module, geniparsers, args)
 
     if isinstance(retval, bool):
         exit(0 if retval else 1)
@@ -1,5 +1,6 @@
 import internal.gni.py2bridge as py2bridge
 from internal.util.printer import *
+import internal.util.retryargs as retryargs
 
 '''CLI module to list GENI reources.'''
 
@@ -10,6 +11,8 @@ def subparser(subparsers):
     listsliceparser.add_argument('-n', '--name', metavar='name', nargs='?', default=None, const='metareserve', help='Name of slice on US resource (if no arg, default="metareserve")')
     listsliceparser.add_argument('-l', '--location', metavar='location', nargs='?', default=None, const='cl-utah', help='Name of slice on US resource (if no arg, default="cl-utah", which is CloudLab, Utah site)')
     listsliceparser.add_argument('-a', '--all', help='Print all slice given by GENI, even wrong entries (we filter away known expired entries by default).', action='store_true')
+    listsliceparser.add_argument('--refresh', help='Ask GENI for the reservation of given slice, even if the local ledger knows it. Updates the ledger.', action='store_true')
+    retryargs.add_arguments(listsliceparser)
 
     return [listsliceparser]
 
@@ -24,4 +27,6 @@ def deploy_args_set(args):
 
 
 def deploy(parsers, args):
-    return py2bridge.list_slices(slicename=args.name, location=args.location, show_all=args.all)
\ No newline at end of file
+    if not retryargs.apply(args):
+        return False
+    return py2bridge.list_slices(slicename=args.name, location=args.location, show_all=args.all, refresh=args.refresh)
\ No newline at end of file
@@ -0,0 +1,117 @@
+import datetime
+import os
+import signal
+import subprocess
+import sys
+
+from cli.allocate import parse_time
+import internal.gni.ledger as ledger
+import internal.gni.renewd as renewd
+from internal.util.printer import *
+import internal.util.fs as fs
+import internal.util.location as loc
+import internal.util.retryargs as retryargs
+
+'''CLI module to run the renewal daemon, which keeps reservations allocated by renewing them before they expire.'''
+
+
+def print_schedule(margin=renewd.default_margin, jitter=renewd.default_jitter, until=None, slices=None):
+    '''Prints the schedule of the running renewal daemon. If no daemon is running, prints the schedule a daemon would follow with given options.'''
+    schedule = renewd.load_schedule()
+    if schedule and schedule['running']:
+        print('Renewal daemon running (pid {}), renewing {} minutes before expiration{}. Next wakeup: {}.'.format(
+            schedule['pid'], schedule['margin'], ' until {}'.format(schedule['until']) if schedule['until'] else '', schedule['next_wakeup'] or 'now'))
+        renewals = schedule['renewals']
+    else:
+        print('No renewal daemon running. Schedule computed from the reservation ledger:')
+        renewals = renewd.plan(ledger.entries(), margin, jitter, until, slices)
+    if not renewals:
+        print('Nothing to renew.')
+        return True
+    print('slicename,location,expiration,due,last_error')
+    for x in renewals:
+        print('{},{},{},{},{}'.format(x.slicename, x.location, x.expiration.strftime('%Y-%m-%d %H:%M'), x.due.strftime('%Y-%m-%d %H:%M'), x.error or ''))
+    return True
+
+
+def stop():
+    '''Stops the running renewal daemon, if any.'''
+    pid = renewd.running_pid()
+    if not pid:
+        print('No renewal daemon running.')
+        return True
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError as e:
+        printe('Could not stop renewal daemon (pid {}): {}'.format(pid, e))
+        return False
+    prints('Stopped renewal daemon (pid {}).'.format(pid))
+    return True
+
+
+def detach():
+    '''Starts this command again as a background process, detached from the terminal. Output goes to "renewd.log" in the storage directory.'''
+    pid = renewd.running_pid()
+    if pid:
+        printe('A renewal daemon is running already (pid {}).'.format(pid))
+        return False
+    logpath = os.path.join(loc.storedir(), 'renewd.log')
+    fs.mkdir(loc.storedir(), exist_ok=True)
+    with open(logpath, 'a') as log:
+        process = subprocess.Popen([sys.executable, os.path.abspath(sys.argv[0])]+[x for x in sys.argv[1:] if x != '--detach'], stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    prints('Started renewal daemon (pid {}). Logging to {}.'.format(process.pid, logpath))
+    return True
+
+
+def _terminate(signum, frame):
+    sys.exit(0) # Unwinds the daemon loop, so it marks its schedule as stopped.
+
+
+def subparser(subparsers):
+    '''Register subparser modules'''
+    renewdparser = subparsers.add_parser('renewd', help='Keep reservations allocated, renewing them in batches before they expire.')
+    renewdparser.add_argument('--margin', metavar='minutes', type=int, default=renewd.default_margin, help='Renew reservations this many minutes before they expire (default={}).'.format(renewd.default_margin))
+    renewdparser.add_argument('--batch-window', dest='batch_window', metavar='minutes', type=int, default=renewd.default_batch_window, help='When a reservation is due, also renew all reservations due within this many minutes (default={}).'.format(renewd.default_batch_window))
+    renewdparser.add_argument('--jitter', metavar='minutes', type=int, default=renewd.default_jitter, help='Renew every reservation up to this many minutes earlier than "--margin" requires, picked at random, to spread load on the sites (default={}).'.format(renewd.default_jitter))
+    renewdparser.add_argument('--jobs', metavar='amount', type=int, default=renewd.default_jobs, help='Maximal number of GENI calls in flight at once (default={}).'.format(renewd.default_jobs))
+    renewdparser.add_argument('--until', metavar='time', type=parse_time, default=None, help='Keep reservations until this local time ("YYYY-mm-ddTHH:MM"), then stop (default: renew forever).')
+    renewdparser.add_argument('-n', '--name', metavar='name', nargs='+', default=None, help='Only renew reservations of these slices (default: all reservations in the ledger).')
+    modegroup = renewdparser.add_mutually_exclusive_group()
+    modegroup.add_argument('--once', help='Perform due renewals and exit, instead of waiting for later ones. Useful to run from cron.', action='store_true')
+    modegroup.add_argument('--detach', help='Run in the background, logging to "renewd.log" in {}.'.format(loc.storedir()), action='store_true')
+    modegroup.add_argument('--show', help='Show the renewal schedule and exit.', action='store_true')
+    modegroup.add_argument('--stop', help='Stop the running renewal daemon.', action='store_true')
+    retryargs.add_arguments(renewdparser)
+    return [renewdparser]
+
+
+def deploy_args_set(args):
+    '''Indicates whether we will handle command parse output in this module.
+    `deploy()` function will be called if set.
+
+    Returns:
+        `True` if we found arguments used by this subsubparser, `False` otherwise.'''
+    return args.command == 'renewd'
+
+
+def deploy(parsers, args):
+    if args.show:
+        return print_schedule(args.margin, args.jitter, args.until, args.name)
+    if args.stop:
+        return stop()
+    if args.until and args.until <= datetime.datetime.now():
+        printe('"--until" lies in the past.')
+        return False
+    if args.jobs < 1:
+        printe('Need at least 1 job, found {}.'.format(args.jobs))
+        return False
+    if not retryargs.apply(args):
+        return False
+    if args.detach:
+        return detach()
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        return renewd.run(args.margin, args.batch_window, args.jitter, args.jobs, args.until, args.name, args.once)
+    except KeyboardInterrupt as e:
+        print('Stopped.')
+        return True
@@ -0,0 +1,72 @@
+import cli.allocate as allocate
+import internal.gni.py2bridge as py2bridge
+from internal.gni.shared.topology import TopologyOptions
+from internal.util.printer import *
+import internal.util.retryargs as retryargs
+from reservation import GENIReservationRequest
+
+
+'''CLI module to grow or shrink a running cluster in place.'''
+
+
+def resize(location, slicename, conf, topology=None, dry_run=False):
+    '''Resizes a running cluster to the nodes in a stored profile. Nodes in both the cluster and the profile keep running.
+    Args:
+        location (str): Location of the cluster.
+        slicename (str): Slice name of the cluster.
+        conf (str): Name of the profile with all nodes the cluster should have afterwards.
+        topology (optional TopologyOptions): How to connect new nodes.
+        dry_run (optional bool): If set, only prints what we would change.
+
+    Returns:
+        `True` on success, `False` otherwise.'''
+    profile = allocate.load_profile(conf)
+    if not profile:
+        return False
+    reservation_request = GENIReservationRequest(0, location, slicename, profile, topology=topology) # Resizing keeps the current expiration date.
+    nodes = py2bridge.resize(reservation_request, dry_run=dry_run)
+    if not nodes:
+        printe('There was an error during resizing.')
+        return False
+    print('node_id,node_name,ip_local,ip_public,port,extra_info')
+    for x in nodes:
+        print(str(x))
+    if not dry_run:
+        prints('Resize success')
+    return True
+
+
+def subparser(subparsers):
+    '''Register subparser modules'''
+    resizeparser = subparsers.add_parser('resize', help='Grow or shrink a running cluster in place, keeping its running nodes.')
+    resizeparser.add_argument('-c', '--conf', metavar='name', required=True, help='Named profile with all nodes the cluster should have afterwards (see "geni-reserve allocate -cl"). Running nodes missing from the profile are released.')
+    resizeparser.add_argument('-l', '--location', metavar='location', nargs='?', default='cl-utah', const='cl-utah', help='Location of the cluster (default="cl-utah", which is CloudLab, Utah site)')
+    resizeparser.add_argument('-n', '--name', metavar='name', default='metareserve', help='Name of the slice of the cluster (default="metareserve")')
+    resizeparser.add_argument('--dry-run', dest='dry_run', help='Only show which nodes we would add and release.', action='store_true')
+    topologygroup = resizeparser.add_argument_group('topology options', 'Running nodes keep their LAN and address. These options only apply to new nodes.')
+    topologygroup.add_argument('--lan-size', dest='lan_size', metavar='nodes', default=None, type=int, help='Put at most this many nodes in each LAN (default: one LAN for all nodes).')
+    topologygroup.add_argument('--lan-group', dest='lan_group', choices=TopologyOptions.group_options, default=None, help='Put new nodes in the LAN of their hardware type ("hw_type"), or of their node name without trailing digits ("prefix").')
+    topologygroup.add_argument('--bandwidth', metavar='kbps', default=None, type=int, help='Bandwidth hint for every LAN interface, in kbps.')
+    topologygroup.add_argument('--best-effort', dest='best_effort', help='Allow mapping LANs over oversubscribed links.', action='store_true')
+    retryargs.add_arguments(resizeparser)
+    return [resizeparser]
+
+
+def deploy_args_set(args):
+    '''Indicates whether we will handle command parse output in this module.
+    `deploy()` function will be called if set.
+
+    Returns:
+        `True` if we found arguments used by this subsubparser, `False` otherwise.'''
+    return args.command == 'resize'
+
+
+def deploy(parsers, args):
+    if not retryargs.apply(args):
+        return False
+    try:
+        topology = TopologyOptions(args.lan_size, args.lan_group, args.bandwidth, args.best_effort)
+    except ValueError as e:
+        printe('Invalid topology options: {}'.format(e))
+        return False
+    return resize(args.location, args.name, args.conf, topology, args.dry_run)
@@ -0,0 +1,145 @@
+import datetime
+import json
+import os
+
+import internal.gni.py2bridge as _py2bridge
+import internal.gni.shared.adsnapshot as _adsnapshot
+import internal.util.fs as fs
+import internal.util.location as loc
+from internal.util.printer import *
+
+
+'''Availability index: the number of available nodes per hardware type per site, counted from the advertisement RSpecs of the sites.
+Fetching advertisements takes a while, so we cache the index for a short time (`default_max_age`).
+Every fetch also stores a compact snapshot of the advertisement per site (see `adsnapshot`), for queries about individual nodes.
+Availability changes all the time: the index is a hint to skip hopeless allocation attempts, not a guarantee that an allocation succeeds.'''
+
+default_max_age = 120 # Number of seconds a fetched index stays valid.
+known_locations = ('cl-utah', 'cl-wisconsin', 'cl-clemson', 'apt', 'pg-utah') # Sites we check when no sites are given.
+
+_date_format = '%Y-%m-%dT%H:%M:%S'
+
+
+class SiteCapacity(object):
+    '''Trivial object holding the availability index of a single site.
+    Args:
+        location (str): Name of the site.
+        free (dict): Maps hardware type to number of available nodes.
+        fetched (datetime): Time at which we fetched the advertisement.'''
+    def __init__(self, location, free, fetched):
+        self.location = location
+        self.free = free
+        self.fetched = fetched
+
+    @property
+    def age(self):
+        '''Number of seconds since we fetched the advertisement.'''
+        return (datetime.datetime.now() - self.fetched).total_seconds()
+
+
+    def shortfall(self, demand):
+        '''Returns a `dict` mapping every hardware type in given demand (a `dict` mapping hardware type to number of nodes) this site has too few available nodes for, to the number of missing nodes.'''
+        return dict((hw_type, amount - self.free.get(hw_type, 0)) for hw_type, amount in demand.items() if self.free.get(hw_type, 0) < amount)
+
+
+def demand(profile):
+    '''Returns a `dict` mapping hardware type to number of nodes for given `GENIReservationProfile`.'''
+    counts = dict()
+    for entry in profile.entries:
+        counts[entry.hw_type] = counts.get(entry.hw_type, 0) + (len(entry) if hasattr(entry, '__len__') else 1) # Node ranges know their size.
+    return counts
+
+
+def _load():
+    try:
+        with open(loc.capacityfile(), 'r') as f:
+            data = json.load(f)
+        return dict((x['location'], SiteCapacity(x['location'], x['free'], datetime.datetime.strptime(x['fetched'], _date_format))) for x in data)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return dict()
+
+
+def _store(sites):
+    try:
+        fs.mkdir(loc.storedir(), exist_ok=True)
+        tmppath = '{}.{}.tmp'.format(loc.capacityfile(), os.getpid())
+        with open(tmppath, 'w') as f:
+            json.dump([{'location': x.location, 'free': x.free, 'fetched': x.fetched.strftime(_date_format)} for x in sites.values()], f)
+        os.rename(tmppath, loc.capacityfile()) # Atomic, so concurrent processes never read a partial index.
+    except OSError as e:
+        printw('Could not store availability index at {}: {}'.format(loc.capacityfile(), e))
+
+
+def get(locations=None, max_age=default_max_age, callback=None, retry_policy=None):
+    '''Returns the availability index for given sites. Fetches advertisements only for sites without a cached index of at most `max_age` seconds old.
+    Args:
+        locations (optional list(str)): Sites to check. Defaults to `known_locations`.
+        max_age (optional int): Maximal age in seconds of cached indices we use. If 0, we always fetch.
+        callback (optional function): If set, called with every event the python2 side streams back. See `py2bridge._Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls.
+
+    Returns:
+        `dict` mapping every given location to its `SiteCapacity`, or to `None` if we could not fetch its advertisement.'''
+    locations = list(locations or known_locations)
+    sites = _load()
+    missing = [x for x in locations if not (x in sites and sites[x].age <= max_age)]
+    fetched = dict()
+    if missing:
+        now = datetime.datetime.now()
+        fetched = dict((location, SiteCapacity(location, free, now)) for location, free in _py2bridge.capacity(missing, callback=callback, retry_policy=retry_policy).items())
+        sites.update(fetched)
+        _store(sites)
+    return dict((x, fetched[x] if x in fetched else (None if x in missing else sites[x])) for x in locations)
+
+
+def feasible(profile, locations, max_age=default_max_age, retry_policy=None):
+    '''Checks which sites advertise enough available nodes for given reservation profile. Prints what every other site lacks.
+    Args:
+        profile (GENIReservationProfile): Nodes to check for. Use `reservation_request.profile` to check a request.
+        locations (list(str)): Sites to check.
+        max_age (optional int): Maximal age in seconds of cached indices we use.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls.
+
+    Returns:
+        list of sites that advertise enough available nodes, or for which we could not fetch an advertisement, in given order.'''
+    needed = demand(profile)
+    found = []
+    for location, site in get(locations, max_age=max_age, retry_policy=retry_policy).items():
+        if not site:
+            printw('Could not check availability at {}. Assuming it has enough nodes.'.format(location))
+            found.append(location)
+            continue
+        missing = site.shortfall(needed)
+        if missing:
+            print('Location {} lacks {}.'.format(location, ', '.join('{} {} nodes'.format(amount, hw_type) for hw_type, amount in sorted(missing.items()))))
+        else:
+            found.append(location)
+    return found
+
+
+def snapshot(location):
+    '''Returns the most recently stored advertisement snapshot of given site as `adsnapshot.Snapshot`, or `None` if we have none.'''
+    try:
+        return _adsnapshot.Snapshot(_adsnapshot.path(loc.advertisementdir(), location))
+    except (IOError, OSError, ValueError) as e:
+        return None
+
+
+def available_nodes(location, hw_types=None, max_age=default_max_age, retry_policy=None):
+    '''Lists nodes of a site we can reserve right now. Answers from the stored snapshot, fetching a new advertisement only if the snapshot is older than `max_age` seconds.
+    Args:
+        location (str): Site to check.
+        hw_types (optional list(str)): If set, only lists nodes with any of these hardware types.
+        max_age (optional int): Maximal age in seconds of the snapshot we use. If 0, we always fetch.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls.
+
+    Returns:
+        list of `adsnapshot.AdRecord` for available nodes we can reserve exclusively, or `None` if we could not fetch an advertisement.'''
+    stored = snapshot(location)
+    if not stored or (datetime.datetime.now() - stored.fetched).total_seconds() > max_age:
+        if not get([location], max_age=0, retry_policy=retry_policy)[location]:
+            return None
+        stored = snapshot(location)
+        if not stored:
+            return None
+    return [x for x in stored.records() if x.available and x.exclusive and (not hw_types or any(hw_type in hw_types for hw_type in x.hw_types))]
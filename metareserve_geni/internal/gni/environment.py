@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+
+import internal.util.fs as fs
+import internal.util.location as loc
+
+
+'''Persisted fingerprint of the python2 environment we use to run GENI operations.
+Finding python2 and verifying geni-lib and its dependencies is slow, so we do it once and store the result.
+The fingerprint is invalidated when the interpreter, or any of its site-packages directories, changes (modification time).'''
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError as e:
+        return None
+
+
+def find_py2_executable():
+    '''Simple function trying to find the python2 executable.
+    Returns:
+        The absolute path to the python2 executable on success, `None` otherwise.'''
+    for name in ('python2', 'python'):
+        path = shutil.which(name)
+        if path:
+            return fs.resolvelink(path)
+    return None
+
+
+def load():
+    '''Loads the stored fingerprint.
+    Returns:
+        Fingerprint `dict` with keys "executable", "executable_mtime", "versions", "site_packages", if a fingerprint is stored and still valid. `None` otherwise.'''
+    try:
+        with open(loc.environmentfile(), 'r') as f:
+            fingerprint = json.load(f)
+    except (OSError, ValueError) as e:
+        return None
+    try:
+        if _mtime(fingerprint['executable']) != fingerprint['executable_mtime']:
+            return None
+        if any(_mtime(path) != mtime for path, mtime in fingerprint['site_packages'].items()):
+            return None
+    except (KeyError, TypeError, AttributeError) as e:
+        return None
+    return fingerprint
+
+
+def store(executable, versions, site_packages):
+    '''Stores a fingerprint for a verified python2 environment.
+    Args:
+        executable (str): Absolute path to the python2 executable.
+        versions (dict): Verified dependency versions, mapping package name to version string.
+        site_packages (list(str)): site-packages directories of the interpreter.
+
+    Returns:
+        Stored fingerprint `dict`.'''
+    fingerprint = {
+        'executable': executable,
+        'executable_mtime': _mtime(executable),
+        'versions': versions,
+        'site_packages': {path: _mtime(path) for path in site_packages}
+    }
+    fs.mkdir(loc.storedir(), exist_ok=True)
+    tmppath = '{}.{}.tmp'.format(loc.environmentfile(), os.getpid()) # Per process, so concurrent processes never write to the same file.
+    with open(tmppath, 'w') as f:
+        json.dump(fingerprint, f, indent=4)
+    os.replace(tmppath, loc.environmentfile()) # Atomic, so concurrent readers never see a half-written fingerprint.
+    return fingerprint
+
+
+def clear():
+    '''Removes the stored fingerprint, if any.'''
+    fs.rm(loc.environmentfile(), ignore_errors=True)
@@ -0,0 +1,102 @@
+import contextlib
+import datetime
+import json
+import sqlite3
+
+import internal.util.fs as fs
+import internal.util.location as loc
+from internal.util.printer import *
+
+
+'''Local ledger of the reservations made with this tool, stored in an SQLite database.
+`allocate`, `deallocate` and `list` keep it up to date, so connection info for a known reservation is available without any remote call.
+SQLite handles locking, so concurrent `geni-reserve` processes can share the ledger.
+The ledger is an optimization: if we cannot read or write it, we warn and continue without it.
+All dates in the ledger are naive local time, compared against `datetime.now()`. GENI reports dates in UTC: convert them before recording (see `py2bridge._local_date`).'''
+
+_date_format = '%Y-%m-%dT%H:%M:%S'
+
+
+class LedgerEntry(object):
+    '''Trivial object holding a single recorded reservation.'''
+    def __init__(self, slicename, location, expiration, infos, updated):
+        self.slicename = slicename
+        self.location = location
+        self.expiration = expiration # Local `datetime` or `None` if unknown.
+        self.infos = infos # list of `RawConnectInfo` strings.
+        self.updated = updated # `datetime` of the last time we learned about this reservation from GENI.
+
+    @property
+    def expired(self):
+        return self.expiration != None and self.expiration <= datetime.datetime.now()
+
+
+def _parse_date(string):
+    return datetime.datetime.strptime(string, _date_format) if string else None
+
+
+@contextlib.contextmanager
+def _connect():
+    '''Opens the ledger. Changes made within the context are committed at once when it exits without exception.'''
+    fs.mkdir(loc.storedir(), exist_ok=True)
+    connection = sqlite3.connect(loc.ledgerfile(), timeout=30)
+    try:
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS reservations (slicename TEXT, location TEXT, expiration TEXT, infos TEXT, updated TEXT, PRIMARY KEY (slicename, location))')
+            yield connection
+    finally:
+        connection.close()
+
+
+def _select(query, params=()):
+    try:
+        with _connect() as connection:
+            rows = connection.execute('SELECT slicename, location, expiration, infos, updated FROM reservations '+query, params).fetchall()
+    except (sqlite3.Error, OSError) as e:
+        printw('Could not read reservation ledger at {}: {}'.format(loc.ledgerfile(), e))
+        return []
+    return [LedgerEntry(x[0], x[1], _parse_date(x[2]), json.loads(x[3]), _parse_date(x[4])) for x in rows]
+
+
+def record(slicename, location, infos, expiration=None):
+    '''Records a reservation, replacing any earlier record for the same slice and location.
+    Args:
+        slicename (str): Name of the slice.
+        location (str): Location of the sliver.
+        infos (list(str)): `RawConnectInfo` strings of the allocated nodes.
+        expiration (optional datetime): Expiration date of the reservation, in local time.'''
+    try:
+        with _connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO reservations VALUES (?, ?, ?, ?, ?)', (
+                slicename, location, expiration.strftime(_date_format) if expiration else None, json.dumps(list(infos)), datetime.datetime.now().strftime(_date_format)))
+    except (sqlite3.Error, OSError) as e:
+        printw('Could not update reservation ledger at {}: {}'.format(loc.ledgerfile(), e))
+
+
+def remove(slicename, location):
+    '''Removes the record for given slice and location, if any.'''
+    try:
+        with _connect() as connection:
+            connection.execute('DELETE FROM reservations WHERE slicename = ? AND location = ?', (slicename, location))
+    except (sqlite3.Error, OSError) as e:
+        printw('Could not update reservation ledger at {}: {}'.format(loc.ledgerfile(), e))
+
+
+def renewed(slicename, location, expiration):
+    '''Sets the expiration date of the record for given slice and location, if any.'''
+    try:
+        with _connect() as connection:
+            connection.execute('UPDATE reservations SET expiration = ? WHERE slicename = ? AND location = ?', (expiration.strftime(_date_format), slicename, location))
+    except (sqlite3.Error, OSError) as e:
+        printw('Could not update reservation ledger at {}: {}'.format(loc.ledgerfile(), e))
+
+
+def entries():
+    '''Returns all recorded reservations (including expired ones) as a list of `LedgerEntry`.'''
+    return _select('ORDER BY slicename, location')
+
+
+def get(slicename, location):
+    '''Returns the `LedgerEntry` for given slice and location if we have one and it did not expire, `None` otherwise.'''
+    found = _select('WHERE slicename = ? AND location = ?', (slicename, location))
+    return found[0] if found and not found[0].expired else None
@@ -0,0 +1,168 @@
+import concurrent.futures
+import datetime
+import itertools
+import metareserve
+
+import internal.gni.capacity as _capacity
+import internal.gni.py2bridge as _py2bridge
+import internal.gni.scheduler as _scheduler
+import internal.gni.shared.boottimes as _boottimes
+import internal.gni.shared.noderange as _noderange
+from internal.util.printer import *
+from reservation import GENINode, GENINodeRange, GENIReservationProfile, GENIReservationRequest
+
+
+'''Placement of reservation profiles across sites.
+A profile may mix hardware types that no single site has available at once. We split its node groups (profile entries) across sites, using the availability index (see `capacity.py`) and historical boot times (see `shared/boottimes.py`).
+We prefer placements using fewer sites, then placements with the lowest expected time-to-ready (the boot time of the slowest node), then sites given earlier.
+Every site gets its own sliver in the same slice. We create the slice once, request all slivers at once, and merge them into a single reservation.'''
+
+
+class Placement(object):
+    '''Trivial object holding where to allocate the nodes of a profile.
+    Args:
+        profiles (dict): Maps location to the `GENIReservationProfile` with the nodes to allocate there.
+        boot_time (float): Number of seconds we expect the slowest node to need to get ready.'''
+    def __init__(self, profiles, boot_time):
+        self.profiles = profiles
+        self.boot_time = boot_time
+
+    @property
+    def locations(self):
+        return list(self.profiles)
+
+
+    def __str__(self):
+        return 'expected boot time {:.0f} minutes; {}'.format(self.boot_time/60, '; '.join('{}: {}'.format(location, ', '.join('{} {}'.format(amount, hw_type) for hw_type, amount in sorted(_capacity.demand(profile).items()))) for location, profile in self.profiles.items()))
+
+
+def _size(entry):
+    return len(entry) if isinstance(entry, GENINodeRange) else 1
+
+
+def _take(entry, amount):
+    '''Splits a profile entry in the first `amount` nodes and the remaining nodes. Ranges stay compact.
+    Returns:
+        (entry, entry): Entry with the first `amount` nodes, and entry with the remaining nodes (`None` if there are none).'''
+    if amount >= _size(entry):
+        return (entry, None)
+    head, tail = _noderange.split(entry.name, amount)
+    return (GENINodeRange(head, entry.hw_type, entry.image), GENINodeRange(tail, entry.hw_type, entry.image))
+
+
+def _assign(entries, locations, free, history, spares=0):
+    '''Assigns profile entries to given sites. Every entry goes to the site with the fastest expected boot time for its hardware type that has room for all of it. Only if no site has room, we split the entry over the fastest sites.
+    Args:
+        entries (list): Profile entries (`GENINode` or `GENINodeRange`), largest first.
+        locations (tuple(str)): Sites to use, in order of preference.
+        free (dict): Maps location to a `dict` mapping hardware type to number of available nodes.
+        history (dict): Boot time samples as returned by `boottimes.load()`.
+        spares (optional int): Spare nodes every site requests per group of nodes sharing hardware type and image (see `GENIReservationRequest`). A site needs room for them the first time it gets a node of a group.
+
+    Returns:
+        `Placement` using every given site, or `None` if the entries do not fit, or if some site would get no nodes.'''
+    left = dict((location, dict(free[location])) for location in locations)
+    assigned = dict((location, []) for location in locations)
+    groups = dict((location, set()) for location in locations) # (hw_type, image) groups per site, which already have room for their spares.
+    boot_time = 0
+    for entry in entries:
+        def _expected(location):
+            expected = _boottimes.expected(location, entry.hw_type, history)
+            return expected if expected != None else _scheduler.default_boot_time
+        def _room(location):
+            extra = 0 if (entry.hw_type, entry.image) in groups[location] else spares
+            return max(0, left[location].get(entry.hw_type, 0) - extra)
+        fastest = sorted(locations, key=_expected) # Stable, so ties keep the order of preference.
+        whole = next((x for x in fastest if _room(x) >= _size(entry)), None)
+        rest = entry
+        for location in [whole] if whole else fastest:
+            room = _room(location)
+            if not rest or not room:
+                continue
+            part, rest = _take(rest, room)
+            assigned[location].append(part)
+            left[location][entry.hw_type] -= _size(part) + (0 if (entry.hw_type, entry.image) in groups[location] else spares)
+            groups[location].add((entry.hw_type, entry.image))
+            boot_time = max(boot_time, _expected(location))
+        if rest:
+            return None
+    if not all(assigned.values()):
+        return None
+    profiles = dict()
+    for location in locations:
+        profiles[location] = GENIReservationProfile()
+        for entry in assigned[location]:
+            profiles[location].add(entry)
+    return Placement(profiles, boot_time)
+
+
+def plan(profile, sites, max_sites=None, history=None, spares=0):
+    '''Computes where to allocate the nodes of a profile.
+    Args:
+        profile (GENIReservationProfile): Nodes to allocate.
+        sites (dict): Maps location to its `capacity.SiteCapacity`, in order of preference. Sites mapped to `None` (unknown availability) are skipped.
+        max_sites (optional int): Maximal number of sites to use. Defaults to as many as needed.
+        history (optional dict): Boot time samples as returned by `boottimes.load()`. Loaded from disk if not given.
+        spares (optional int): Spare nodes to request per group of nodes sharing hardware type and image, at every site (see `allocate`). Sites must have room for them too.
+
+    Returns:
+        `Placement` on success, `None` if no combination of sites has enough available nodes.'''
+    history = history if history != None else _boottimes.load()
+    free = dict((location, site.free) for location, site in sites.items() if site)
+    order = [x for x in sites if x in free]
+    needed = _capacity.demand(profile)
+    for hw_type, image in set((x.hw_type, x.image) for x in profile.entries): # Every group needs its spares at least once.
+        needed[hw_type] += spares
+    if any(sum(free[x].get(hw_type, 0) for x in order) < amount for hw_type, amount in needed.items()):
+        return None
+    entries = sorted(profile.entries, key=_size, reverse=True)
+    for amount in range(1, min(len(order), max_sites or len(order))+1):
+        placements = [x for x in (_assign(entries, locations, free, history, spares) for locations in itertools.combinations(order, amount)) if x]
+        if placements:
+            return min(placements, key=lambda x: x.boot_time) # First minimum, so ties keep the order of preference.
+    return None
+
+
+def merge(results):
+    '''Merges the nodes of several slivers into a single reservation.
+    Args:
+        results (list(tuple(str, list))): (location, list of `metareserve.Node`) per sliver.
+
+    Returns:
+        `metareserve.Reservation` with all nodes, numbered from 0. The `extra_info` of every node holds its "location".'''
+    nodes = []
+    for location, sliver_nodes in results:
+        for node in sliver_nodes:
+            nodes.append(metareserve.Node(len(nodes), node_name=node.node_name, ip_local=node.ip_local, ip_public=node.ip_public, port=node.port, extra_info=dict(node.extra_info, location=location)))
+    return metareserve.Reservation(nodes)
+
+
+def allocate(expiration, placement, slicename, topology=None, spares=0, callback=None, retry_policy=None):
+    '''Allocates a placement: one sliver per site, all in the same slice, requested at once. We create (or renew) the slice once beforehand, so slivers do not race each other creating it.
+    Either all slivers get allocated, or none: if any sliver fails, we deallocate all of them.
+    Args:
+        expiration (int): Sliver expiration time in minutes.
+        placement (Placement): Where to allocate which nodes. See `plan`.
+        slicename (str): Slice to allocate in.
+        topology (optional TopologyOptions): How to connect the nodes of every sliver. Nodes at different sites never share a LAN.
+        spares (optional int): Spare nodes to request per group of nodes, at every site. See `GENIReservationRequest`. Pass the same number to `plan`.
+        callback (optional function): If set, called with every event the python2 side streams back, for every sliver. See `py2bridge._Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls.
+
+    Returns:
+        `metareserve.Reservation` on success (see `merge`), `None` otherwise.'''
+    date = datetime.datetime.now() + datetime.timedelta(minutes=expiration) # One expiration date for the slice and all its slivers.
+    if not _py2bridge.create_slice(slicename, date, callback=callback, retry_policy=retry_policy):
+        printe('Could not create (or renew) slice "{}".'.format(slicename))
+        return None
+    requests = [GENIReservationRequest(expiration, location, slicename, profile, topology=topology, spares=spares) for location, profile in placement.profiles.items()]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        futures = [executor.submit(_py2bridge.allocate, date, x, callback=callback, retry_policy=retry_policy, create_slice=False) for x in requests]
+        results = [(request.location, future.result()) for request, future in zip(requests, futures)]
+    failed = [location for location, nodes in results if not nodes]
+    if failed:
+        printe('Could not allocate at {}. Deallocating slivers at all sites...'.format(', '.join(failed)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            list(executor.map(lambda location: _py2bridge.deallocate(slicename, location, retry_policy=retry_policy), [x.location for x in requests]))
+        return None
+    return merge(results)
@@ -1,24 +1,28 @@
 import datetime
 from enum import Enum
-import pprint
 import sys
 import time
-from xmlrpclib import Fault
-import geni.aggregate.cloudlab as cloudlab
 import geni.aggregate.context
 import geni.aggregate.pgutil
 import geni.aggregate.protogeni
 import geni.aggregate.frameworks
 import geni.aggregate.apis
-import geni.rspec.pg
 
+import alloc.poll as poll
+import alloc.retry as retry
+import alloc.sliceinfo as sliceinfo
+import boottimes
 from manifest.manifest import Manifest
 from location.location import location_str
 import sharedutil
+import util.events as events
 
 '''File containing generic functions for resource operations (create, renew, delete, list).'''
 
 
+_failures = retry.transient_errors + (retry.CircuitOpenError,) # Errors we may still see after retrying.
+
+
 class CreationState(Enum):
     '''Trivial enum representation of possible creation calls in GENI in general.'''
     FAILED = 0 # Did not create anything.
@@ -27,26 +31,42 @@ class CreationState(Enum):
     RENEWED = 3 # Object exists, renewed expiration.
 
 
-def slice_list(ctx, corrected=True):
-    '''List available slices for this project. Also tries to fix inherently broken GENI by filtering wrong entries.'''
+def slice_list(ctx, corrected=True, jobs=8, max_age=60):
+    '''List available slices for this project. Also tries to fix inherently broken GENI by filtering wrong entries.
+    To filter, we need the expiration date of every slice created by this tool. We fetch these concurrently, and cache them until the slices expire.
+    The listing itself is cached for `max_age` seconds. See `alloc.sliceinfo`.
+
+    Args:
+        ctx: geni-lib context.
+        corrected (optional bool): If set, filters out slices created by this tool that expired already.
+        jobs (optional int): Maximal number of concurrent slice info lookups.
+        max_age (optional float): Maximal age of a cached listing in seconds. If 0, we fetch a fresh listing.
+
+    Returns:
+        list of slice URNs.'''
+    urns = sliceinfo.list_urns(ctx, max_age=max_age)
+    if not corrected:
+        return urns
+    infos = sliceinfo.get_many(ctx, [x for x in urns if 'metareserve' in x], jobs=jobs)
     now = datetime.datetime.now()
-    for x in ctx.cf.listSlices(ctx).keys():
-        if (not corrected) or (not 'metareserve' in x) or ctx.getSliceInfo(x.split('+')[-1]).expires > now:
-            yield x
+    return [x for x in urns if infos.get(x) == None or infos[x].expires > now] # We keep slices we could not look up.
+
 
-def print_slicelist(ctx, slicename=None, corrected=True):
+def print_slicelist(ctx, slicename=None, corrected=True, max_age=60):
     '''Prints the list of currently available slices. Uses colors for visual grepping. 
     Cyan entries are reservations created by this tool. Purple entries are the ones we are looking for at the moment.
     Sorts our slicenames (the ones with "metareserve" in them) to the front.
 
     Args:
         ctx: geni-lib context.
-        slicename (str): Slicename we are looking for. If set, we use purple coloring to indicate name matches.'''
+        slicename (str): Slicename we are looking for. If set, we use purple coloring to indicate name matches.
+        corrected (optional bool): If set, filters out slices created by this tool that expired already.
+        max_age (optional float): Maximal age of a cached listing in seconds. If 0, we fetch a fresh listing.'''
     PRP = '\033[1;35m'
     CAN = '\033[1;36m'
     CLR = '\033[0m'
     print('Available slices{}:'.format(' (corrected)' if corrected else ''))
-    names = list(slice_list(ctx, corrected=corrected))
+    names = slice_list(ctx, corrected=corrected, max_age=max_age)
     for x in (y for y in names if 'metareserve' in y):
         startcolor = PRP if slicename != None and slicename == x.split('+')[-1] else CAN 
         print('\t{}{}{}'.format(startcolor, x, CLR))
@@ -54,40 +74,36 @@ def print_slicelist(ctx, slicename=None, corrected=True):
         print('\t{}'.format(x))
 
 
-def slice_renew(ctx, slicename, expiration=60*24*7, retries=5, retries_sleep=5):
+def slice_renew(ctx, slicename, expiration=60*24*7, policy=None):
     '''Renews a slice.
 
     Args:
         ctx: geni-lib context.
         slicename (str): Slice name.
         expiration: If `int` type, used as slice expiration time in minutes from now. If `datetime` type, used as the expiration date.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
 
     Returns:
         (`CreationState`, `datetime`): Arg 1 indicates what happened in this function. Arg 2 is a datetime if arg 1 == RENEWED. Otherwise, it returns the human-understandable error cause.
     '''
     if not sharedutil.lowercase_alpha(slicename):
-        print('Slicename must be all lowercase alphabetic characters, found: {}'.format(slicename))
-        return False
-    
+        return (CreationState.FAILED, 'Slicename must be all lowercase alphabetic characters, found: {}'.format(slicename))
+
     date = sharedutil.datetime_get(expiration)
-    for x in range(retries): 
-        try:
-            something = ctx.cf.renewSlice(ctx, slicename, exp=date)
-            # We get an empty dict in the `something` variable.
-            return (CreationState.RENEWED, date)
-        except Fault as e:
-            if x != retries-1:
-                time.sleep(retries_sleep)
-        except geni.aggregate.context.SliceCredInfo.CredentialExpiredError as e:
-            e_msg = str(e).strip().replace('\n', ' ')
-            if 'expired on' in e_msg:
-                return (CreationState.FAILED, 'Remote still has an expired slicename with the same name ("{}") in memory. (Determined from error msg: {}). Please pick another slicename.'.format(slicename, e))
-    return (CreationState.FAILED, 'Experienced error: 503: Server temporarily offline')
-
-
-def slice_create(ctx, slicename, expiration=60*24*7, renew_exist=True, retries=5, retries_sleep=5):
+    try:
+        retry.run(lambda: ctx.cf.renewSlice(ctx, slicename, exp=date), retry.is_transient, 'clearinghouse', policy, 'Renewing slice') # We get an empty dict back.
+        sliceinfo.invalidate_slice(ctx, slicename)
+        return (CreationState.RENEWED, date)
+    except geni.aggregate.context.SliceCredInfo.CredentialExpiredError as e:
+        e_msg = str(e).strip().replace('\n', ' ')
+        if 'expired on' in e_msg:
+            return (CreationState.FAILED, 'Remote still has an expired slicename with the same name ("{}") in memory. (Determined from error msg: {}). Please pick another slicename.'.format(slicename, e))
+        return (CreationState.FAILED, 'Slice credential expired: {}'.format(e_msg))
+    except _failures as e:
+        return (CreationState.FAILED, 'Experienced error: {}'.format(e))
+
+
+def slice_create(ctx, slicename, expiration=60*24*7, renew_exist=True, policy=None, show_slices=False):
     '''Creates (or optionally renews) a slice.
     Because GENI is inherently broken, we cannot trust any listings about existing slices it gives.
     They can have expired already.
@@ -98,8 +114,8 @@ def slice_create(ctx, slicename, expiration=60*24*7, renew_exist=True, retries=5
         slicename (str): Slice name.
         expiration: If `int` type, used as slice expiration time in minutes from now. If `datetime` type, used as the expiration date.
         renew_exist (bool): If set, renews the slice, setting the expiration date at `expiration` minutes from now.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
+        show_slices (optional bool): If set, prints the (possibly cached) list of existing slices once, before creating.
 
     Returns:
         (`CreationState`, `datetime`): Arg 1 indicates what happened in this function. Arg 2 is a datetime if arg 1 == CREATED | EXISTS | RENEWED
@@ -107,33 +123,38 @@ def slice_create(ctx, slicename, expiration=60*24*7, renew_exist=True, retries=5
     if not sharedutil.lowercase_alpha(slicename):
         return (CreationState.FAILED, 'Slicename must be all lowercase alphabetic characters, found: {}'.format(slicename))
 
-    for x in range(retries): 
+    slice_id = ('urn:publicid:IDN+emulab.net:{}+slice+{}').format(ctx.project, slicename)
+    date = sharedutil.datetime_get(expiration)
+    if show_slices:
         try:
-            slice_id = ('urn:publicid:IDN+emulab.net:{}+slice+{}').format(ctx.project, slicename)
-            date = sharedutil.datetime_get(expiration)
             print_slicelist(ctx, slicename)
-            print('Creating slice {}, date set to {}.'.format(slice_id, date))
-            ctx.cf.createSlice(ctx, slicename, exp=date)
-            return (CreationState.CREATED, date)
-        except Fault as e:
-            if x != retries-1:
-                time.sleep(retries_sleep)
-        except geni.aggregate.frameworks.ClearinghouseError as e:
-            if 'already a registered slice' in str(e):
-                if renew_exist:
-                    print('Renewing slice, set expiration date to {}.'.format(date))
-                    return slice_renew(ctx, slicename, date, retries, retries_sleep)
-                else:
-                    date = ctx.getSliceInfo(slicename).expires
-                    print('Skipping renewing slice. Expiration date remains {}'.format(date))
-                    return (CreationState.EXISTS, date) 
-            if x != retries-1:
-                time.sleep(retries_sleep)
-    return (CreationState.FAILED, 'Experienced error: 503: Server temporarily offline')
-
-
-
-def sliver_create(ctx, slicename, request, location=geni.aggregate.protogeni.UTAH_PG, expiration=60*24*7, renew_exist=True, retries=5, retries_sleep=5, wait_ready=True, wait_sleep=15, wait_stop=60*10):
+        except _failures as e:
+            print('Could not list slices: {}'.format(e))
+    def _create():
+        print('Creating slice {}, date set to {}.'.format(slice_id, date))
+        ctx.cf.createSlice(ctx, slicename, exp=date)
+    def _retryable(e):
+        return retry.is_transient(e) or (isinstance(e, geni.aggregate.frameworks.ClearinghouseError) and not 'already a registered slice' in str(e))
+
+    try:
+        retry.run(_create, _retryable, 'clearinghouse', policy, 'Creating slice')
+        sliceinfo.invalidate_slice(ctx, slicename) # We may have cached info for an expired slice with the same name.
+        return (CreationState.CREATED, date)
+    except geni.aggregate.frameworks.ClearinghouseError as e:
+        if not 'already a registered slice' in str(e):
+            return (CreationState.FAILED, 'Experienced error: {}'.format(e))
+        if renew_exist:
+            print('Renewing slice, set expiration date to {}.'.format(date))
+            return slice_renew(ctx, slicename, date, policy)
+        date = ctx.getSliceInfo(slicename).expires
+        print('Skipping renewing slice. Expiration date remains {}'.format(date))
+        return (CreationState.EXISTS, date)
+    except _failures as e:
+        return (CreationState.FAILED, 'Experienced error: {}'.format(e))
+
+
+
+def sliver_create(ctx, slicename, request, location=geni.aggregate.protogeni.UTAH_PG, expiration=60*24*7, renew_exist=True, policy=None, wait_ready=True, wait_sleep=15, wait_stop=60*10, cancel=None, node_types=None, min_ready=None, states=None):
     '''Creates (or optionally renews) a sliver on selected site. Requires an existing slice with given `slicename`.
 
     Args:
@@ -143,48 +164,122 @@ def sliver_create(ctx, slicename, request, location=geni.aggregate.protogeni.UTA
         location: physical cluster site. Picked site must support spawning images on raw hardware.
         expiration: If `int` type, used as slice expiration time in minutes from now. If `datetime` type, used as the expiration date.
         renew_exist (bool): If set, renews the slice, setting the expiration date at `expiration` minutes from now.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
         wait_ready (bool): If set, this function will block until the VM is ready.
-        wait_sleep: Number of seconds to wait between ready-checks.
+        wait_sleep: Maximal number of seconds to wait between ready-checks.
         wait_stop: Number of seconds before we give up on waiting for a ready-status. Stopping before being ready counts as a failure.
+        cancel (optional `threading.Event`): If set while waiting for a ready-status, we stop waiting. Counts as a failure.
+        node_types (optional dict): Maps node names to their hardware type. Used to predict and record boot times.
+        min_ready (optional int or list): If set, we stop waiting as soon as this many nodes are ready. See `sliver_wait`.
+        states (optional dict): If set, filled with the last known state of every node. See `sliver_wait`.
 
     Returns:
         A `Manifest` on success, `None` on failure.
     '''
     # TODO: how to set expiration time when creating? Is the current default equal to the lifetime of the slice?
-    for x in range(retries):
-        try:
-            print('Creating sliver...')
-            manifest = location.createsliver(ctx, slicename, request)
-            if wait_ready:
-                print('Sliver creation request sent. Waiting for ready-state...')
-                if not sliver_wait(ctx, slicename, location=location, wait_sleep=wait_sleep, wait_stop=wait_stop):
-                    print('[ERROR] Did not receive sliver ready status within allocated time.')
-                    return None
-            print('Done!')
-            return Manifest(manifest)
-        except geni.aggregate.pgutil.NoMappingError as e:
-            print('Problems detected with mapping. Does the aggregate support what you are doing? (spawning VMs/images on raw hardware?)')
-            print(e)
-            return None
-        except geni.aggregate.pgutil.ProtoGENIError as e:
-            e_msg = str(e).strip().replace('\n', ' ')
-            if 'Resource reservation violation' in e_msg:
-                print('Found resource reservation violation response (are there enough nodes free at the moment?):\n{}'.format(e))
+    site = location_str(location)
+    try:
+        events.progress('Creating sliver...')
+        manifest = Manifest(retry.run(lambda: location.createsliver(ctx, slicename, request), retry.is_transient, site, policy, 'Creating sliver at {}'.format(site)))
+        events.manifest(manifest, site) # Connection info is known before nodes are ready, so callers can prepare.
+        if wait_ready:
+            events.progress('Sliver creation request sent. Waiting for ready-state...')
+            if not sliver_wait(ctx, slicename, location=location, wait_sleep=wait_sleep, wait_stop=wait_stop, cancel=cancel, node_types=node_types, min_ready=min_ready, states=states):
+                if not (cancel and cancel.is_set()):
+                    events.error('Did not receive sliver ready status.')
                 return None
-            print('Sliver already exists (determined from error msg: {})'.format(e))
-            if renew_exist:
-                if not sliver_renew(ctx, slicename, location, expiration, retries-x, retries_sleep):
-                    return None # Failed to renew sliver
-            return sliver_res(ctx, slicename, location, retries-x, retries_sleep)
-        except Fault as e:
-            if x != retries-1:
-                time.sleep(retries_sleep)
-    return None
+        events.progress('Done!')
+        return manifest
+    except geni.aggregate.pgutil.NoMappingError as e:
+        events.error('Problems detected with mapping. Does the aggregate support what you are doing? (spawning VMs/images on raw hardware?)\n{}'.format(e))
+        return None
+    except geni.aggregate.pgutil.ProtoGENIError as e:
+        e_msg = str(e).strip().replace('\n', ' ')
+        if 'Resource reservation violation' in e_msg:
+            events.error('Found resource reservation violation response (are there enough nodes free at the moment?):\n{}'.format(e))
+            return None
+        print('Sliver already exists (determined from error msg: {})'.format(e))
+        if renew_exist:
+            if not sliver_renew(ctx, slicename, location, expiration, policy):
+                return None # Failed to renew sliver
+        manifest = sliver_res(ctx, slicename, location, policy)
+        if manifest:
+            events.manifest(manifest, site)
+        return manifest
+    except _failures as e:
+        events.error('Could not create sliver at {}: {}'.format(site, e))
+        return None
+
+
+def _update(ctx, slicename, rspec, location):
+    '''Sends an AM API v3 "Update" call, which changes the resources of an existing sliver in place. geni-lib has no wrapper for it.'''
+    from geni.minigcf import amapi3
+    sinfo = ctx.getSliceInfo(slicename)
+    creds = [{'geni_value': open(sinfo.path, 'rb').read(), 'geni_type': sinfo.type, 'geni_version': sinfo.version}]
+    res = amapi3._rpcpost(location.urlv3, amapi3.xmlrpclib.dumps(([sinfo.urn], creds, rspec, {}), methodname='Update'), (ctx.cf.cert, ctx.cf.key), False)
+    if res['code']['geni_code'] == 0:
+        return res
+    if res['code'].get('am_type') == 'protogeni':
+        geni.aggregate.pgutil.raiseError(res)
+    raise geni.aggregate.apis.AllocateError(res['output'], res)
+
+
+def sliver_update(ctx, slicename, request, location=geni.aggregate.protogeni.UTAH_PG, policy=None, wait_ready=True, wait_sleep=15, wait_stop=60*10, node_types=None, report=True):
+    '''Changes the nodes of an existing sliver in place: nodes in `request` bound to an allocated node (by component id) keep running, others are added, and allocated nodes missing from `request` are released.
+    Uses AM API v3 "Update", followed by "Provision" of the changed sliver.
+
+    Args:
+        ctx: geni-lib context.
+        slicename (str): Slice name.
+        request: GENI `Request` object with all machines the sliver should have afterwards.
+        location: physical cluster site. Must support AM API v3.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
+        wait_ready (bool): If set, this function will block until all nodes are ready.
+        wait_sleep: Maximal number of seconds to wait between ready-checks.
+        wait_stop: Number of seconds before we give up on waiting for a ready-status. Stopping before being ready counts as a failure.
+        node_types (optional dict): Maps names of added nodes to their hardware type. Used to predict and record boot times.
+        report (optional bool): If set, emits a manifest event for the updated sliver. Callers reporting a selection of its nodes themselves unset this.
+
+    Returns:
+        A `Manifest` on success, `None` on failure.
+    '''
+    site = location_str(location)
+    if not hasattr(location, 'urlv3'):
+        events.error('Site {} does not support AM API v3, so we cannot change its slivers in place.'.format(site))
+        return None
+    rspec = request.toXMLString(ucode=True)
+    try:
+        events.progress('Updating sliver...')
+        retry.run(lambda: _update(ctx, slicename, rspec, location), retry.is_transient, site, policy, 'Updating sliver at {}'.format(site))
+        retry.run(lambda: geni.aggregate.apis.AMAPIv3.provision(ctx, location.urlv3, slicename), retry.is_transient, site, policy, 'Provisioning sliver at {}'.format(site))
+    except geni.aggregate.pgutil.ProtoGENIError as e:
+        e_msg = str(e).strip().replace('\n', ' ')
+        if 'Resource reservation violation' in e_msg or isinstance(e, geni.aggregate.pgutil.InsufficientNodesError):
+            events.error('Site {} cannot add the requested nodes (are there enough nodes free at the moment?):\n{}'.format(site, e))
+        else:
+            events.error('Site {} refused to update sliver: {}'.format(site, e))
+        return None
+    except (geni.aggregate.apis.AllocateError, geni.aggregate.apis.ProvisionError) as e:
+        events.error('Site {} refused to update sliver (does it support AM API v3 "Update"?): {}'.format(site, e))
+        return None
+    except _failures as e:
+        events.error('Could not update sliver at {}: {}'.format(site, e))
+        return None
+
+    if wait_ready:
+        events.progress('Sliver update sent. Waiting for ready-state...')
+        if not sliver_wait(ctx, slicename, location=location, wait_sleep=wait_sleep, wait_stop=wait_stop, node_types=node_types):
+            events.error('Did not receive sliver ready status.')
+            return None
+    manifest = sliver_res(ctx, slicename, location, policy)
+    if manifest:
+        if report:
+            events.manifest(manifest, site)
+        events.progress('Done!')
+    return manifest
 
 
-def sliver_renew(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, expiration=60*24*7, retries=5, retries_sleep=5):
+def sliver_renew(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, expiration=60*24*7, policy=None):
     '''Renews a sliver. Used to set the expiration date of a sliver at a later point in time.
 
     Args:
@@ -192,8 +287,7 @@ def sliver_renew(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, expi
         slicename (str): Slice name.
         location: physical cluster site.
         expiration: If `int` type, used as slice expiration time in minutes from now. If `datetime` type, used as the expiration date.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
 
     Returns:
         `True on success`, `False` on failure.
@@ -202,27 +296,24 @@ def sliver_renew(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, expi
         print('Slicename must be all lowercase alphabetic characters, found: {}'.format(slicename))
         return False
 
-    for x in range(retries):
-        try:
-            date = sharedutil.datetime_get(expiration)
-            print('Renewing sliver, set expiration date to {}'.format(date))
-            success = location.renewsliver(ctx, slicename, date)
-            return success
-        except Fault as e:
-            if x != retries-1:
-                time.sleep(retries_sleep)
-    return False
+    site = location_str(location)
+    date = sharedutil.datetime_get(expiration)
+    print('Renewing sliver, set expiration date to {}'.format(date))
+    try:
+        return retry.run(lambda: location.renewsliver(ctx, slicename, date), retry.is_transient, site, policy, 'Renewing sliver at {}'.format(site))
+    except _failures as e:
+        print('Could not renew sliver at {}: {}'.format(site, e))
+        return False
 
 
-def sliver_res(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, retries=5, retries_sleep=5):
+def sliver_res(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, policy=None):
     '''Returns the resources allocated to a sliver.
 
     Args:
         ctx: geni-lib context.
         slicename (str): Slice name.
         location: physical cluster site.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
 
     Returns:
         A Manifest on success, `None` on failure.
@@ -231,84 +322,176 @@ def sliver_res(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, retrie
         print('Slicename must be all lowercase alphabetic characters, found: {}'.format(slicename))
         return None
 
-    for x in range(retries):
-        try:
-            manifest = location.listresources(ctx, sname=slicename)
-            return Manifest(manifest)
-        except Fault as e:
-            if x != retries-1:
-                time.sleep(retries_sleep)
-        except geni.aggregate.frameworks.ClearinghouseError as e:
-            if isinstance(e, geni.aggregate.frameworks.ClearinghouseError) and 'No such Slice' in str(e):
-                print('Cannot fetch state for slice named "{}", as it does not exist.'.format(slicename))
-                return None
-            if x != retries-1:
-                time.sleep(retries_sleep)
-        except geni.aggregate.pgutil.ProtoGENIError as e:
-            if 'Nothing here by that name' in str(e):
-                print('Cannot find given (known) slice "{}" on location "{}".'.format(slicename, location_str(location)))
-                return None
-            else:
-                print e
+    site = location_str(location)
+    def _retryable(e):
+        if isinstance(e, geni.aggregate.frameworks.ClearinghouseError):
+            return not 'No such Slice' in str(e)
+        if isinstance(e, geni.aggregate.pgutil.ProtoGENIError):
+            return not 'Nothing here by that name' in str(e)
+        return retry.is_transient(e)
+
+    try:
+        return Manifest(retry.run(lambda: location.listresources(ctx, sname=slicename), _retryable, site, policy, 'Listing resources at {}'.format(site)))
+    except geni.aggregate.frameworks.ClearinghouseError as e:
+        if 'No such Slice' in str(e):
+            print('Cannot fetch state for slice named "{}", as it does not exist.'.format(slicename))
+        else:
+            print(e)
+    except geni.aggregate.pgutil.ProtoGENIError as e:
+        if 'Nothing here by that name' in str(e):
+            print('Cannot find given (known) slice "{}" on location "{}".'.format(slicename, site))
+        else:
+            print(e)
+    except _failures as e:
+        print('Could not list resources at {}: {}'.format(site, e))
     return None
 
 
-def sliver_status(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, retries=5, retries_sleep=5):
+def sliver_status(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG):
     '''Returns sliver status. Primarily useful to check whether a reserved resource has become active.
+    Makes a single attempt, outside the retry policy: callers poll at their own cadence (see `sliver_wait`), and aggregates routinely report errors for slivers they are still setting up. Such errors must not count towards the circuit breaker of the site, which guards calls that create and delete slivers.
 
     Args:
         ctx: geni-lib context.
         slicename (str): Slice name.
         location: physical cluster site.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
 
     Returns:
-        A status dictionary (much like a raw manifest) on success, `None` on failure. 
+        A status dictionary (much like a raw manifest) on success, `None` if the aggregate gave no status this time. 
     '''
-    for x in range(retries):
-        try:
-            return location.sliverstatus(ctx, slicename)
-        except Exception as e:
-            time.sleep(retries_sleep)
+    try:
+        return location.sliverstatus(ctx, slicename)
+    except retry.transient_errors + (geni.aggregate.pgutil.ProtoGENIError,) as e:
+        print('Could not fetch sliver status at {}: {}'.format(location_str(location), str(e).strip().replace('\n', ' ')[:200]))
     return None
 
 
-def sliver_wait(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, retries=5, retries_sleep=5, wait_sleep=15, wait_stop=60*10):
-    '''Blocks until sliver is ready.
+def _node_state(entry):
+    '''Maps a resource entry of a `sliverstatus` response to a node state: "allocated", "booting", "ready" or "failed".'''
+    status = str(entry.get('pg_status', entry.get('geni_status', ''))).lower()
+    if status == 'ready':
+        return 'ready'
+    if status == 'failed' or entry.get('geni_error'):
+        return 'failed'
+    if status in ('changing', 'notready', 'configuring', 'booting'):
+        return 'booting'
+    return 'allocated'
+
+
+def node_states(status, node_names=None):
+    '''Extracts per-node states from a `sliverstatus` response.
+    Args:
+        status (dict): Response of `sliver_status`.
+        node_names (optional iterable(str)): If set, only returns states for nodes with these names (filters out e.g. LANs).
+
+    Returns:
+        `dict` mapping node name to node state ("allocated", "booting", "ready" or "failed").'''
+    states = dict()
+    for entry in status.get('geni_resources', []):
+        name = entry.get('pg_client_id') or entry.get('client_id') or str(entry.get('geni_urn', '')).split('+')[-1]
+        states[str(name)] = _node_state(entry)
+    if node_names:
+        filtered = dict((name, state) for name, state in states.items() if name in node_names)
+        if filtered: # Only filter if the aggregate reports names we recognize.
+            return filtered
+    return states
+
+
+def _quorum(min_ready, node_types, states):
+    '''Checks whether enough nodes are ready.
+    Args:
+        min_ready (int or list): Number of nodes (out of `node_types`, or out of `states` if not set) that must be ready. Alternatively, a list of (list of node names, number of these nodes that must be ready) pairs, one per group of nodes.
+        node_types (dict): Maps node names to their hardware type.
+        states (dict): Maps node names to their last known state.
+
+    Returns:
+        (`bool`, `list(str)`): Whether enough nodes are ready, and the failed nodes if we can no longer get enough nodes ready (an empty list otherwise).'''
+    groups = min_ready if isinstance(min_ready, list) else [(list(node_types) if node_types else list(states), min_ready)]
+    reached = True
+    for names, amount in groups:
+        failed = sorted(x for x in names if states.get(x) == 'failed')
+        if len(names) - len(failed) < amount:
+            return (False, failed)
+        reached = reached and sum(1 for x in names if states.get(x) == 'ready') >= amount
+    return (reached, [])
+
+
+def sliver_wait(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, wait_sleep=15, wait_stop=60*10, cancel=None, node_types=None, min_sleep=2, min_ready=None, states=None):
+    '''Blocks until sliver is ready, or until a quorum of its nodes is ready. Emits a node_state event for every node state change we observe.
+    We poll adaptively (see `alloc.poll.ReadinessPoller`), using boot times observed earlier for this site and the requested hardware types.
+    Once nodes are ready, we record how long they took.
 
     Args:
         ctx: geni-lib context.
         slicename (str): Slice name.
         location: physical cluster site.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
-        wait_sleep: Number of seconds to wait between ready-checks.
+        wait_sleep: Maximal number of seconds to wait between ready-checks.
         wait_stop: Number of seconds before we stop trying.
+        cancel (optional `threading.Event`): If set, we stop waiting.
+        node_types (optional dict): Maps node names to their hardware type. Used to predict and record boot times.
+        min_sleep: Minimal number of seconds to wait between ready-checks.
+        min_ready (optional int or list): If set, we return as soon as this many nodes (out of `node_types`) are ready, and only fail once too many nodes failed to reach this number. May also require a number of ready nodes per group of nodes, see `_quorum`. Requires per-node status from the aggregate.
+        states (optional dict): If set, filled with the last known state of every node. States already in it are not reported again.
 
     Returns:
-        `True` if the sliver is ready. `False` if we reached the `wait_stop` timepoint before we received a ready-status.
+        `True` if the sliver (or `min_ready` of its nodes) is ready. `False` if the sliver failed, or we reached the `wait_stop` timepoint (or got cancelled) before we received a ready-status.
     '''
-    endtime = time.time() + wait_stop
+    site = location_str(location)
+    history = boottimes.load()
+    expectations = [boottimes.expected(site, x, history) for x in set((node_types or {}).values())]
+    expected = max(expectations) if expectations and not None in expectations else None # Sliver is ready when its slowest node is.
+    poller = poll.ReadinessPoller(expected=expected, min_sleep=min_sleep, max_sleep=wait_sleep)
+
+    starttime = time.time()
+    endtime = starttime + wait_stop
+    states = states if states != None else dict()
+    samples = dict() # Maps node name to number of seconds it took to get ready.
     while True:
-        status = sliver_status(ctx, slicename, location, retries, retries_sleep)
-        if status and status['pg_status'] == 'ready':
-            return True
-        if time.time() > endtime:
+        if cancel and cancel.is_set():
             return False
+        status = sliver_status(ctx, slicename, location)
+        now = time.time()
+        if status:
+            for name, state in node_states(status, node_types).items():
+                if states.get(name) != state:
+                    states[name] = state
+                    events.node_state(name, state)
+                    if state == 'ready':
+                        samples[name] = now - starttime
+            if status.get('pg_status') == 'ready':
+                for name in (node_types or {}): # Nodes for which we got no per-node status got ready along with the sliver.
+                    samples.setdefault(name, now - starttime)
+                    states[name] = 'ready'
+                boottimes.record(site, [(node_types[name], seconds) for name, seconds in samples.items() if node_types and name in node_types])
+                return True
+            if min_ready:
+                reached, failed = _quorum(min_ready, node_types, states)
+                if reached:
+                    boottimes.record(site, [(node_types[name], seconds) for name, seconds in samples.items() if node_types and name in node_types])
+                    return True
+                if failed:
+                    events.error('Too many nodes failed at {} to get enough nodes ready. Failed nodes: {}'.format(site, ', '.join(failed)))
+                    return False
+            if status.get('pg_status') == 'failed' and not (min_ready and states): # In quorum mode, we decide from per-node states, if we have them.
+                events.error('Sliver failed at {}. Failed nodes: {}'.format(site, ', '.join(sorted(name for name, state in states.items() if state == 'failed')) or 'unknown'))
+                return False
+        if now > endtime:
+            return False
+        sleep = min(poller.next_sleep(now - starttime), max(0, endtime - now))
+        if cancel:
+            cancel.wait(sleep)
         else:
-            time.sleep(wait_sleep)
+            time.sleep(sleep)
 
 
-def sliver_deallocate(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, retries=5, retries_sleep=5):
+def sliver_deallocate(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG, policy=None):
     '''Deallocates a sliver.
 
     Args:
         ctx: geni-lib context.
         slicename (str): Slice name.
         location: physical cluster site
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
 
     Returns:
         `True` on success, `False` on failure.
@@ -317,20 +500,41 @@ def sliver_deallocate(ctx, slicename, location=geni.aggregate.protogeni.UTAH_PG,
         print('Slicename must be all lowercase alphabetic characters, found: {}'.format(slicename))
         return False
 
-    for x in range(retries):
-        try:
-            location.deletesliver(ctx, slicename)
-            return True
-        except Fault as e:
-            if x != retries-1:
-                time.sleep(retries_sleep)
-        except geni.aggregate.apis.DeleteSliverError as e:
-            if 'No such slice here' in str(e):
-                print('Cannot find given (known) slice "{}" on location "{}". Perhaps it no longer exists?'.format(slicename, location_str(location)))
-                return None
-            else:
-                raise e
-        except geni.aggregate.context.SliceCredInfo.CredentialExpiredError as e:
-            print(e) # Our 'credential expired', meaning the slice no longer exists.
+    site = location_str(location)
+    try:
+        retry.run(lambda: location.deletesliver(ctx, slicename), retry.is_transient, site, policy, 'Deleting sliver at {}'.format(site))
+        return True
+    except geni.aggregate.apis.DeleteSliverError as e:
+        if 'No such slice here' in str(e):
+            print('Cannot find given (known) slice "{}" on location "{}". Perhaps it no longer exists?'.format(slicename, site))
             return None
-    return False
\ No newline at end of file
+        raise e
+    except geni.aggregate.context.SliceCredInfo.CredentialExpiredError as e:
+        print(e) # Our 'credential expired', meaning the slice no longer exists.
+        return None
+    except _failures as e:
+        print('Could not delete sliver at {}: {}'.format(site, e))
+        return False
+
+
+def advertisement(ctx, location=geni.aggregate.protogeni.UTAH_PG, policy=None):
+    '''Fetches the advertisement RSpec of a site, listing the resources it has available right now.
+    We skip geni-lib's `Advertisement`, which builds a full document tree. Use `manifest.advertisement.records` to parse the result.
+
+    Args:
+        ctx: geni-lib context.
+        location: physical cluster site.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
+
+    Returns:
+        Advertisement XML (`str`) on success, `None` on failure.
+    '''
+    site = location_str(location)
+    try:
+        return retry.run(lambda: location.api.listresources(ctx, location.url, None, {'geni_available': True})['value'], retry.is_transient, site, policy, 'Listing resources at {}'.format(site))
+    except (geni.aggregate.apis.ListResourcesError, geni.aggregate.pgutil.ProtoGENIError) as e:
+        print('Site {} refused to list its resources: {}'.format(site, e))
+        return None
+    except _failures as e:
+        print('Could not list resources at {}: {}'.format(site, e))
+        return None
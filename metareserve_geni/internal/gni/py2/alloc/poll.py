@@ -0,0 +1,36 @@
+import random
+
+'''Adaptive intervals between readiness checks.'''
+
+
+class ReadinessPoller(object):
+    '''Computes how long to sleep between readiness checks of a sliver.
+    The first checks are fast, so early failures surface quickly. Afterwards:
+     - If we expect the sliver to be ready after `expected` seconds (from boot time history), we halve the remaining time on every check, so we poll densely around the moment the nodes should get ready.
+     - Otherwise (or once we passed `expected`), intervals grow exponentially from `min_sleep` up to `max_sleep`.
+    Every interval gets random jitter, so many concurrent waiters do not poll the aggregate in lockstep.'''
+    def __init__(self, expected=None, min_sleep=2, max_sleep=15, factor=1.5, jitter=0.2, fast_polls=2):
+        self.expected = expected
+        self.min_sleep = min_sleep
+        self.max_sleep = max(min_sleep, max_sleep)
+        self.factor = factor
+        self.jitter = jitter
+        self.fast_polls = fast_polls
+        self._polls = 0
+        self._backoff = min_sleep
+
+
+    def next_sleep(self, elapsed):
+        '''Returns the number of seconds to sleep before the next check.
+        Args:
+            elapsed (float): Number of seconds since we started waiting.'''
+        self._polls += 1
+        if self._polls <= self.fast_polls:
+            base = self.min_sleep
+        elif self.expected != None and elapsed < self.expected:
+            base = (self.expected - elapsed) / 2.0
+        else:
+            base = self._backoff
+            self._backoff = self._backoff * self.factor
+        base = min(self.max_sleep, max(self.min_sleep, base))
+        return base * random.uniform(1-self.jitter, 1+self.jitter)
@@ -0,0 +1,103 @@
+import socket
+import threading
+import time
+from xmlrpclib import Fault
+
+from retrypolicy import RetryPolicy
+
+'''Shared retry engine for GENI RPCs: exponential backoff with jitter, a deadline per operation and a circuit breaker per aggregate.'''
+
+transient_errors = (Fault, socket.error) # Errors worth retrying for every call, e.g. "503: Server temporarily offline".
+
+_local = threading.local()
+
+
+def is_transient(e):
+    '''Returns `True` if given exception is one of `transient_errors`. Default `retryable` function for `run`.'''
+    return isinstance(e, transient_errors)
+
+
+def set_policy(policy):
+    '''Sets the `RetryPolicy` used by the current thread when callers pass none. Pass `None` to restore the default.'''
+    _local.policy = policy
+
+
+def get_policy(policy=None):
+    '''Returns given policy if set, otherwise the policy of the current thread, otherwise the default policy.'''
+    return policy or getattr(_local, 'policy', None) or RetryPolicy()
+
+
+class CircuitOpenError(Exception):
+    '''Raised when we refuse to call an aggregate, because it failed too often recently.'''
+    pass
+
+
+class _Circuit(object):
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+
+
+_circuits = dict() # Maps aggregate name to its `_Circuit`. Shared by all threads, lives as long as the process.
+_circuits_lock = threading.Lock()
+
+
+def _circuit_allow(key, policy):
+    with _circuits_lock:
+        circuit = _circuits.setdefault(key, _Circuit())
+        if circuit.opened_at == None:
+            return True
+        if time.time() - circuit.opened_at >= policy.breaker_reset: # Half-open: let a trial call through. Another failure re-opens the circuit.
+            circuit.opened_at = None
+            circuit.failures = policy.breaker_threshold - 1
+            return True
+        return False
+
+
+def _circuit_result(key, policy, success):
+    '''Records the outcome of a call. Returns `True` if the circuit for `key` is open afterwards.'''
+    with _circuits_lock:
+        circuit = _circuits.setdefault(key, _Circuit())
+        if success:
+            circuit.failures = 0
+            circuit.opened_at = None
+        else:
+            circuit.failures += 1
+            if circuit.failures >= policy.breaker_threshold and circuit.opened_at == None:
+                print('[WARNING] Circuit for "{}" opened after {} consecutive failures. Failing fast for {} seconds.'.format(key, circuit.failures, int(policy.breaker_reset)))
+                circuit.opened_at = time.time()
+        return circuit.opened_at != None
+
+
+def run(func, retryable, key, policy=None, description='GENI call'):
+    '''Calls `func` until it succeeds, following a retry policy.
+    Args:
+        func (function): Function without arguments performing the RPC.
+        retryable (function): Receives a raised exception, returns `True` if it is transient and we may retry. Other exceptions propagate immediately.
+        key (str): Name of the aggregate (or "clearinghouse") we call. Transient failures count towards its circuit breaker, successes close it.
+        policy (optional RetryPolicy): Policy to follow. See `get_policy`.
+        description (optional str): Human-readable name of the operation, for messages.
+
+    Returns:
+        Whatever `func` returns.
+
+    Raises:
+        `CircuitOpenError` if the circuit for `key` is open. The last transient exception if we ran out of attempts or time. Any non-transient exception.'''
+    policy = get_policy(policy)
+    endtime = time.time() + policy.deadline
+    for attempt in range(policy.retries):
+        if not _circuit_allow(key, policy):
+            raise CircuitOpenError('{} skipped: "{}" failed too often recently.'.format(description, key))
+        try:
+            value = func()
+            _circuit_result(key, policy, True)
+            return value
+        except Exception as e:
+            if not retryable(e): # Tells nothing about the health of the aggregate (it may be our own bug), so the circuit stays as it is.
+                raise
+            opened = _circuit_result(key, policy, False)
+            sleep = policy.sleep_time(attempt)
+            if opened or attempt == policy.retries-1 or time.time() + sleep > endtime:
+                raise
+            print('{} failed ({}), retrying in {:.1f} seconds ({}/{})...'.format(description, str(e).strip().replace('\n', ' ')[:200], sleep, attempt+1, policy.retries))
+            time.sleep(sleep)
@@ -0,0 +1,114 @@
+import datetime
+import threading
+import time
+
+import alloc.retry as retry
+import util.credcache as credcache
+import util.util as util
+
+'''In-memory caches for the slice listing of our project and for slice information (`SliceCredInfo`), keyed by slice URN.
+The listing stays valid for `_listing_ttl` seconds.
+A slice info entry stays valid until the slice expires: before that, the slice can only live longer (when renewed), which does not change whether we list it.
+Expired slices cannot come back, except when someone creates a new slice with the same name. So we keep entries of expired slices for `_expired_ttl` seconds more.
+Creating or renewing a slice through this process invalidates the listing and the entry of that slice. The caches live as long as the (worker) process.
+Slice info itself comes from slice credentials, which are stored on disk (see `util.credcache`), so lookups in a fresh process are cheap too.'''
+
+_listing_ttl = 60
+_listing = None # (list of slice URNs, time we fetched it)
+_expired_ttl = 300
+_cache = dict() # Maps slice URN to (`SliceCredInfo`, time we fetched it).
+_cache_lock = threading.Lock()
+
+
+def _name(urn):
+    return urn.split('+')[-1]
+
+
+def get_cached(urn):
+    '''Returns cached slice info for given URN if its entry is valid, `None` otherwise.'''
+    with _cache_lock:
+        info, fetched = _cache.get(urn, (None, None))
+    if info == None:
+        return None
+    if info.expires > datetime.datetime.utcnow() or time.time() - fetched < _expired_ttl: # The clearinghouse states expiration dates in UTC.
+        return info
+    return None
+
+
+def list_urns(ctx, max_age=_listing_ttl, policy=None):
+    '''Returns the URNs of all slices in our project, as listed by the clearinghouse.
+    Args:
+        ctx: geni-lib context.
+        max_age (optional float): Maximal age of a cached listing, in seconds. If 0, we always fetch a fresh listing.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
+
+    Raises:
+        Anything `ctx.cf.listSlices` raises after retrying.'''
+    global _listing
+    with _cache_lock:
+        if _listing != None and time.time() - _listing[1] <= max_age:
+            return list(_listing[0])
+    urns = list(retry.run(lambda: ctx.cf.listSlices(ctx), retry.is_transient, 'clearinghouse', policy, 'Listing slices').keys())
+    with _cache_lock:
+        _listing = (urns, time.time())
+    return list(urns)
+
+
+def invalidate(urn=None):
+    '''Removes the listing and the entry for given URN, or all entries if no URN is given.'''
+    global _listing
+    with _cache_lock:
+        _listing = None
+        if urn == None:
+            _cache.clear()
+        else:
+            _cache.pop(urn, None)
+
+
+def invalidate_slice(ctx, slicename):
+    '''Removes the listing, the entry and the stored credential for a slice in our project, given by name. Call this after changing the slice.'''
+    global _listing
+    with _cache_lock:
+        _listing = None
+        for urn in [x for x in _cache if _name(x) == slicename]:
+            del _cache[urn]
+    credcache.invalidate(ctx, slicename)
+
+
+def get(ctx, urn, policy=None):
+    '''Returns slice info for given URN, from cache if possible.
+    Args:
+        ctx: geni-lib context.
+        urn (str): Slice URN.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
+
+    Raises:
+        Anything `ctx.getSliceInfo` raises after retrying.'''
+    info = get_cached(urn)
+    if info != None:
+        return info
+    info = retry.run(lambda: ctx.getSliceInfo(_name(urn)), retry.is_transient, 'clearinghouse', policy, 'Fetching slice info for {}'.format(_name(urn)))
+    with _cache_lock:
+        _cache[urn] = (info, time.time())
+    return info
+
+
+def get_many(ctx, urns, jobs=8, policy=None):
+    '''Fetches slice info for many slices at once, using at most `jobs` concurrent lookups. Cached entries need no lookup.
+    Args:
+        ctx: geni-lib context.
+        urns (list(str)): Slice URNs.
+        jobs (optional int): Maximal number of concurrent lookups.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
+
+    Returns:
+        `dict` mapping every URN to its slice info, or to `None` if we could not fetch it.'''
+    policy = retry.get_policy(policy) # Resolved here, as lookups run in other threads.
+    def _lookup(urn):
+        try:
+            return get(ctx, urn, policy)
+        except Exception as e:
+            print('[WARNING] Could not fetch slice info for {}: {}'.format(urn, e))
+            return None
+    urns = list(urns)
+    return dict(zip(urns, util.parallel_map(_lookup, urns, jobs=jobs)))
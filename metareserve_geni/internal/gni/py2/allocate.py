@@ -2,57 +2,87 @@ import argparse
 import datetime
 import socket
 import sys
+import threading
+import time
 
 from geni.rspec import pg
 import geni.aggregate.cloudlab
 
 import alloc.generic as generic
-from allocrequest import AllocRequest
+import alloc.retry as retry
+from allocrequest import AllocRequest, Node
 import location.location as locutil
 
+import util.events as events
 import util.geni_util as geni_util
 import sharedutil
 from connectinfo import RawConnectInfo
+import topology
 
 '''CLI module to start a cluster.'''
 
 
 def create_baremetal_node(name, img, hardware_type):
     node = pg.RawPC(name)
-    node.disk_image = img
+    if img: # Without an image, the request leaves the disk of an allocated node as it is.
+        node.disk_image = img
     node.hardware_type = hardware_type
     return node
 
 
-def create_lan(nodes):
-    '''Creates a request to add a LAN between all nodes.
+def create_lans(geni_nodes, lan_plans, options):
+    '''Creates requests for LANs between nodes, following an address plan.
     Args:
-        nodes (list of `pg.RawPC`): Raw nodes to make LAN request for.
+        geni_nodes (list of `pg.RawPC`): Raw nodes to make LAN requests for.
+        lan_plans (list of `LanPlan`): Address plan, see `topology.plan`.
+        options (TopologyOptions): Bandwidth and mapping hints.
 
     Returns:
-        `pg.LAN` request object.'''
-    lan = pg.LAN("lan")
-    for i, geni_node in enumerate(nodes):
-        iface = geni_node.addInterface('if1')
-        iface.component_id = 'eth1'
-        ip = '192.168.1.{}'.format(i+1)
-        iface.addAddress(pg.IPv4Address(ip, '255.255.255.0'))
-        lan.addInterface(iface)
-    return lan
-
-
-def create_request(allocrequest):
+        list of `pg.LAN` request objects.'''
+    by_name = dict((x.name, x) for x in geni_nodes)
+    lans = []
+    for lan_plan in lan_plans:
+        lan = pg.LAN(lan_plan.name)
+        if options.bandwidth:
+            lan.bandwidth = options.bandwidth
+        if options.best_effort:
+            lan.best_effort = True
+        for name, address in lan_plan.members:
+            iface = by_name[name].addInterface('if1')
+            iface.component_id = 'eth1'
+            iface.addAddress(pg.IPv4Address(address, lan_plan.netmask))
+            lan.addInterface(iface)
+        lans.append(lan)
+    return lans
+
+
+def create_request(allocrequest, options=None, lan_plans=None, component_ids=None):
+    '''Creates a request for all nodes in an `AllocRequest`, connected by LANs.
+    Args:
+        allocrequest (AllocRequest): Nodes to request.
+        options (optional TopologyOptions): How to connect the nodes. Defaults to a single LAN.
+        lan_plans (optional list(LanPlan)): Address plan to use. Computed with `topology.plan` if not set.
+        component_ids (optional dict): Maps node names to the component id of the physical node they must be mapped to.
+
+    Returns:
+        `pg.Request` object.'''
+    options = options or topology.TopologyOptions()
+    component_ids = component_ids or dict()
     request = pg.Request()
     geni_nodes = []
 
     for node in allocrequest.list():
         geni_node = create_baremetal_node(node.name, node.img, node.hw_type)
+        if node.name in component_ids:
+            geni_node.component_id = component_ids[node.name]
         geni_nodes.append(geni_node)
         request.addResource(geni_node)
 
-    # add lan to request
-    lan = create_lan(geni_nodes)
-    request.addResource(lan)
+    lan_plans = lan_plans or topology.plan(allocrequest.list(), options)
+    for lan_plan in lan_plans:
+        events.progress('Address plan: {}'.format(lan_plan))
+    for lan in create_lans(geni_nodes, lan_plans, options):
+        request.addResource(lan)
     return request
 
 
@@ -67,14 +97,14 @@ def _allocate_slice(ctx, slicename, expiration):
         end date for reservation.'''
     state, date = generic.slice_create(ctx, slicename, expiration=expiration)
     if state == generic.CreationState.FAILED:
-        print('Could not create (or renew) slice: {}'.format(date)) # Because we had a failure, the second arg is the error message
+        events.error('Could not create (or renew) slice: {}'.format(date)) # Because we had a failure, the second arg is the error message
         return None
-    print('Slice created/renewed until date: {}.'.format(date))
+    events.progress('Slice created/renewed until date: {}.'.format(date))
     return date
 
 
 
-def _allocate_sliver(ctx, slicename, allocrequest, location, expiration=60*24*7, renew_exist=True, retries=5, retries_sleep=5, wait_ready=True, wait_sleep=15, wait_stop=60*10):
+def _allocate_sliver(ctx, slicename, allocrequest, location, expiration=60*24*7, renew_exist=True, policy=None, wait_ready=True, wait_sleep=15, wait_stop=60*10, cancel=None, topology_options=None, min_ready=None, states=None):
     '''Creates (or optionally renews) a sliver with a cluster. Requires an existing slice with given `slicename`.
     Args:
         ctx: geni-lib context.
@@ -83,11 +113,14 @@ def _allocate_sliver(ctx, slicename, allocrequest, location, expiration=60*24*7,
         location (geni location object): Physical cluster site. Picked site must support spawning images on raw hardware.
         expiration: If `int` type, used as sliver expiration time in minutes from now. If `datetime` type, used as the expiration date.
         renew_exist (bool): If set, renews the sliver, setting the expiration date at `expiration` minutes from now.
-        retries: Number of retries when we get a "503: Server temporarily offline" before we stop trying.
-        retries_sleep: Number of seconds to sleep for each retry.
+        policy (optional RetryPolicy): How to retry failing calls. See `alloc.retry.get_policy`.
         wait_ready (bool): If set, this function will block until the VM is ready.
-        wait_sleep: Number of seconds to wait between ready-checks.
+        wait_sleep: Maximal number of seconds to wait between ready-checks.
         wait_stop: Number of seconds before we give up on waiting for a ready-status. Stopping before being ready counts as a failure.
+        cancel (optional `threading.Event`): If set while waiting for a ready-status, we stop waiting. Counts as a failure.
+        topology_options (optional TopologyOptions): How to connect the nodes. Defaults to a single LAN.
+        min_ready (optional int or list): If set, we stop waiting as soon as this many nodes are ready. See `sliver_wait`.
+        states (optional dict): If set, filled with the last known state of every node.
 
     Returns:
         Manifest on success, `None` on failure.'''
@@ -95,39 +128,279 @@ def _allocate_sliver(ctx, slicename, allocrequest, location, expiration=60*24*7,
         print('Slicename must be all lowercase alphabetic characters, found: {}'.format(slicename))
         return None
 
-    request = create_request(allocrequest)
+    request = create_request(allocrequest, topology_options)
 
     date = sharedutil.datetime_get(expiration)
-    return generic.sliver_create(ctx, slicename, request, location, date, renew_exist, retries, retries_sleep, wait_ready, wait_sleep, wait_stop)
+    node_types = dict((x.name, x.hw_type) for x in allocrequest.list())
+    manifest = generic.sliver_create(ctx, slicename, request, location, date, renew_exist, policy, wait_ready, wait_sleep, wait_stop, cancel, node_types, min_ready, states)
+    if manifest and set(x.name for x in manifest.nodes) != set(node_types): # We found an existing sliver, with other nodes.
+        print('[WARNING] Existing sliver of slice "{}" has other nodes than requested. Use "geni-reserve resize" to change its nodes.'.format(slicename))
+    return manifest
+
+
+def _wait_stragglers(ctx, slicename, location, pending, states, deadline, wait_sleep=15):
+    '''Waits until given nodes are ready or failed, or until `deadline`. Emits a node_state event for every node state change we observe.'''
+    while time.time() < deadline:
+        status = generic.sliver_status(ctx, slicename, location)
+        if status:
+            for name, state in generic.node_states(status, pending).items():
+                if states.get(name) != state:
+                    states[name] = state
+                    events.node_state(name, state)
+            if all(states.get(x) in ('ready', 'failed') for x in pending):
+                return
+        time.sleep(max(0, min(wait_sleep, deadline - time.time())))
+
+
+def _report_quorum(location, manifest, states):
+    '''Reports the ready nodes of a sliver of which a quorum of nodes is ready: a quorum event, followed by a manifest event listing only ready nodes.
+    Other nodes are left to `settle`, which the caller runs as a follow-up request.
 
+    Returns:
+        List of `RawConnectInfo` for all ready nodes.'''
+    site = locutil.location_str(location)
+    ready = [x.name for x in manifest.nodes if states.get(x.name) == 'ready']
+    pending = [x.name for x in manifest.nodes if states.get(x.name) != 'ready']
+    if pending:
+        events.progress('{} of {} nodes ready. Pending: {}.'.format(len(ready), manifest.num_nodes, ', '.join(pending)))
+        events.quorum(ready, pending)
+    events.manifest(manifest, site, ready)
+    return [x.connect_info() for x in manifest.nodes if x.name in ready]
+
+
+def settle(slicename, location, pending, replace_failed=False, topology_options=None, wait_stop=60*10):
+    '''Handles the nodes of a sliver that were not ready when a quorum of its nodes was (see `allocate` with `min_ready`). Meant to run as a follow-up request, after `allocate` returned the ready nodes.
+    Pending nodes get another `wait_stop` seconds. Nodes that fail or are still not ready by then are released, or replaced if `replace_failed` is set.
+    Replacements get `wait_stop` seconds to get ready as well. We only report them once they are ready.
+    Args:
+        slicename (str): Slice name.
+        location (str): Location of the sliver.
+        pending (list(str)): Names of the nodes that were not ready.
+        replace_failed (optional bool): If set, replaces nodes that do not get ready instead of releasing them.
+        topology_options (optional TopologyOptions): How to connect replacement nodes. Defaults to a single LAN.
+        wait_stop (optional int): Number of seconds we wait for pending nodes, and again for replacements.
 
-def allocate(slicename, expiration, location, tmpoutloc=None):
-    '''Allocates cluster. Note: Expects stdin to contain an AllocRequest in str form.
+    Returns:
+        List of `RawConnectInfo` for all ready nodes of the sliver on success, `None` otherwise.'''
+    import resize
+    ctx = geni_util.get_context()
+    if not ctx:
+        return None
+    loc = locutil.location_get(location)
+    states = dict()
+    _wait_stragglers(ctx, slicename, loc, pending, states, time.time() + wait_stop)
+    manifest = generic.sliver_res(ctx, slicename, loc)
+    if manifest == None:
+        events.error('Could not fetch the sliver of slice "{}" at {}.'.format(slicename, location))
+        return None
+    lost = [x for x in pending if states.get(x) != 'ready']
+    if lost:
+        events.progress('Nodes {} did not get ready. {} them...'.format(', '.join(lost), 'Replacing' if replace_failed else 'Releasing'))
+        updated = resize.release(ctx, slicename, loc, manifest, lost, replace_failed, topology_options)
+        if updated == None:
+            events.error('Could not {} nodes {} at {}.'.format('replace' if replace_failed else 'release', ', '.join(lost), location))
+        elif replace_failed:
+            states.update((x, 'allocated') for x in lost) # Replacements are fresh nodes with the same names.
+            _wait_stragglers(ctx, slicename, loc, lost, states, time.time() + wait_stop)
+            manifest = generic.sliver_res(ctx, slicename, loc) or updated
+            unready = [x for x in lost if states.get(x) != 'ready']
+            if unready:
+                events.error('Replacements for {} did not get ready in time. They remain in the sliver: use "list" to check on them later.'.format(', '.join(unready)))
+        else:
+            manifest = updated
+    ready = [x.name for x in manifest.nodes if states.get(x.name, 'ready') == 'ready'] # Nodes we did not wait for were ready at quorum.
+    events.progress('{} of {} nodes ready.'.format(len(ready), manifest.num_nodes))
+    events.manifest(manifest, location, ready)
+    return [x.connect_info() for x in manifest.nodes if x.name in ready]
+
+
+def with_spares(allocrequest, spares):
+    '''Over-provisions a request: adds spare nodes for every group of requested nodes sharing hardware type and image.
+    Args:
+        allocrequest (AllocRequest): Requested nodes.
+        spares (int): Number of spare nodes to add per group. Spares are named "spare0", "spare1", ... (skipping requested names).
+
+    Returns:
+        (`AllocRequest`, `list`): Request including spare nodes, and a (requested node names, spare node names) pair per group.'''
+    used = set(x.name for x in allocrequest.list())
+    groups = [] # (hw_type, img) per group, in request order.
+    members = dict()
+    for node in allocrequest.list():
+        key = (node.hw_type, node.img)
+        if not key in members:
+            groups.append(key)
+            members[key] = ([], [])
+        members[key][0].append(node.name)
+    extended = AllocRequest()
+    extended.nodes = list(allocrequest.nodes)
+    idx = 0
+    for key in groups:
+        for x in range(spares):
+            while 'spare{}'.format(idx) in used:
+                idx += 1
+            used.add('spare{}'.format(idx))
+            extended.nodes.append(Node('spare{}'.format(idx), *key))
+            members[key][1].append('spare{}'.format(idx))
+    return (extended, [members[x] for x in groups])
+
+
+def _keep_fastest(ctx, slicename, location, manifest, states, groups):
+    '''Keeps the first nodes to get ready in an over-provisioned sliver, and releases all others.
+    In every group, we keep as many ready nodes as were requested, preferring requested nodes over spares.
+    A kept spare stands in for a requested node that was not ready: its connect info carries the name of that requested node, so callers see exactly the nodes they requested. Its hostname in the sliver does not change.
+
+    Returns:
+        List of `RawConnectInfo` for the kept nodes, sorted by (requested) node name.'''
+    import resize
+    site = locutil.location_str(location)
+    records = dict((x.name, x) for x in manifest.nodes)
+    infos = []
+    released = []
+    for requested, spares in groups:
+        slow = [x for x in requested if states.get(x) != 'ready']
+        stand_ins = dict(zip(slow, [x for x in spares if states.get(x) == 'ready']))
+        released += slow + [x for x in spares if not x in stand_ins.values()]
+        for name in requested:
+            record = records[stand_ins.get(name, name)]
+            infos.append(RawConnectInfo(name, record.user, record.ip_local, record.ip_public, record.port, record.subnet))
+        if stand_ins:
+            events.progress('Spares stand in for slow nodes: {}.'.format(', '.join('{} for {}'.format(spare, name) for name, spare in sorted(stand_ins.items()))))
+    infos.sort(key=lambda x: x.name)
+    try:
+        expiration = manifest.expiration.strftime('%Y-%m-%dT%H:%M:%S')
+    except (TypeError, ValueError) as e: # Not all manifests carry an expiration date.
+        expiration = None
+    if released:
+        events.progress('First {} nodes ready. Releasing {} slower node(s): {}.'.format(len(infos), len(released), ', '.join(released)))
+        events.quorum([x.name for x in infos], released)
+    events.nodes(infos, site, expiration)
+    if released and not resize.release(ctx, slicename, location, manifest, released):
+        events.error('Could not release nodes {} at {}. They remain in the sliver until it expires.'.format(', '.join(released), site))
+    return infos
+
+
+def create_slice(slicename, expiration):
+    '''Creates or renews a slice, without allocating slivers in it. Lets callers prepare a slice once for several concurrent allocations (see `allocate` with `create_slice=False`).
+    Returns:
+        End date for reservation on success, `None` otherwise.'''
+    ctx = geni_util.get_context()
+    if not ctx:
+        return None
+    return _allocate_slice(ctx, slicename, expiration)
+
+
+def allocate(slicename, expiration, location, allocrequest, topology_options=None, min_ready=None, spares=0, create_slice=True):
+    '''Allocates cluster.
     Args:
-        expiration: If `int` type, used as slice expiration time in minutes from now. If `datetime` type, used as the expiration date.
         slicename: Slice name.
+        expiration: If `int` type, used as slice expiration time in minutes from now. If `datetime` type, used as the expiration date.
         location: Location for sliver allocation.
+        allocrequest (AllocRequest): Nodes to allocate.
+        topology_options (optional TopologyOptions): How to connect the nodes. Defaults to a single LAN.
+        min_ready (optional int): If set, we return ready nodes as soon as this many are ready (see `_report_quorum`), instead of waiting for all nodes. Run `settle` afterwards to handle the other nodes.
+        spares (optional int): If set, over-provisions every group of nodes sharing hardware type and image with this many spare nodes (see `with_spares`). We keep the first nodes to get ready, and release the slowest (see `_keep_fastest`). Overrides `min_ready`.
+        create_slice (optional bool): If set, creates (or renews) the slice first. Otherwise, the slice must exist until at least `expiration` (see `create_slice`).
 
     Returns:
-        `True` on success, `False` otherwise. On success, also prints relevant connection info for the cluster.'''
+        List of `RawConnectInfo` for the cluster on success, `None` otherwise. With `min_ready`, only lists ready nodes.'''
     ctx = geni_util.get_context()
     if not ctx:
-        return False
-    ar = AllocRequest.from_string(''.join(sys.stdin.readlines()))
+        return None
     loc = locutil.location_get(location)
 
-    date = _allocate_slice(ctx, slicename, expiration)
-    if not date: # If we could not create slice, we failed.
-        return False 
+    if create_slice:
+        date = _allocate_slice(ctx, slicename, expiration)
+        if not date: # If we could not create slice, we failed.
+            return None
+    else:
+        date = sharedutil.datetime_get(expiration)
 
-    manifest = _allocate_sliver(ctx, slicename, ar, loc, expiration=date)
+    if spares:
+        allocrequest, groups = with_spares(allocrequest, spares)
+        min_ready = [(requested + spare_names, len(requested)) for requested, spare_names in groups]
+    states = dict()
+    manifest = _allocate_sliver(ctx, slicename, allocrequest, loc, expiration=date, topology_options=topology_options, min_ready=min_ready, states=states)
 
     if manifest == None:
-        return False
-    infos = '\n'.join(str(x) for x in manifest.get_connect_info())
-    with open(tmpoutloc, 'w') as f:
-        f.write(infos)
-    return True
+        return None
+    if spares and states: # Without states, we did not wait (e.g. the sliver existed already).
+        return _keep_fastest(ctx, slicename, loc, manifest, states, groups)
+    if min_ready and states:
+        return _report_quorum(loc, manifest, states)
+    return manifest.get_connect_info()
+
+
+def allocate_hedged(slicename, expiration, locations, allocrequest, stagger=0, topology_options=None):
+    '''Allocates cluster on whichever of several sites gets ready first.
+    We request a sliver at every candidate site (in parallel, or one extra site every `stagger` seconds), keep the first sliver reaching ready-state, and deallocate all others.
+    Args:
+        slicename: Slice name.
+        expiration: If `int` type, used as slice expiration time in minutes from now. If `datetime` type, used as the expiration date.
+        locations (list(str)): Candidate locations for sliver allocation, in order of preference.
+        allocrequest (AllocRequest): Nodes to allocate.
+        stagger (optional int): Number of seconds between submitting to consecutive candidate sites. If 0, we submit to all sites at once.
+        topology_options (optional TopologyOptions): How to connect the nodes. Defaults to a single LAN.
+
+    Returns:
+        (`str`, `list`): Name of the site we allocated at and a list of `RawConnectInfo` for the cluster on success, `(None, None)` otherwise.'''
+    ctx = geni_util.get_context()
+    if not ctx:
+        return (None, None)
+    locs = [locutil.location_get(x) for x in locations]
+
+    date = _allocate_slice(ctx, slicename, expiration)
+    if not date: # If we could not create slice, we failed.
+        return (None, None)
+
+    lock = threading.Lock()
+    done = threading.Event() # Set once we have a winner.
+    cancels = [threading.Event() for x in locs]
+    state = {'winner': None, 'manifest': None}
+    policy = retry.get_policy() # Retry policies and event sinks are set per thread, so we hand ours to the attempts.
+    sink = events.get_sink()
+
+    def _attempt(idx):
+        retry.set_policy(policy)
+        events.set_sink(sink)
+        site = locutil.location_str(locs[idx])
+        if done.wait(idx*stagger): # Someone else already won before it was our turn.
+            return
+        print('Requesting sliver at {}...'.format(site))
+        try:
+            manifest = _allocate_sliver(ctx, slicename, allocrequest, locs[idx], expiration=date, cancel=cancels[idx], topology_options=topology_options)
+        except Exception as e:
+            events.error('Requesting sliver at {} raised {}: {}'.format(site, type(e).__name__, e))
+            manifest = None
+        with lock:
+            if manifest and state['winner'] == None:
+                state['winner'], state['manifest'] = idx, manifest
+                done.set()
+                for pos, cancel in enumerate(cancels):
+                    if pos != idx:
+                        cancel.set()
+                return
+        # We lost, failed, or got cancelled. Our sliver may exist (partially), so we clean it up.
+        print('Deallocating sliver at {}...'.format(site))
+        try:
+            if generic.sliver_deallocate(ctx, slicename, location=locs[idx]) == False: # `None` means there is no sliver to deallocate.
+                events.error('Could not deallocate sliver at {}. It stays allocated until it expires, unless you deallocate it.'.format(site))
+        except Exception as e:
+            events.error('Deallocating sliver at {} raised {}: {}. It may stay allocated until it expires, unless you deallocate it.'.format(site, type(e).__name__, e))
+
+    threads = [threading.Thread(target=_attempt, args=(idx,)) for idx in range(len(locs))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if state['winner'] == None:
+        events.error('Could not allocate at any of the candidate sites: {}'.format(', '.join(locations)))
+        return (None, None)
+    winner = locutil.location_str(locs[state['winner']])
+    events.progress('Allocated at {}.'.format(winner))
+    events.manifest(state['manifest'], winner)
+    return (winner, state['manifest'].get_connect_info())
 
 
 def subparser(subparsers):
@@ -136,7 +409,6 @@ def subparser(subparsers):
     allocateparser.add_argument('time', metavar='time', help='Starts cluster for given amount of minutes if int given. Assumes date of format "%%Y-%%m-%%dT%%H:%%M:%%S" otherwise.')
     allocateparser.add_argument('-n', '--name', metavar='name', default='metareserve', help='Name for slice on US resource (default="metareserve")')
     allocateparser.add_argument('-l', '--location', metavar='location', nargs='?', default='cl-utah', const='cl-utah', help='Location of allocation (default="cl-utah", which is CloudLab, Utah site)')
-    allocateparser.add_argument('--tmpoutloc', nargs='?', default=None, const=None, help=argparse.SUPPRESS)
     return [allocateparser]
 
 
@@ -150,4 +422,9 @@ def deploy_args_set(args):
 
 
 def deploy(parsers, args):
-    return allocate(args.name, args.time, args.location, args.tmpoutloc)
\ No newline at end of file
+    # Note: Expects stdin to contain an AllocRequest in str form.
+    infos = allocate(args.name, args.time, args.location, AllocRequest.from_string(''.join(sys.stdin.readlines())))
+    if infos == None:
+        return False
+    print('\n'.join(str(x) for x in infos))
+    return True
\ No newline at end of file
@@ -0,0 +1,77 @@
+import lxml.etree as etree
+
+import adsnapshot
+import alloc.generic as generic
+import alloc.retry as retry
+import location.location as locutil
+import manifest.advertisement as advertisement
+import util.events as events
+import util.geni_util as geni_util
+import util.util as util
+
+
+'''Module to learn how many nodes sites have available, from their advertisement RSpecs.'''
+
+
+def _counted(records, free):
+    '''Passes through given records, counting nodes we can reserve right now in `free` on the way. See `adsnapshot.index`.'''
+    for record in records:
+        if record.available and record.exclusive:
+            for hw_type in record.hw_types:
+                free[hw_type] = free.get(hw_type, 0) + 1
+        yield record
+
+
+def index(text, location, snapshot_dir=None):
+    '''Counts available nodes in an advertisement in a single streaming pass, and stores a snapshot of it.
+    Args:
+        text (str): Advertisement XML.
+        location (str): Name of the site the advertisement belongs to.
+        snapshot_dir (optional str): If set, stores an `adsnapshot` of the advertisement in this directory, while parsing.
+
+    Returns:
+        `dict` mapping hardware type to the number of available nodes we can reserve exclusively (as raw PC) with that type.'''
+    records = advertisement.records(text, location)
+    if not snapshot_dir:
+        return adsnapshot.index(records)
+    free = dict()
+    try:
+        adsnapshot.write(snapshot_dir, location, _counted(records, free))
+    except (IOError, OSError) as e:
+        print('Could not store advertisement snapshot of {}: {}'.format(location, e))
+        free = adsnapshot.index(advertisement.records(text, location))
+    return free
+
+
+def capacity(locations, jobs=8, snapshot_dir=None):
+    '''Fetches the advertisements of given sites in parallel, and emits a capacity event for every site that answered.
+    Args:
+        locations (list(str)): Names of sites to check.
+        jobs (optional int): Maximal number of sites to query at once.
+        snapshot_dir (optional str): If set, stores an `adsnapshot` of every fetched advertisement in this directory.
+
+    Returns:
+        `True` if at least one site answered, `False` otherwise.'''
+    ctx = geni_util.get_context()
+    if not ctx:
+        return False
+    policy = retry.get_policy() # Pool threads do not inherit our thread-local policy.
+    def _fetch(location):
+        try:
+            text = generic.advertisement(ctx, locutil.location_get(location), policy)
+        except KeyError as e:
+            return (None, str(e))
+        if text == None:
+            return (None, 'Could not fetch the advertisement of {}.'.format(location))
+        try:
+            return (index(text, location, snapshot_dir), None)
+        except etree.LxmlError as e:
+            return (None, 'Could not parse the advertisement of {}: {}'.format(location, e))
+
+    results = util.parallel_map(_fetch, locations, jobs)
+    for location, (free, message) in zip(locations, results):
+        if free == None:
+            events.error(message)
+        else:
+            events.capacity(location, free)
+    return any(free != None for free, _ in results)
@@ -1,5 +1,5 @@
 import argparse
-
+import importlib
 import os
 import sys
 
@@ -9,25 +9,42 @@ sys.path.append(os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(sys
 
 '''Python CLI for python2, so we can access GENI methods from python2. We need that, as GENI only works with python2.'''
 
-def _get_modules():
-    import allocate
-    import deallocate
-    import listing
-    return [allocate, deallocate, listing]
+# Subcommands, with the module implementing them and their help text. Modules are only imported when their subcommand is selected.
+_commands = [
+    ('allocate', 'allocate', 'Allocate nodes for a cluster directly on U.S. federal government clusters.'),
+    ('deallocate', 'deallocate', 'deallocate cluster on U.S. federal government clusters.'),
+    ('list', 'listing', 'List cluster info for U.S. federal government clusters.'),
+]
+
+
+def _selected_command(argv):
+    '''Returns the subcommand in given commandline arguments, or `None` if there is none.
+    The main parser has no options taking values, so the first non-option argument is the subcommand.'''
+    return next((x for x in argv if not x.startswith('-')), None)
 
 
 # Register subparser modules
-def subparser(parser):
+def subparser(parser, argv):
+    '''Registers all subcommands. Only the module of the selected subcommand is imported, and registers its full parser.
+    Returns:
+        (`module`, `list(argparse.ArgumentParser)`): Module of the selected subcommand and the parsers it registered, or `(None, None)` if no subcommand was selected.'''
     subparsers = parser.add_subparsers(help='Subcommands', dest='command')
-    return [x.subparser(subparsers) for x in _get_modules()]
+    selected = _selected_command(argv)
+    module, parsers = None, None
+    for name, modulename, helptext in _commands:
+        if name == selected:
+            module = importlib.import_module(modulename)
+            parsers = module.subparser(subparsers)
+        else:
+            subparsers.add_parser(name, help=helptext)
+    return (module, parsers)
 
 
 # Processing of deploy commandline args occurs here
-def deploy(parsers, args):
-    for parsers_for_module, module in zip(parsers, _get_modules()):
-        if module.deploy_args_set(args):
-            return module.deploy(parsers_for_module, args)
-    deployparser.print_help()
+def deploy(mainparser, module, parsers, args):
+    if module and module.deploy_args_set(args):
+        return module.deploy(parsers, args)
+    mainparser.print_help()
     return True
 
 
@@ -38,10 +55,10 @@ def main():
     parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
 
     retval = True
-    geniparsers = subparser(parser)
+    module, geniparsers = subparser(parser, sys.argv[1:])
 
     args = parser.parse_args()
-    retval = deploy(geniparsers, args)
+    retval = deploy(parser, module, geniparsers, args)
 
     if isinstance(retval, bool):
         exit(0 if retval else 1)
@@ -1,15 +1,17 @@
-import geni.aggregate.apt
-import geni.aggregate.cloudlab
 import geni.aggregate.protogeni
 
-mapping = {
-    geni.aggregate.cloudlab.Clemson.name: geni.aggregate.cloudlab.Clemson,
-    geni.aggregate.cloudlab.Utah.name: geni.aggregate.cloudlab.Utah,
-    geni.aggregate.cloudlab.Wisconsin.name: geni.aggregate.cloudlab.Wisconsin,
-    geni.aggregate.apt.Apt.name: geni.aggregate.apt.Apt,
-    geni.aggregate.protogeni.UTAH_PG.name: geni.aggregate.protogeni.UTAH_PG,
-    geni.aggregate.protogeni.UTAH_PG.name: geni.aggregate.protogeni.UTAH_PG
-}
+
+def _mapping():
+    '''Returns a `dict` mapping location names to aggregates. The apt and cloudlab aggregate modules are imported on first use, as not every command needs them.'''
+    import geni.aggregate.apt
+    import geni.aggregate.cloudlab
+    return {
+        geni.aggregate.cloudlab.Clemson.name: geni.aggregate.cloudlab.Clemson,
+        geni.aggregate.cloudlab.Utah.name: geni.aggregate.cloudlab.Utah,
+        geni.aggregate.cloudlab.Wisconsin.name: geni.aggregate.cloudlab.Wisconsin,
+        geni.aggregate.apt.Apt.name: geni.aggregate.apt.Apt,
+        geni.aggregate.protogeni.UTAH_PG.name: geni.aggregate.protogeni.UTAH_PG
+    }
 
 
 def location_get(obj):
@@ -17,6 +19,7 @@ def location_get(obj):
         return obj
     if isinstance(obj, str):
         lower = obj.lower()
+        mapping = _mapping()
         if not lower in mapping:
             raise KeyError('Cannot find location for given string "{}". Options: {}'.format(lower, mapping.keys()))
         return mapping[lower]
@@ -0,0 +1,46 @@
+from __future__ import absolute_import
+
+import lxml.etree as etree
+
+from adsnapshot import AdRecord
+from manifest.stream import _localname, _source
+
+'''Single-pass advertisement parser. Site advertisements run to many megabytes of XML, so we never build a document tree for them.
+Reads an advertisement RSpec with `lxml.etree.iterparse`, and yields a compact record per node as soon as its `<node>` element is complete.
+Every element is discarded right after, so memory use does not grow with the size of the advertisement.'''
+
+
+def _record(node, site):
+    '''Builds an `AdRecord` from a complete `<node>` element.'''
+    available = False
+    hw_types = []
+    for child in node:
+        name = _localname(child.tag)
+        if name == 'available':
+            available = child.get('now') == 'true'
+        elif name == 'hardware_type' and any(_localname(x.tag) == 'node_type' for x in child): # Like geni-lib, only types advertised with slots.
+            hw_types.append(child.get('name'))
+    return AdRecord(str(node.get('component_id')), hw_types, available, node.get('exclusive') != 'false', site)
+
+
+def records(advertisement, site):
+    '''Parses an advertisement RSpec in a single pass.
+    Args:
+        advertisement: Advertisement to parse. Either a string, or a file-like object.
+        site (str): Name of the site the advertisement belongs to. Stored in every record.
+
+    Returns:
+        generator of `AdRecord`, one for every advertised node, in document order.'''
+    depth = 0
+    for event, elem in etree.iterparse(_source(advertisement), events=('start', 'end'), remove_comments=True, huge_tree=True):
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1: # We only handle complete children of the root element.
+            continue
+        if _localname(elem.tag) == 'node':
+            yield _record(elem, site)
+        elem.clear()
+        while elem.getprevious() is not None: # Drops processed siblings, which `clear()` leaves in place.
+            del elem.getparent()[0]
@@ -1,76 +1,50 @@
-from enum import Enum
-import datetime
-import pprint
-import xmltodict
-
-from connectinfo import RawConnectInfo
+from __future__ import absolute_import
 
+import datetime
 
-class ManifestType(Enum):
-    CREATE_SLIVER = 0
-    RENEW_OR_LIST_SLIVER = 1
+import manifest.stream as stream
 
 
 class Manifest(object):
-    '''Object to store parsed manifest'''
+    '''Object to store parsed manifest. Only keeps a compact record per node (see `manifest.stream`), not the document itself.'''
 
-    def __init__(self, manifest, do_parse=True):
-        self.data = xmltodict.parse(manifest.text) if do_parse else manifest
-        if self.__has_indices('rspec', 'node', 0):
-            self.__num_nodes = len(self.data['rspec']['node'])
-        else:
-            self.__num_nodes = 1
+    def __init__(self, manifest):
+        self.__expires, self.__nodes = stream.parse(manifest)
 
 
     @property
     def num_nodes(self):
-        return self.__num_nodes
+        return len(self.__nodes)
+
+    @property
+    def nodes(self):
+        '''List of `NodeRecord`, one per node, in document order.'''
+        return self.__nodes
 
     @property
     def expiration(self):
-        tmp = self.data['rspec']['@expires'] if ManifestType.CREATE_SLIVER else self.data['rspec']['pg_expires']
-        return datetime.datetime.strptime(tmp, '%Y-%m-%dT%H:%M:%SZ')
-    
+        return datetime.datetime.strptime(self.__expires, '%Y-%m-%dT%H:%M:%SZ')
+
 
     def __len__(self):
-        return self.__num_nodes
+        return len(self.__nodes)
 
 
     def __str__(self):
-        return str(self.data)
+        return 'Manifest(expires={}, nodes={})'.format(self.__expires, self.__nodes)
 
 
     def __repr__(self):
         return self.__str__()
 
     def print_full(self):
-        pprint.pprint(self.data)
-
-    def __has_indices(self, *indices):
-        ptr = self.data
-        try:
-            for x in indices:
-                ptr = ptr[x]
-            return True
-        except KeyError as e:
-            return False
+        print('expires: {}'.format(self.__expires))
+        for x in self.__nodes:
+            print(x)
 
 
     def get_connect_info(self):
         '''Returns iterable of `RawConnectInfo`:(name, user, ip_local, ip_public, port) for all found nodes'''
-        if self.__num_nodes > 1:
-            return [RawConnectInfo(
-                str(self.data['rspec']['node'][idx]['@client_id']),
-                str(self.data['rspec']['node'][idx]['services']['login']['@username']),
-                str(self.data['rspec']['node'][idx]['interface']['ip']['@address']),
-                str(self.data['rspec']['node'][idx]['host']['@ipv4']),
-                str(self.data['rspec']['node'][idx]['services']['login']['@port'])) for idx in range(self.__num_nodes)]
-        elif self.__num_nodes == 1:
-            name = str(self.data['rspec']['node']['@client_id'])
-            user = str(self.data['rspec']['node']['services']['login']['@username'])
-            ip_local = str(self.data['rspec']['node']['interface']['ip']['@address'])
-            ip_public = str(self.data['rspec']['node']['host']['@ipv4'])
-            port = str(self.data['rspec']['node']['services']['login']['@port'])
-            return [RawConnectInfo(name, user, ip_local, ip_public, port)]
-        else:
-            raise RuntimeError('No nodes found!')
\ No newline at end of file
+        if not self.__nodes:
+            raise RuntimeError('No nodes found!')
+        return [x.connect_info() for x in self.__nodes]
@@ -0,0 +1,118 @@
+import lxml.etree as etree
+try:
+    from cStringIO import StringIO as _BytesReader # python2: reads a `str` in place. `io.BytesIO` would copy it, doubling peak memory for large documents.
+except ImportError:
+    from io import BytesIO as _BytesReader # python3: copies only on write.
+
+from connectinfo import RawConnectInfo
+import topology
+
+'''Single-pass manifest parser. Reads a manifest RSpec with `lxml.etree.iterparse`, and keeps only a compact record per node.
+Every `<node>` element is discarded as soon as we extracted its record, so memory use does not grow with the size of the document tree.'''
+
+
+class NodeRecord(object):
+    '''Compact description of a single allocated node.'''
+    __slots__ = ('name', 'user', 'ip_local', 'ip_public', 'port', 'hw_type', 'subnet', 'component_id', 'image', 'lan')
+
+    def __init__(self, name, user, ip_local, ip_public, port, hw_type, subnet=None, component_id=None, image=None, lan=None):
+        self.name = name
+        self.user = user
+        self.ip_local = ip_local
+        self.ip_public = ip_public
+        self.port = port
+        self.hw_type = hw_type
+        self.subnet = subnet
+        self.component_id = component_id # Physical node the aggregate mapped this node to.
+        self.image = image
+        self.lan = lan # Name of the LAN the experiment interface belongs to. Set from the `<link>` elements, which follow the nodes.
+
+
+    def connect_info(self):
+        return RawConnectInfo(self.name, self.user, self.ip_local, self.ip_public, self.port, self.subnet)
+
+
+    def __repr__(self):
+        return 'NodeRecord({})'.format(', '.join('{}={}'.format(x, getattr(self, x)) for x in self.__slots__))
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else None # Comments and processing instructions have no string tag.
+
+
+def _record(node, interfaces):
+    '''Builds a `NodeRecord` from a complete `<node>` element.
+    Args:
+        node: Complete `<node>` element.
+        interfaces (dict): We add a mapping from the client id of every interface of the node to its record.'''
+    user = port = ip_local = netmask = ip_public = hw_type = vnode_hw_type = image = None
+    iface_ids = []
+    for child in node:
+        name = _localname(child.tag)
+        if name == 'services':
+            for login in child:
+                if user == None and _localname(login.tag) == 'login':
+                    user, port = login.get('username'), login.get('port')
+        elif name == 'interface':
+            iface_ids.append(child.get('client_id'))
+            for ip in child:
+                if ip_local == None and _localname(ip.tag) == 'ip':
+                    ip_local, netmask = ip.get('address'), ip.get('netmask')
+        elif name == 'host':
+            ip_public = child.get('ipv4')
+        elif name == 'hardware_type':
+            hw_type = child.get('name')
+        elif name == 'vnode':
+            vnode_hw_type = child.get('hardware_type')
+        elif name == 'sliver_type':
+            for disk_image in child:
+                if image == None and _localname(disk_image.tag) == 'disk_image':
+                    image = disk_image.get('name')
+    subnet = topology.subnet(ip_local, netmask) if ip_local and netmask else None
+    record = NodeRecord(str(node.get('client_id')), str(user), str(ip_local or ''), str(ip_public), int(port or 22), hw_type or vnode_hw_type, subnet, node.get('component_id'), image)
+    for iface_id in iface_ids:
+        if iface_id:
+            interfaces[iface_id] = record
+    return record
+
+
+def _source(manifest):
+    '''Returns a file-like object to read given manifest (an object with a "text" attribute, a string, or a file-like object) from.'''
+    text = getattr(manifest, 'text', manifest)
+    if hasattr(text, 'read'):
+        return text
+    return _BytesReader(text.encode('utf-8') if not isinstance(text, bytes) else text)
+
+
+def parse(manifest):
+    '''Parses a manifest RSpec in a single pass.
+    Args:
+        manifest: Manifest to parse. Either a geni-lib manifest object (with a "text" attribute), a string, or a file-like object.
+
+    Returns:
+        (`str`, `list(NodeRecord)`): The "expires" attribute of the RSpec (or `None` if it has none), and a record for every node, in document order.'''
+    expires = None
+    records = []
+    interfaces = dict() # Maps interface client id to the record of its node.
+    depth = 0
+    for event, elem in etree.iterparse(_source(manifest), events=('start', 'end'), remove_comments=True):
+        if event == 'start':
+            if depth == 0:
+                expires = elem.get('expires')
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1: # We only handle complete children of the root element.
+            continue
+        tag = _localname(elem.tag)
+        if tag == 'node':
+            records.append(_record(elem, interfaces))
+        elif tag == 'link':
+            for ref in elem:
+                record = interfaces.get(ref.get('client_id')) if _localname(ref.tag) == 'interface_ref' else None
+                if record and record.lan == None:
+                    record.lan = elem.get('client_id')
+        elem.clear()
+        while elem.getprevious() is not None: # Drops processed siblings, which `clear()` leaves in place.
+            del elem.getparent()[0]
+    return (expires, records)
@@ -0,0 +1,76 @@
+import alloc.generic as generic
+import alloc.retry as retry
+import location.location as locutil
+import sharedutil
+import util.events as events
+import util.geni_util as geni_util
+import util.util as util
+
+
+'''Module to renew a cluster, moving the expiration date of its slice and sliver.'''
+
+
+def renew(slicename, location, expiration):
+    '''Renews a slice and its sliver at given location.
+    Args:
+        slicename (str): Slice name.
+        location (str): Location of the sliver.
+        expiration: If `int` type, used as new expiration time in minutes from now. If `str` type ("%Y-%m-%dT%H:%M:%S") or `datetime` type, used as the new expiration date.
+
+    Returns:
+        `True` on success, `False` otherwise.'''
+    ctx = geni_util.get_context()
+    if not ctx:
+        return False
+    date = sharedutil.datetime_get(expiration)
+    state, msg = generic.slice_renew(ctx, slicename, expiration=date) # A sliver cannot outlive its slice.
+    if state == generic.CreationState.FAILED:
+        events.error('Could not renew slice: {}'.format(msg))
+        return False
+    if not generic.sliver_renew(ctx, slicename, location=locutil.location_get(location), expiration=date):
+        events.error('Could not renew sliver of slice "{}" at {}.'.format(slicename, location))
+        return False
+    events.progress('Slice and sliver renewed until date: {}.'.format(date))
+    return True
+
+
+def renew_many(items, jobs=8):
+    '''Renews many slivers at once. Every slice is renewed once, to the latest expiration date requested for any of its slivers, before its slivers are renewed.
+    Emits a renewal event for every given item.
+    Args:
+        items (list(tuple(str, str, str))): (slicename, location, expiration) per sliver to renew. Expiration is formatted as "%Y-%m-%dT%H:%M:%S".
+        jobs (optional int): Maximal number of GENI calls in flight at once.
+
+    Returns:
+        `True` if all slivers were renewed, `False` otherwise.'''
+    ctx = geni_util.get_context()
+    if not ctx:
+        return False
+    policy = retry.get_policy() # Pool threads do not inherit our thread-local policy.
+    items = [(slicename, location, sharedutil.datetime_get(expiration)) for slicename, location, expiration in items]
+    slice_dates = dict()
+    for slicename, location, date in items:
+        slice_dates[slicename] = max(date, slice_dates.get(slicename, date))
+
+    def _renew_slice(slicename):
+        state, msg = generic.slice_renew(ctx, slicename, expiration=slice_dates[slicename], policy=policy)
+        return None if state != generic.CreationState.FAILED else 'Could not renew slice: {}'.format(msg)
+    slice_errors = dict(zip(slice_dates, util.parallel_map(_renew_slice, list(slice_dates), jobs)))
+
+    def _renew_sliver(item):
+        slicename, location, date = item
+        if slice_errors[slicename]: # A sliver cannot outlive its slice.
+            return slice_errors[slicename]
+        try:
+            site = locutil.location_get(location)
+        except KeyError as e:
+            return str(e)
+        if not generic.sliver_renew(ctx, slicename, location=site, expiration=date, policy=policy):
+            return 'Could not renew sliver of slice "{}" at {}.'.format(slicename, location)
+        return None
+    results = util.parallel_map(_renew_sliver, items, jobs)
+    for (slicename, location, date), message in zip(items, results):
+        if message:
+            events.error(message)
+        events.renewal(slicename, location, date.strftime('%Y-%m-%dT%H:%M:%S'), message == None)
+    return all(x == None for x in results)
@@ -0,0 +1,143 @@
+import alloc.generic as generic
+from allocrequest import AllocRequest, Node
+import allocate
+import location.location as locutil
+import topology
+import util.events as events
+import util.geni_util as geni_util
+
+
+'''Module to resize a running cluster in place, instead of deallocating and allocating it again.
+We compare the requested nodes against the manifest of the running sliver, and only submit the difference: nodes in both keep running (bound to the same physical node, with the same image and address), new nodes are added, and nodes no longer requested are released.'''
+
+
+class ResizePlan(object):
+    '''Trivial object holding the difference between a running sliver and a requested cluster.
+    Args:
+        keep (list(NodeRecord)): Allocated nodes that stay.
+        add (list(Node)): Requested nodes that are not allocated yet.
+        remove (list(NodeRecord)): Allocated nodes that are no longer requested.
+        changed (list(tuple(NodeRecord, Node))): Allocated nodes requested with a different hardware type. We cannot change these in place.'''
+    def __init__(self, keep, add, remove, changed):
+        self.keep = keep
+        self.add = add
+        self.remove = remove
+        self.changed = changed
+
+
+    @property
+    def empty(self):
+        return not (self.add or self.remove or self.changed)
+
+
+    def __str__(self):
+        return 'keep {} node(s), add {} ({}), remove {} ({})'.format(len(self.keep), len(self.add), ', '.join(x.name for x in self.add) or '-', len(self.remove), ', '.join(x.name for x in self.remove) or '-')
+
+
+def diff(records, allocrequest):
+    '''Computes what to change to get from allocated nodes to requested nodes.
+    Args:
+        records (list(NodeRecord)): Allocated nodes, from the manifest of the running sliver.
+        allocrequest (AllocRequest): Requested nodes.
+
+    Returns:
+        `ResizePlan`.'''
+    requested = dict((x.name, x) for x in allocrequest.list())
+    keep, remove, changed = [], [], []
+    for record in records:
+        node = requested.pop(record.name, None)
+        if node == None:
+            remove.append(record)
+        elif record.hw_type and record.hw_type != node.hw_type:
+            changed.append((record, node))
+        else:
+            if record.image and record.image != node.img:
+                print('[WARNING] Node "{}" keeps running with image "{}". Requested image "{}" only applies to new nodes.'.format(record.name, record.image, node.img))
+            keep.append(record)
+    return ResizePlan(keep, sorted(requested.values(), key=lambda x: x.name), remove, changed)
+
+
+def _unbound(records):
+    '''Returns the names of given allocated nodes that we cannot bind to their physical node, because the manifest lacks their component id.'''
+    return [x.name for x in records if not x.component_id]
+
+
+def _request(plan, topology_options=None):
+    '''Builds the request RSpec describing the sliver after resizing: kept nodes bound to their physical nodes, on their current addresses, and new nodes.
+    Kept nodes carry no disk image, so the aggregate leaves them untouched. Callers must check that all kept nodes have a component id (see `_unbound`).'''
+    target = AllocRequest()
+    target.nodes = [Node(x.name, x.hw_type, None) for x in plan.keep] + list(plan.add)
+    lan_plans = topology.extend(topology.current(plan.keep), plan.add, plan.keep, topology_options)
+    return allocate.create_request(target, topology_options, lan_plans, dict((x.name, x.component_id) for x in plan.keep if x.component_id))
+
+
+def resize(slicename, location, allocrequest, topology_options=None, dry_run=False):
+    '''Resizes a running cluster to the nodes in an `AllocRequest`, keeping nodes present in both running.
+    Args:
+        slicename (str): Slice name.
+        location (str): Location of the sliver.
+        allocrequest (AllocRequest): All nodes the cluster should have afterwards.
+        topology_options (optional TopologyOptions): How to connect new nodes. Defaults to a single LAN.
+        dry_run (optional bool): If set, only prints what we would change.
+
+    Returns:
+        List of `RawConnectInfo` for the resized cluster on success (for the current cluster, if `dry_run` is set), `None` otherwise.'''
+    ctx = geni_util.get_context()
+    if not ctx:
+        return None
+    loc = locutil.location_get(location)
+    manifest = generic.sliver_res(ctx, slicename, loc)
+    if manifest == None:
+        events.error('Could not fetch the running sliver of slice "{}" at {}. Use "allocate" to create a new cluster.'.format(slicename, location))
+        return None
+
+    plan = diff(manifest.nodes, allocrequest)
+    if plan.changed:
+        events.error('Cannot change the hardware type of running nodes: {}. Remove them first, or use other names.'.format(', '.join('{} ({} -> {})'.format(record.name, record.hw_type, node.hw_type) for record, node in plan.changed)))
+        return None
+    if not plan.keep and not plan.add:
+        events.error('Resizing would remove all nodes. Use "deallocate" instead.')
+        return None
+    if _unbound(plan.keep):
+        events.error('Cannot keep nodes {} running: the manifest does not tell which physical nodes they run on.'.format(', '.join(_unbound(plan.keep))))
+        return None
+    events.progress('Resize plan: {}.'.format(plan))
+    if dry_run or plan.empty:
+        if plan.empty:
+            events.progress('Nothing to change.')
+        events.manifest(manifest, location)
+        return manifest.get_connect_info()
+
+    request = _request(plan, topology_options)
+    manifest = generic.sliver_update(ctx, slicename, request, loc, node_types=dict((x.name, x.hw_type) for x in plan.add))
+    if manifest == None:
+        return None
+    return manifest.get_connect_info()
+
+
+def release(ctx, slicename, location, manifest, names, replace=False, topology_options=None):
+    '''Releases nodes from a running sliver, keeping all other nodes running. Optionally requests fresh nodes in their place, without waiting for them to get ready.
+    Emits no manifest event: callers report the nodes they keep themselves.
+    Args:
+        ctx: geni-lib context.
+        slicename (str): Slice name.
+        location: physical cluster site.
+        manifest (Manifest): Current manifest of the sliver.
+        names (iterable(str)): Names of the nodes to release.
+        replace (optional bool): If set, afterwards requests new nodes with the same names, hardware types and images.
+        topology_options (optional TopologyOptions): How to connect replacement nodes. Defaults to a single LAN.
+
+    Returns:
+        `Manifest` of the sliver afterwards on success, `None` otherwise.'''
+    names = set(names)
+    keep = [x for x in manifest.nodes if not x.name in names]
+    gone = [x for x in manifest.nodes if x.name in names]
+    if _unbound(keep):
+        events.error('Cannot release nodes while keeping nodes {} running: the manifest does not tell which physical nodes they run on.'.format(', '.join(_unbound(keep))))
+        return None
+    # Nodes are matched by name, so we release nodes before requesting replacements with the same names.
+    manifest = generic.sliver_update(ctx, slicename, _request(ResizePlan(keep, [], gone, []), topology_options), location, wait_ready=False, report=False)
+    if manifest == None or not replace:
+        return manifest
+    replacements = [Node(x.name, x.hw_type, x.image) if x.image else Node(x.name, x.hw_type) for x in gone]
+    return generic.sliver_update(ctx, slicename, _request(ResizePlan(manifest.nodes, replacements, [], []), topology_options), location, wait_ready=False, report=False)
@@ -0,0 +1,128 @@
+import datetime
+import fcntl
+import os
+import threading
+import time
+
+import geni.aggregate.context
+
+'''Disk-backed cache for slice credentials, shared by all python2 processes of this tool.
+geni-lib downloads a fresh slice credential for every call when the credential expires within 3 days, which is always the case for our slices.
+Instead, we keep credentials in `~/.metareserve/metareserve_geni/credentials` and only download again when they (almost) expire, or when we are told they changed.
+Since the slice info (expiration date, URN) is parsed from the credential, slice info lookups need no remote call either.
+When a credential turns out to be expired, we download it again before raising `CredentialExpiredError`: the slice may have been renewed elsewhere.
+Processes lock a credential file while downloading it, so concurrent processes download each credential once.'''
+
+_expire_margin = 60 # Number of seconds before expiration at which we consider a credential expired.
+_expired_ttl = 300 # Number of seconds we trust a stored credential that says its slice expired. Someone may have created a new slice with the same name since.
+_locks = dict() # Maps credential path to a `threading.Lock`, protecting against concurrent downloads by threads of one process. `fcntl` locks only work between processes.
+_locks_lock = threading.Lock()
+
+
+def path():
+    return os.path.join(os.getenv('HOME'), '.metareserve', 'metareserve_geni', 'credentials')
+
+
+def _credpath(context, project, slicename):
+    return os.path.join(path(), '{}-{}-{}-scred.xml'.format(context.cf.name, project, slicename))
+
+
+class _FileLock(object):
+    '''Exclusive lock on a credential, between threads and processes.'''
+    def __init__(self, credpath):
+        self.lockpath = credpath+'.lock'
+        with _locks_lock:
+            self.lock = _locks.setdefault(credpath, threading.Lock())
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            if not os.path.isdir(os.path.dirname(self.lockpath)):
+                os.makedirs(os.path.dirname(self.lockpath))
+            self.f = open(self.lockpath, 'a')
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        except Exception as e:
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+            self.f.close()
+        finally:
+            self.lock.release()
+
+
+class CachedSliceCredInfo(geni.aggregate.context.SliceCredInfo):
+    '''`SliceCredInfo` reading its credential from our cache, downloading it only when missing or (almost) expired.'''
+    def __init__(self, context, slicename, project):
+        self.project = project
+        super(CachedSliceCredInfo, self).__init__(context, slicename)
+
+
+    def _build(self):
+        self._path = _credpath(self.context, self.project, self.slicename)
+        with _FileLock(self._path):
+            if os.path.isfile(self._path):
+                self._parseInfo()
+                if not self._expired() or time.time() - os.path.getmtime(self._path) < _expired_ttl:
+                    return
+            self._download()
+
+
+    def _expired(self):
+        return self.expires <= datetime.datetime.utcnow() + datetime.timedelta(seconds=_expire_margin) # Credentials state expiration dates in UTC.
+
+
+    def _download(self):
+        '''Downloads the credential. Caller must hold the file lock.'''
+        cred = self.context.cf.getSliceCredentials(self.context, self.slicename)
+        tmppath = '{}.{}.tmp'.format(self._path, os.getpid())
+        with open(tmppath, 'wb') as f:
+            f.write(cred if isinstance(cred, bytes) else cred.encode('utf-8'))
+        os.rename(tmppath, self._path) # Atomic on posix systems, so readers never see a partial credential.
+        self._parseInfo()
+
+
+    def _downloadCredential(self): # Called by geni-lib itself.
+        with _FileLock(self._path):
+            self._download()
+
+
+    @property
+    def path(self):
+        if self._expired():
+            with _FileLock(self._path):
+                if os.path.isfile(self._path):
+                    self._parseInfo() # Another process may have refreshed it already.
+                if self._expired():
+                    self._download()
+            if self.expires <= datetime.datetime.utcnow():
+                raise geni.aggregate.context.SliceCredInfo.CredentialExpiredError(self.slicename, self.expires)
+        return self._path
+
+
+def install(context):
+    '''Makes given geni-lib context use our credential cache for all slice credentials.'''
+    def _getSliceInfo(sname, project=None):
+        if not project:
+            project = context.project
+        key = '{}-{}'.format(project, sname)
+        if not key in context._slicecreds:
+            context._slicecreds[key] = CachedSliceCredInfo(context, sname, project)
+        return context._slicecreds[key]
+    context.getSliceInfo = _getSliceInfo
+
+
+def invalidate(context, slicename, project=None):
+    '''Drops the credential for a slice, in memory and on disk. Call this after the slice changed (e.g. got renewed or created).'''
+    if not project:
+        project = context.project
+    context._slicecreds.pop('{}-{}'.format(project, slicename), None)
+    credpath = _credpath(context, project, slicename)
+    with _FileLock(credpath):
+        try:
+            os.remove(credpath)
+        except OSError as e:
+            pass
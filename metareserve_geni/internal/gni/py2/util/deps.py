@@ -1,3 +1,6 @@
+import os
+import sys
+
 import util as gutil
 
 
@@ -32,19 +35,10 @@ def geni_lxml_check(silent):
             print('dependency not met: lxml')
         return False
 
-def geni_xmltodict_check(silent):
-    try:
-        import xmltodict
-        return True
-    except Exception as e:
-        if not silent:
-            print('dependency not met: xmltodict')
-        return False
-
 # Checks all dependencies at once. Returns `True` when all dependencies are satisfied.
 def geni_dependency_checks(silent=False):
     status = True
-    for x in (geni_lib_check, geni_six_check, geni_lxml_check, geni_xmltodict_check):
+    for x in (geni_lib_check, geni_six_check, geni_lxml_check):
         if not x(silent):
             status = False
     return status
@@ -67,4 +61,26 @@ def geni_check(check_deps=True, silent=False):
     if not gutil.ensure_version(geni_required_version, geni_found_version, greater_allowed=False):
         print('dependency "geni-lib" has incorrect version "{}", require version {}'.format(geni_found_version, '.'.join(str(x) for x in geni_required_version)))
         return False
-    return True
\ No newline at end of file
+    return True
+
+def geni_versions():
+    '''Returns a dict mapping each dependency to its installed version string. Dependencies which cannot be found map to `None`.'''
+    versions = {'geni-lib': gutil.get_version('geni-lib')}
+    for name in ('six', 'lxml'):
+        try:
+            module = __import__(name)
+            versions[name] = getattr(module, '__version__', None)
+        except Exception as e:
+            versions[name] = None
+    if versions['lxml'] == None:
+        try:
+            import lxml.etree
+            versions['lxml'] = lxml.etree.__version__
+        except Exception as e:
+            pass
+    return versions
+
+
+def site_packages():
+    '''Returns the site-packages directories of this interpreter. Installing or removing packages changes their modification times.'''
+    return [x for x in sys.path if os.path.basename(x) in ('site-packages', 'dist-packages') and os.path.isdir(x)]
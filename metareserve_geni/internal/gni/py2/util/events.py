@@ -0,0 +1,81 @@
+import threading
+
+'''Typed events describing the progress of GENI operations, streamed to python3 by the worker.
+Event types:
+ - progress: {"type": "progress", "message": <str>}
+ - node: {"type": "node", "info": <RawConnectInfo string>}, sent as soon as we know connection info for a node.
+ - manifest: {"type": "manifest", "num_nodes": <int>, "expiration": <str or null>, "location": <str or null>}, sent once per parsed manifest, before its nodes.
+ - quorum: {"type": "quorum", "ready": <list of node names>, "pending": <list of node names>}, sent when enough nodes of a sliver are ready to use it, while others are not. Followed by a manifest event with only the ready nodes.
+ - node_state: {"type": "node_state", "name": <str>, "state": <"allocated", "booting", "ready" or "failed">}, sent when a node changes state while we wait for the sliver.
+ - capacity: {"type": "capacity", "location": <str>, "free": <dict mapping hardware type to number of available nodes>}, sent for every site we fetched an advertisement from.
+ - renewal: {"type": "renewal", "slicename": <str>, "location": <str>, "expiration": <str>, "status": <bool>}, sent for every sliver in a batch renewal.
+ - error: {"type": "error", "message": <str>}
+Progress and error messages are always printed for the user too. Without a sink (e.g. when running through `cli.py`), nothing else happens.'''
+
+_local = threading.local()
+
+
+def set_sink(sink):
+    '''Sets the function receiving events (as `dict`) for the current thread. Pass `None` to unset.'''
+    _local.sink = sink
+
+
+def get_sink():
+    '''Returns the function receiving events for the current thread, or `None`. Threads working for the same request should set it too (see `set_sink`).'''
+    return getattr(_local, 'sink', None)
+
+
+def _emit(event):
+    sink = getattr(_local, 'sink', None)
+    if sink:
+        sink(event)
+
+
+def progress(message):
+    print(message)
+    _emit({'type': 'progress', 'message': message})
+
+
+def error(message):
+    print('[ERROR] {}'.format(message))
+    _emit({'type': 'error', 'message': message})
+
+
+def node_state(name, state):
+    _emit({'type': 'node_state', 'name': name, 'state': state})
+
+
+def capacity(location, free):
+    _emit({'type': 'capacity', 'location': location, 'free': free})
+
+
+def renewal(slicename, location, expiration, status):
+    _emit({'type': 'renewal', 'slicename': slicename, 'location': location, 'expiration': expiration, 'status': status})
+
+
+def quorum(ready, pending):
+    _emit({'type': 'quorum', 'ready': ready, 'pending': pending})
+
+
+def manifest(manifest, location=None, node_names=None):
+    '''Emits a summary of given `Manifest`, followed by a node event for each node in it.
+    Args:
+        manifest (Manifest): Manifest to emit.
+        location (optional str): Name of the site the manifest belongs to.
+        node_names (optional iterable(str)): If set, only emits nodes with these names.'''
+    try:
+        expiration = manifest.expiration.strftime('%Y-%m-%dT%H:%M:%S')
+    except Exception as e: # Not all manifests carry an expiration date.
+        expiration = None
+    nodes([x for x in manifest.get_connect_info() if node_names == None or x.name in node_names], location, expiration)
+
+
+def nodes(infos, location=None, expiration=None):
+    '''Emits a manifest event for given nodes, followed by a node event for each of them.
+    Args:
+        infos (list(RawConnectInfo)): Nodes to emit.
+        location (optional str): Name of the site the nodes belong to.
+        expiration (optional str): Expiration date of the nodes, in UTC ("%Y-%m-%dT%H:%M:%S").'''
+    _emit({'type': 'manifest', 'num_nodes': len(infos), 'expiration': expiration, 'location': location})
+    for info in infos:
+        _emit({'type': 'node', 'info': str(info)})
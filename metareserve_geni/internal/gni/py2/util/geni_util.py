@@ -1,6 +1,27 @@
+from __future__ import absolute_import
+
+import threading
+
 import geni.util
 
+import util.credcache as credcache
+
+_context = None
+_context_lock = threading.Lock()
+
+
 def get_context():
+    '''Loads the geni-lib context. The context is loaded once per process and shared by all threads afterwards, which matters for the long-lived worker.'''
+    global _context
+    with _context_lock:
+        if not _context:
+            _context = _load_context()
+            if _context:
+                credcache.install(_context)
+        return _context
+
+
+def _load_context():
     try:
         return geni.util.loadContext()
     except IOError as e: # File not found. No credentials loaded?
@@ -1,6 +1,7 @@
 import datetime
 import sys
 import subprocess
+import threading
 
 
 def get_version(packagename):
@@ -45,4 +46,37 @@ def ensure_version(nums, string, greater_allowed=True):
             return True and greater_allowed
         elif int(found) < x: # Previous version numbers equal to minimum, now smaller
             return False
-    return True # Exact match found
\ No newline at end of file
+    return True # Exact match found
+
+
+
+def parallel_map(func, items, jobs=8):
+    '''Calls `func` on every item, using at most `jobs` threads at once.
+    Note: `func` runs in other threads, so thread-local settings (event sink, retry policy) of the caller do not apply to it. `func` should not raise.
+    Args:
+        func (function): Function receiving a single item.
+        items (list): Items to process.
+        jobs (optional int): Maximal number of concurrent calls.
+
+    Returns:
+        list of results, in the order of `items`.'''
+    items = list(items)
+    results = [None]*len(items)
+    lock = threading.Lock()
+    state = {'next': 0}
+    def _work():
+        while True:
+            with lock:
+                idx = state['next']
+                if idx >= len(items):
+                    return
+                state['next'] += 1
+            results[idx] = func(items[idx])
+
+    threads = [threading.Thread(target=_work) for x in range(min(jobs, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
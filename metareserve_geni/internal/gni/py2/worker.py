@@ -0,0 +1,162 @@
+import os
+import sys
+import threading
+import traceback
+
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(sys.argv[0]))), 'shared'))
+
+import protocol
+from retrypolicy import RetryPolicy
+import alloc.retry as retry
+import util.deps as deps
+import util.events as events
+
+'''Long-lived python2 worker, serving GENI operations to python3.
+Unlike `cli.py`, which handles one command and exits, this process handles requests until its stdin closes (or a "shutdown" request arrives).
+Imported modules and the loaded geni-lib context stay alive between requests.
+
+Protocol (see `shared/protocol.py` for framing):
+ - On startup, the worker checks its dependencies (unless started with "--skip-check") and sends
+   {"type": "ready", "status": <bool>, "versions": <dict or null>, "site_packages": <list or null>}. If status is false, the worker exits afterwards.
+ - Requests look like {"id": <int>, "command": <str>, "args": <dict>, "retry_policy": <dict or null>}. The optional retry policy (see `shared/retrypolicy.py`) applies to all GENI calls made for the request. Multiple requests may be in flight at once, each is handled in its own thread.
+ - While handling a request, the worker streams events for it (see `util/events.py` for event types), each tagged with the request "id".
+ - Each request ends with exactly one {"id": <int>, "type": "done", "status": <bool>}.
+ - A "shutdown" request (or closing stdin) makes the worker exit after finishing all running requests.'''
+
+
+def _topology_options(data):
+    from topology import TopologyOptions
+    return TopologyOptions.from_dict(data) if data else None
+
+
+def _allocate(slicename, expiration, location, allocrequest, topology=None, min_ready=None, spares=0, create_slice=True):
+    import allocate
+    from allocrequest import AllocRequest
+    infos = allocate.allocate(slicename, expiration, location, AllocRequest.from_string(allocrequest), _topology_options(topology), min_ready, spares, create_slice)
+    return (infos != None, infos)
+
+
+def _settle(slicename, location, pending, topology=None, replace_failed=False):
+    import allocate
+    infos = allocate.settle(slicename, location, pending, replace_failed, _topology_options(topology))
+    return (infos != None, infos)
+
+
+def _allocate_hedged(slicename, expiration, locations, allocrequest, stagger=0, topology=None):
+    import allocate
+    from allocrequest import AllocRequest
+    location, infos = allocate.allocate_hedged(slicename, expiration, locations, AllocRequest.from_string(allocrequest), stagger, _topology_options(topology))
+    return (infos != None, infos)
+
+
+def _create_slice(slicename, expiration):
+    import allocate
+    return (allocate.create_slice(slicename, expiration) != None, None)
+
+
+def _deallocate(slicename, location):
+    import deallocate
+    return (bool(deallocate.deallocate(slicename, location)), None)
+
+
+def _renew(slicename, location, expiration):
+    import renew
+    return (renew.renew(slicename, location, expiration), None)
+
+
+def _renew_many(items, jobs=8):
+    import renew
+    return (renew.renew_many(items, jobs), None)
+
+
+def _capacity(locations, snapshot_dir=None):
+    import capacity
+    return (capacity.capacity(locations, snapshot_dir=snapshot_dir), None)
+
+
+def _resize(slicename, location, allocrequest, topology=None, dry_run=False):
+    import resize
+    from allocrequest import AllocRequest
+    infos = resize.resize(slicename, location, AllocRequest.from_string(allocrequest), _topology_options(topology), dry_run)
+    return (infos != None, infos)
+
+
+def _list(slicename=None, location=None, corrected=True):
+    import listing
+    return listing.list_slices(slicename, location, corrected)
+
+
+_handlers = {
+    'allocate': _allocate,
+    'allocate_hedged': _allocate_hedged,
+    'capacity': _capacity,
+    'create_slice': _create_slice,
+    'deallocate': _deallocate,
+    'list': _list,
+    'renew': _renew,
+    'renew_many': _renew_many,
+    'resize': _resize,
+    'settle': _settle,
+}
+
+
+def handle(request, send):
+    '''Executes a single request.
+    Args:
+        request (dict): Request to execute.
+        send (function): Function sending a message to python3.'''
+    request_id = request.get('id')
+    events.set_sink(lambda event: send(dict(event, id=request_id)))
+    try:
+        if request.get('retry_policy'):
+            retry.set_policy(RetryPolicy.from_dict(request['retry_policy']))
+        handler = _handlers.get(request.get('command'))
+        if not handler:
+            events.error('Unknown worker command "{}".'.format(request.get('command')))
+            status = False
+        else:
+            status, _ = handler(**request.get('args', {}))
+    except Exception as e:
+        traceback.print_exc()
+        events.error('Worker command "{}" raised {}: {}'.format(request.get('command'), type(e).__name__, e))
+        status = False
+    finally:
+        events.set_sink(None)
+        retry.set_policy(None)
+    send({'id': request_id, 'type': 'done', 'status': status})
+
+
+def main():
+    channel = sys.stdout
+    sys.stdout = sys.stderr # Everything the command modules print is meant for the user, not for the protocol channel.
+    channel_lock = threading.Lock()
+    def send(message):
+        with channel_lock:
+            protocol.write_message(channel, message)
+
+    if '--skip-check' in sys.argv[1:]: # Caller has a valid fingerprint of this environment, dependencies were verified before.
+        send({'type': 'ready', 'status': True, 'versions': None, 'site_packages': None})
+    elif not deps.geni_check(silent=False):
+        print('There were unmet dependencies for python2. Please install the correct versions of missing packages in (!!!) python2 (!!!) and try again.')
+        send({'type': 'ready', 'status': False, 'versions': None, 'site_packages': None})
+        return False
+    else:
+        send({'type': 'ready', 'status': True, 'versions': deps.geni_versions(), 'site_packages': deps.site_packages()})
+
+    running = []
+    while True:
+        request = protocol.read_message(sys.stdin)
+        if request == None or request.get('command') == 'shutdown':
+            for thread in running:
+                thread.join()
+            return True
+        # Requests are handled concurrently, sharing imported modules and the geni-lib context.
+        running = [x for x in running if x.is_alive()]
+        thread = threading.Thread(target=handle, args=(request, send))
+        thread.daemon = True
+        thread.start()
+        running.append(thread)
+
+
+if __name__ == '__main__':
+    exit(0 if main() else 1)
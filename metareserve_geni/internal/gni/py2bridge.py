@@ -1,20 +1,82 @@
+import asyncio
+import atexit
+import calendar
+import datetime
+import itertools
 import metareserve
-import os
+import queue
 import subprocess
-import tempfile
+import threading
 
 from internal.gni.shared.connectinfo import RawConnectInfo as _RawConnectInfo
 import internal.gni.shared.sharedutil as _sharedutil
 from internal.gni.shared.allocrequest import AllocRequest as _AllocRequest
+import internal.gni.shared.protocol as _protocol
+from internal.gni.shared.retrypolicy import RetryPolicy
+import internal.gni.environment as _environment
+import internal.gni.ledger as _ledger
 import internal.util.fs as fs
+import internal.util.location as loc
 from internal.util.printer import *
 
 
-'''Files with functionality to call the py2 cli commandline functions from python3. This hack makes us able to 'call' python2 code from python3.'''
+'''Files with functionality to call py2 functions from python3. This hack makes us able to 'call' python2 code from python3.
+We start one long-lived python2 worker process per python3 process, and send it requests over its stdin/stdout.'''
+
+_retry_policy = None # Default `RetryPolicy` for GENI calls, used when callers do not pass one. If `None`, python2 uses its own default.
+
+
+def set_retry_policy(policy):
+    '''Sets the default retry policy for all following operations.
+    Args:
+        policy (RetryPolicy): Policy to use. Pass `None` to restore the python2 default.'''
+    global _retry_policy
+    _retry_policy = policy
+
+
+def _make_request(request_id, command, retry_policy, args):
+    policy = retry_policy or _retry_policy
+    return {'id': request_id, 'command': command, 'args': args, 'retry_policy': policy.to_dict() if policy else None}
+
+
+def _to_node(node_id, info):
+    '''Converts a `RawConnectInfo` string to a `metareserve.Node`. If known, the subnet of the node (e.g. "10.0.4.0/22") is stored in its `extra_info`.'''
+    x = _RawConnectInfo.from_string(info)
+    extra_info = {'user': x.user}
+    if x.subnet:
+        extra_info['subnet'] = x.subnet
+    return metareserve.Node(node_id, node_name=x.name, ip_local=x.ip_local, ip_public=x.ip_public, port=x.port, extra_info=extra_info)
+
+
+def _topology_of(reservation_request):
+    '''Returns the topology options of a reservation request as a `dict`, or `None` if it has none.'''
+    options = getattr(reservation_request, 'topology', None)
+    return options.to_dict() if options else None
+
+
+def _local_date(string):
+    '''Converts a manifest expiration date (UTC, "%Y-%m-%dT%H:%M:%S") to a naive local `datetime`, the clock the ledger and `renewd` use.'''
+    return datetime.datetime.fromtimestamp(calendar.timegm(datetime.datetime.strptime(string, '%Y-%m-%dT%H:%M:%S').timetuple()))
+
+
+def _record(result, slicename, location, expiration=None):
+    '''Records the nodes of a successful allocate or list request in the reservation ledger.
+    Args:
+        result (_Result): Result of the request.
+        expiration (optional int or datetime): Expiration time in minutes from now, or expiration date (local time), we requested. Used when the manifest carries no expiration date.'''
+    date = None
+    if result.manifest and result.manifest.get('expiration'):
+        date = _local_date(result.manifest['expiration'])
+    elif isinstance(expiration, int):
+        date = datetime.datetime.now() + datetime.timedelta(minutes=expiration)
+    elif isinstance(expiration, datetime.datetime):
+        date = expiration
+    _ledger.record(slicename, location, result.infos, date)
+
 
 def _to_internal_request(reservation_request):
     allocrequest = _AllocRequest()
-    for x in reservation_request.nodes:
+    for x in reservation_request.profile.entries: # Node ranges travel to python2 unexpanded.
         allocrequest.add(x.name, x.hw_type, x.image)
     return allocrequest
 
@@ -23,106 +85,592 @@ def _to_reservation_request(internalrequest):
     pass
 
 
-def _get_py2_cli():
+def _get_py2_worker():
     import pathlib
-    return fs.join(str(pathlib.Path(__file__).parent.absolute()), 'py2', 'cli.py')
+    return fs.join(str(pathlib.Path(__file__).parent.absolute()), 'py2', 'worker.py')
 
 
-def _get_py2_executable_name():
-    '''Simple function trying to find the python2 executable name.
-    Returns:
-        The name of the python2 executable on success, `None` otherwise.'''
-    if subprocess.call('which python2', shell=True, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL) == 0:
-        return 'python2'
-    if subprocess.call('which python', shell=True, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL) == 0:
-        return 'python'
-    return None
+def _get_worker_cmd():
+    '''Builds the command to start a python2 worker.
+    If we have a valid environment fingerprint, the worker skips its (slow) dependency checks.
 
+    Returns:
+        (`list(str)`, `dict`): Arg 1 is the command to execute, or `None` if we found no python2 executable. Arg 2 is the environment fingerprint, or `None` if we have no valid fingerprint.'''
+    fingerprint = _environment.load()
+    executable = fingerprint['executable'] if fingerprint else _environment.find_py2_executable()
+    if not executable:
+        printe('Could not find a python2 executable.')
+        return (None, None)
+    cmd = [executable, _get_py2_worker()]
+    if fingerprint:
+        cmd.append('--skip-check')
+    return (cmd, fingerprint)
 
-def _py2_exec_get_nodes(cmd, stdin=None):
-    '''Executes py2bridge commands which expect to get `metareserve.Node` back.
-    Args:
-        cmd (str): Command to execute. Note: We append a '--tmpoutloc path/to/tmpdir' arg, where we store returning info.
-        stdin (optional str): If set, given string will be sent to the stdin of the python2 application. Note: Encoding to utf-8 happens inside this function.
 
+def _check_ready(message, executable, fingerprint):
+    '''Checks the ready-message of a freshly started worker. If we had no valid fingerprint, we store a new one now that the worker verified its dependencies.
     Returns:
-        List of `metareserve.Node` on success, `None` on failure.'''
-    with tempfile.TemporaryDirectory() as tmpdirname: # We use a tempfile to store the returned connectioninfo.
-        path = fs.join(tmpdirname, 'metareserve_geni.tmp')
-        cmd += ' --tmpoutloc {}'.format(path)
+        `True` if the worker is ready, `False` otherwise.'''
+    if not (message and message.get('status')):
+        printe('Could not start python2 worker.')
+        return False
+    if not fingerprint:
+        try:
+            _environment.store(executable, message['versions'], message['site_packages'])
+        except OSError as e:
+            printw('Could not store python2 environment fingerprint: {}'.format(e))
+    return True
 
-        if stdin:
-            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, shell=True)
-            process.communicate(stdin.encode('utf-8'))
-        else:
-            process = subprocess.Popen(cmd, shell=True)
-            process.communicate()
-        if process.returncode != 0:
-            return (False, None)
-        with open(path, 'r') as f:
+
+class _Py2Worker(object):
+    '''Handle to a long-lived python2 worker process (see `py2/worker.py`).
+    The process is started on first use and restarted when it died.
+    Requests may be sent from multiple threads at once. The worker handles them concurrently, and a reader thread routes the events it streams back to the thread waiting for them.'''
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = dict() # Maps request id to (worker process, `queue.Queue` receiving events for the request).
+        atexit.register(self.stop)
+
+
+    def _running(self):
+        return self._process != None and self._process.poll() == None
+
+
+    def _start(self):
+        '''Starts the worker process and waits for its ready-message. Must be called while holding `self._lock`.
+        Returns:
+            `True` on success, `False` otherwise.'''
+        cmd, fingerprint = _get_worker_cmd()
+        if not cmd:
+            return False
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True, bufsize=1)
+        if not _check_ready(_protocol.read_message(self._process.stdout), cmd[0], fingerprint):
+            self._process.wait()
+            self._process = None
+            return False
+        threading.Thread(target=self._read_loop, args=(self._process,), daemon=True).start()
+        return True
+
+
+    def _read_loop(self, process):
+        '''Routes events from given worker process to the threads waiting for them. Runs until the process closes its stdout.'''
+        try:
+            while True:
+                event = _protocol.read_message(process.stdout)
+                if not event:
+                    break
+                with self._lock:
+                    pending = self._pending.get(event.get('id'))
+                if pending:
+                    pending[1].put(event)
+        except (OSError, ValueError) as e:
+            pass
+        with self._lock: # Worker is gone. Wake up everyone still waiting on it.
+            if process.poll() == None:
+                process.kill()
+            if self._process == process:
+                self._process = None
+            for owner, events in self._pending.values():
+                if owner == process:
+                    events.put(None)
+
+
+    def start(self):
+        '''Starts the worker process, if it does not run already.
+        Returns:
+            `True` if the worker runs, `False` otherwise.'''
+        with self._lock:
+            return self._running() or self._start()
+
+
+    def call(self, command, callback=None, retry_policy=None, **kwargs):
+        '''Sends a request to the worker and processes the events it streams back, until the request is done. Thread-safe.
+        Args:
+            command (str): Command to execute (e.g. "allocate", "deallocate", "list").
+            callback (optional function): If set, called with every event (`dict`) as soon as it arrives. See `_Result.feed` for event contents.
+            retry_policy (optional RetryPolicy): Policy for GENI calls made by this command. Defaults to the policy set with `set_retry_policy`.
+            kwargs: Arguments for the command. Must be JSON-serializable.
+
+        Returns:
+            `_Result` of the request. If the worker could not be reached, its status is `False`.'''
+        result = _Result(callback)
+        events = queue.Queue()
+        with self._lock:
+            if not self._running() and not self._start():
+                return result
+            request_id = next(self._ids)
+            self._pending[request_id] = (self._process, events)
+            try:
+                _protocol.write_message(self._process.stdin, _make_request(request_id, command, retry_policy, kwargs))
+            except (OSError, ValueError) as e:
+                events.put(None)
+        try:
+            while True:
+                event = events.get()
+                if not event:
+                    printe('Lost connection to python2 worker.')
+                    return result
+                if result.feed(event):
+                    return result
+        finally:
+            with self._lock:
+                del self._pending[request_id]
+
+
+    def stop(self):
+        '''Stops the worker process, if it runs. The worker finishes running requests first.'''
+        with self._lock:
+            process = self._process
+            self._process = None
+        if not process:
+            return
+        try:
+            _protocol.write_message(process.stdin, {'command': 'shutdown'})
+            process.stdin.close()
+            process.wait(timeout=60)
+        except Exception as e:
+            process.kill()
+
+
+_worker = _Py2Worker()
+
+
+class _Result(object):
+    '''Collects the events the python2 worker streams back for a single request.'''
+    def __init__(self, callback=None):
+        self.status = False
+        self.manifest = None
+        self.nodes = []
+        self.infos = [] # `RawConnectInfo` strings, one per node.
+        self.errors = []
+        self.node_states = dict() # Maps node name to its last known state.
+        self.capacity = dict() # Maps location to a `dict` mapping hardware type to number of available nodes.
+        self.renewals = [] # (slicename, location, expiration string, status) per sliver of a batch renewal.
+        self.quorum = None # Last quorum event, if any.
+        self._callback = callback
+
+
+    def feed(self, event):
+        '''Processes an event. Events are `dict`s with a "type" key:
+         - progress: has a "message" (str).
+         - manifest: has "num_nodes" (int), "expiration" (str in UTC, or `None`) and "location" (str or `None`). Precedes the node events for that manifest.
+         - node: has "info" (`RawConnectInfo` string). We add a "node" key with the corresponding `metareserve.Node`.
+         - node_state: has "name" (str) and "state" (one of "allocated", "booting", "ready", "failed"). Sent whenever a node changes state while we wait for readiness.
+         - quorum: has "ready" and "pending" (lists of node names). Sent when enough nodes are ready to use the sliver, while others are not. The next manifest event lists only the ready nodes. See `settle` to handle the pending nodes.
+         - capacity: has "location" (str) and "free" (`dict` mapping hardware type to number of available nodes). Sent for every site we fetched an advertisement from.
+         - renewal: has "slicename" (str), "location" (str), "expiration" (str) and "status" (bool). Sent for every sliver in a batch renewal.
+         - error: has a "message" (str).
+         - done: has a "status" (bool). Always the last event of a request.
+
+        Returns:
+            `True` if given event was the last event of the request, `False` otherwise.'''
+        event_type = event.get('type')
+        if event_type == 'manifest':
+            self.manifest = event
+            self.nodes = []
+            self.infos = []
+        elif event_type == 'node':
+            event['node'] = _to_node(len(self.nodes), event['info'])
+            self.nodes.append(event['node'])
+            self.infos.append(event['info'])
+        elif event_type == 'node_state':
+            self.node_states[event['name']] = event['state']
+        elif event_type == 'quorum':
+            self.quorum = event
+        elif event_type == 'capacity':
+            self.capacity[event['location']] = event['free']
+        elif event_type == 'renewal':
+            self.renewals.append((event['slicename'], event['location'], event['expiration'], bool(event['status'])))
+        elif event_type == 'error':
+            self.errors.append(event['message'])
+        elif event_type == 'done':
+            self.status = bool(event['status'])
+        if self._callback:
+            try:
+                self._callback(event)
+            except Exception as e:
+                printw('Event callback raised {}: {}'.format(type(e).__name__, e))
+        return event_type == 'done'
+
+
+class _AsyncPy2Worker(object):
+    '''asyncio counterpart of `_Py2Worker`. Every asynchronous operation gets its own worker process.
+    That way, one event loop drives many operations concurrently, and cancelling an operation kills only its own process.'''
+    def __init__(self):
+        self._process = None
+
+
+    async def start(self):
+        '''Starts the worker process and waits for its ready-message.
+        Returns:
+            `True` on success, `False` otherwise.'''
+        cmd, fingerprint = _get_worker_cmd()
+        if not cmd:
+            return False
+        self._process = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        return _check_ready(await self._read(), cmd[0], fingerprint)
+
+
+    async def _read(self):
+        while True:
+            line = await self._process.stdout.readline()
+            if not line:
+                return None
+            message = _protocol.decode_message(line.decode('utf-8'))
+            if message != None:
+                return message
+
+
+    async def call(self, command, callback=None, retry_policy=None, **kwargs):
+        '''Sends a request to the worker and processes the events it streams back, until the request is done.
+        Args:
+            command (str): Command to execute (e.g. "allocate", "deallocate", "list").
+            callback (optional function): If set, called with every event (`dict`) as soon as it arrives. See `_Result.feed` for event contents.
+            retry_policy (optional RetryPolicy): Policy for GENI calls made by this command. Defaults to the policy set with `set_retry_policy`.
+            kwargs: Arguments for the command. Must be JSON-serializable.
+
+        Returns:
+            `_Result` of the request. If the worker could not be reached, its status is `False`.'''
+        result = _Result(callback)
+        try:
+            self._process.stdin.write(_protocol.encode_message(_make_request(0, command, retry_policy, kwargs)).encode('utf-8'))
+            await self._process.stdin.drain()
+            while True:
+                event = await self._read()
+                if not event:
+                    break
+                if result.feed(event):
+                    return result
+        except (BrokenPipeError, ConnectionResetError, ValueError) as e:
+            pass
+        printe('Lost connection to python2 worker.')
+        return result
+
+
+    def kill(self):
+        '''Kills the worker process immediately, interrupting any running operation.'''
+        if self._process and self._process.returncode == None:
+            self._process.kill()
+
+
+    async def stop(self):
+        '''Stops the worker process, if it runs.'''
+        if not self._process:
+            return
+        if self._process.returncode == None:
             try:
-                raw_infos = [_RawConnectInfo.from_string(line.strip()) for line in f.readlines()]
-            except Exception as e: # Could not read info, but we had a 0 exit status code. Probably, slice referenced has expired.
-                return (True, None)
-    return (True, [metareserve.Node(idx, node_name=x.name, ip_local=x.ip_local, ip_public=x.ip_public, port=x.port, extra_info={'user': x.user}) for idx, x in enumerate(raw_infos)])
+                self._process.stdin.close() # Worker exits once its stdin closes.
+                await asyncio.wait_for(self._process.wait(), timeout=10)
+            except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError) as e:
+                self._process.kill()
+        await self._process.wait()
+        self._process = None
+
+
+async def _call_async(command, callback=None, retry_policy=None, **kwargs):
+    '''Executes a command on a fresh worker process. If the calling task gets cancelled, the worker process is killed.'''
+    worker = _AsyncPy2Worker()
+    try:
+        if not await worker.start():
+            return _Result(callback)
+        return await worker.call(command, callback=callback, retry_policy=retry_policy, **kwargs)
+    except asyncio.CancelledError:
+        worker.kill()
+        raise
+    finally:
+        await worker.stop()
+
+
+def doctor(refresh=False):
+    '''Verifies the python2 environment and prints its fingerprint.
+    Args:
+        refresh (optional bool): If set, discards the stored fingerprint and checks all dependencies again.
+
+    Returns:
+        `True` if the python2 environment is usable, `False` otherwise.'''
+    if refresh:
+        _environment.clear()
+        _worker.stop()
+    if not _worker.start():
+        return False
+    fingerprint = _environment.load()
+    if not fingerprint:
+        printw('python2 environment works, but its fingerprint could not be stored at {}.'.format(loc.environmentfile()))
+        return True
+    print('python2 executable: {}'.format(fingerprint['executable']))
+    for name, version in sorted(fingerprint['versions'].items()):
+        print('\t{}: {}'.format(name, version))
+    print('site-packages:')
+    for path in sorted(fingerprint['site_packages']):
+        print('\t{}'.format(path))
+    print('Fingerprint stored at {}'.format(loc.environmentfile()))
+    return True
 
 
-def list_slices(slicename=None, location=None, show_all=False):
+def list_slices(slicename=None, location=None, show_all=False, callback=None, retry_policy=None, refresh=False):
     '''List all slices, optionally with more detailed information.
+    If both `slicename` and `location` are set and the local ledger knows an unexpired reservation for them, we print that reservation without contacting GENI.
     Args:
         slicename (optional str): If set, specifically searches for extra info for given slicename. Note: It is required to fill in a valid `location` argument if set.
         location (optional str): Must be set only when we need to search for a specific `slicename`.
         show_all (optional bool): If set, shows all entries. Otherwise, tries to filter out slicenames that are already expired.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+        refresh (optional bool): If set, ignores the local ledger, asks GENI and updates the ledger with the answer.
 
     Returns:
         `True` on success, `False` otherwise.'''
-    cmd = '{} {} list'.format(_get_py2_executable_name(), _get_py2_cli())
-    if slicename:
-        cmd += ' --name {}'.format(slicename)
-    if location:
-        cmd += ' --location {}'.format(location)
-    if show_all:
-        cmd += ' --all'
+    if slicename and location and not refresh:
+        entry = _ledger.get(slicename, location)
+        if entry:
+            print('Reservation (from local ledger, last updated {}, expires {}. Use "--refresh" to ask GENI):'.format(entry.updated, entry.expiration))
+            print('id,hostname,ip_local,ip_public,port,extra_info')
+            print(metareserve.Reservation([_to_node(idx, x) for idx, x in enumerate(entry.infos)]))
+            return True
+    result = _worker.call('list', callback=callback, retry_policy=retry_policy, slicename=slicename, location=location, corrected=not show_all)
+    if not result.status:
+        return False
     if slicename and location:
-        success, nodes = _py2_exec_get_nodes(cmd)
-        print('{}: {}'.format(success, ','.join(str(x) for x in nodes)))
-        if not nodes:
-            return success
-        print('Reservation:')
-        print('id,hostname,ip_local,ip_public,port,extra_info')
-        print(metareserve.Reservation(nodes))
-        return True
-    return os.system(cmd) == 0
+        if result.nodes:
+            _record(result, slicename, location)
+            print('Reservation:')
+            print('id,hostname,ip_local,ip_public,port,extra_info')
+            print(metareserve.Reservation(result.nodes))
+        else:
+            _ledger.remove(slicename, location)
+    return True
 
 
-def deallocate(slicename, location):
+def deallocate(slicename, location, callback=None, retry_policy=None):
     '''Deallocates slivers for a slice.
     Args:
         slicename: Name of the slice to deallocate slivers for.
+        location: Location of the sliver.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+
+    Returns:
+        `True` on success, `False` otherwise.'''
+    _ledger.remove(slicename, location) # Even if deallocation fails, the ledger should not claim the reservation is fine.
+    return _worker.call('deallocate', callback=callback, retry_policy=retry_policy, slicename=slicename, location=location).status
+
+
+def capacity(locations, callback=None, retry_policy=None):
+    '''Fetches the advertisements of given sites, and counts their available nodes. Use `internal.gni.capacity` for cached access.
+    Also stores a snapshot of every fetched advertisement (see `adsnapshot`) in `loc.advertisementdir()`.
+    Args:
+        locations (list(str)): Sites to check.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+
+    Returns:
+        `dict` mapping location to a `dict` mapping hardware type to number of available nodes. Sites we could not fetch an advertisement from are missing.'''
+    return _worker.call('capacity', callback=callback, retry_policy=retry_policy, locations=list(locations), snapshot_dir=loc.advertisementdir()).capacity
+
+
+def _expiration_arg(expiration):
+    '''Converts an expiration time (minutes from now as `int`, or a `datetime`) to something python2 understands.'''
+    return expiration.strftime('%Y-%m-%dT%H:%M:%S') if isinstance(expiration, datetime.datetime) else expiration
+
+
+def renew(slicename, location, expiration, callback=None, retry_policy=None):
+    '''Renews the slice and sliver of a reservation.
+    Args:
+        slicename: Name of the slice to renew.
+        location: Location of the sliver.
+        expiration (int or datetime): New expiration time in minutes from now, or new expiration date (local time).
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
 
     Returns:
         `True` on success, `False` otherwise.'''
-    cmd = '{} {} deallocate'.format(_get_py2_executable_name(), _get_py2_cli())
-    if slicename != None:
-        cmd += ' --name {}'.format(slicename)
-    if location != None:
-        cmd += ' --location {}'.format(location)
-    return os.system(cmd) == 0
+    status = _worker.call('renew', callback=callback, retry_policy=retry_policy, slicename=slicename, location=location, expiration=_expiration_arg(expiration)).status
+    if status:
+        _ledger.renewed(slicename, location, _sharedutil.datetime_get(expiration))
+    return status
 
 
-def allocate(expiration, reservation_request):
+def renew_many(items, jobs=8, callback=None, retry_policy=None):
+    '''Renews many slivers in a single call. Every slice is renewed once, to the latest expiration date requested for any of its slivers.
+    Args:
+        items (list(tuple(str, str, datetime))): (slicename, location, new expiration date) per sliver to renew.
+        jobs (optional int): Maximal number of GENI calls in flight at once.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+
+    Returns:
+        `dict` mapping (slicename, location) to `True` if that sliver was renewed, `False` otherwise.'''
+    items = list(items)
+    result = _worker.call('renew_many', callback=callback, retry_policy=retry_policy, items=[(x, y, _expiration_arg(z)) for x, y, z in items], jobs=jobs)
+    renewed = dict(((x, y), False) for x, y, _ in items)
+    for slicename, location, expiration, status in result.renewals:
+        renewed[(slicename, location)] = status
+        if status:
+            _ledger.renewed(slicename, location, _sharedutil.datetime_get(expiration))
+    return renewed
+
+
+def create_slice(slicename, expiration, callback=None, retry_policy=None):
+    '''Creates a slice, or renews it if it exists already. `allocate` does this by itself: only use this to prepare a slice once for several concurrent `allocate` calls with `create_slice=False`.
+    Args:
+        slicename (str): Name of the slice.
+        expiration (int or datetime): Expiration time in minutes from now, or expiration date (local time).
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+
+    Returns:
+        `True` on success, `False` otherwise.'''
+    return _worker.call('create_slice', callback=callback, retry_policy=retry_policy, slicename=slicename, expiration=_expiration_arg(expiration)).status
+
+
+def allocate(expiration, reservation_request, callback=None, retry_policy=None, min_ready=None, replace_failed=False, settled=None, create_slice=True):
     '''Allocates nodes for a cluster.
     Args:
-        expiration (int): Slice expiration time in minutes. Also used as sliver deallocation time.
+        expiration (int or datetime): Slice expiration time in minutes, or expiration date (local time). Also used as sliver deallocation time.
         reservation_request (GENIReservationRequest): Request object for allocation.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+                                      Node events arrive as soon as the sliver is mapped, before nodes are ready.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+        min_ready (optional int): If set, we return as soon as this many nodes are ready. Remaining nodes get more time to get ready in a background thread (see `settle`), which keeps the process alive until it is done.
+                                  Its events arrive at `callback` too. Nodes that fail or stay unready are released afterwards.
+        replace_failed (optional bool): With `min_ready`, replaces nodes that do not get ready instead of releasing them.
+        settled (optional function): With `min_ready`, called from the background thread with the result of `settle`, once all remaining nodes are handled. Not called if all nodes were ready at once.
+        create_slice (optional bool): If set, creates (or renews) the slice first. Otherwise, the slice must exist until at least `expiration` (see `create_slice`).
+        When the request has spares (see `GENIReservationRequest`), a quorum event arrives as soon as enough nodes of every group are ready, and `min_ready` is ignored.
 
     Returns:
-        List of `metareserve.reservation.Node` on success, `None` otherwise.'''
-    cmd ='{} {} allocate {}'.format(_get_py2_executable_name(), _get_py2_cli(), expiration)
-   
-    cmd += ' --name {}'.format(reservation_request.slicename)
-    cmd += ' --location {}'.format(reservation_request.location)
+        List of `metareserve.reservation.Node` on success, `None` otherwise. With `min_ready`, only lists nodes that were ready at quorum. With spares, lists the requested nodes: spares that stand in for slow nodes carry their names.'''
+    allocrequest = _to_internal_request(reservation_request)
+    spares = getattr(reservation_request, 'spares', 0)
+    result = _worker.call('allocate', callback=callback, retry_policy=retry_policy, slicename=reservation_request.slicename, expiration=_expiration_arg(expiration), location=reservation_request.location, allocrequest=str(allocrequest), topology=_topology_of(reservation_request), min_ready=min_ready, spares=spares, create_slice=create_slice)
+    if not (result.status and result.nodes):
+        return None
+    _record(result, reservation_request.slicename, reservation_request.location, expiration)
+    if min_ready and not spares and result.quorum and result.quorum['pending']:
+        def _settle():
+            nodes = settle(reservation_request, result.quorum['pending'], replace_failed, callback, retry_policy)
+            if settled:
+                settled(nodes)
+        threading.Thread(target=_settle).start() # Not a daemon: we must not exit halfway through releasing nodes.
+    return result.nodes
+
+
+def settle(reservation_request, pending, replace_failed=False, callback=None, retry_policy=None):
+    '''Handles the nodes of a sliver that were not ready when `allocate` returned at quorum: waits for them, and releases (or replaces) the ones that do not get ready. Blocks until done.
+    `allocate` with `min_ready` runs this in the background already.
+    Args:
+        reservation_request (GENIReservationRequest): Request object we allocated with.
+        pending (list(str)): Names of the nodes that were not ready (see the quorum event).
+        replace_failed (optional bool): If set, replaces nodes that do not get ready instead of releasing them. We wait for replacements to get ready as well.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
 
+    Returns:
+        List of `metareserve.reservation.Node` for all ready nodes of the sliver on success, `None` otherwise.'''
+    result = _worker.call('settle', callback=callback, retry_policy=retry_policy, slicename=reservation_request.slicename, location=reservation_request.location, pending=list(pending), topology=_topology_of(reservation_request), replace_failed=replace_failed)
+    if not (result.status and result.nodes):
+        return None
+    _record(result, reservation_request.slicename, reservation_request.location)
+    return result.nodes
+
+
+def allocate_hedged(expiration, reservation_request, locations, stagger=0, callback=None, retry_policy=None):
+    '''Allocates nodes for a cluster at whichever candidate site gets ready first. Slivers requested at other sites are deallocated automatically.
+    Args:
+        expiration (int or datetime): Slice expiration time in minutes, or expiration date (local time). Also used as sliver deallocation time.
+        reservation_request (GENIReservationRequest): Request object for allocation. Its `location` is ignored.
+        locations (list(str)): Candidate locations, in order of preference.
+        stagger (optional int): Number of seconds between submitting to consecutive candidate sites. If 0, we submit to all sites at once.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+
+    Returns:
+        (`str`, `list(metareserve.reservation.Node)`): Location we allocated at and allocated nodes on success, `(None, None)` otherwise.'''
+    if getattr(reservation_request, 'spares', 0):
+        printw('Hedged allocation does not over-provision. Requesting without spares.')
+    allocrequest = _to_internal_request(reservation_request)
+    result = _worker.call('allocate_hedged', callback=callback, retry_policy=retry_policy, slicename=reservation_request.slicename, expiration=_expiration_arg(expiration), locations=list(locations), allocrequest=str(allocrequest), stagger=stagger, topology=_topology_of(reservation_request))
+    if not (result.status and result.nodes):
+        return (None, None)
+    _record(result, reservation_request.slicename, result.manifest['location'], expiration)
+    return (result.manifest['location'], result.nodes)
+
+
+def resize(reservation_request, dry_run=False, callback=None, retry_policy=None):
+    '''Resizes a running cluster in place: nodes in both the running sliver and the request keep running, other requested nodes are added, and nodes no longer requested are released.
+    Args:
+        reservation_request (GENIReservationRequest): All nodes the cluster should have afterwards.
+        dry_run (optional bool): If set, only prints what we would change.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+
+    Returns:
+        List of `metareserve.reservation.Node` of the resized cluster on success (of the current cluster, if `dry_run` is set), `None` otherwise.'''
+    allocrequest = _to_internal_request(reservation_request)
+    result = _worker.call('resize', callback=callback, retry_policy=retry_policy, slicename=reservation_request.slicename, location=reservation_request.location, allocrequest=str(allocrequest), topology=_topology_of(reservation_request), dry_run=dry_run)
+    if not (result.status and result.nodes):
+        return None
+    _record(result, reservation_request.slicename, reservation_request.location)
+    return result.nodes
+
+
+async def list_async(slicename=None, location=None, show_all=False, callback=None, retry_policy=None, refresh=False):
+    '''asyncio variant of `list_slices`. Does not print the reservation.
+    Returns:
+        List of `metareserve.Node` for given `slicename` (empty if it has no active sliver, or if no `slicename` was given) on success, `None` otherwise.'''
+    if slicename and location and not refresh:
+        entry = _ledger.get(slicename, location)
+        if entry:
+            return [_to_node(idx, x) for idx, x in enumerate(entry.infos)]
+    result = await _call_async('list', callback=callback, retry_policy=retry_policy, slicename=slicename, location=location, corrected=not show_all)
+    if result.status and slicename and location:
+        if result.nodes:
+            _record(result, slicename, location)
+        else:
+            _ledger.remove(slicename, location)
+    return result.nodes if result.status else None
+
+
+async def deallocate_async(slicename, location, callback=None, retry_policy=None):
+    '''asyncio variant of `deallocate`.
+    Returns:
+        `True` on success, `False` otherwise.'''
+    _ledger.remove(slicename, location)
+    return (await _call_async('deallocate', callback=callback, retry_policy=retry_policy, slicename=slicename, location=location)).status
+
+
+async def renew_async(slicename, location, expiration, callback=None, retry_policy=None):
+    '''asyncio variant of `renew`.
+    Returns:
+        `True` on success, `False` otherwise.'''
+    status = (await _call_async('renew', callback=callback, retry_policy=retry_policy, slicename=slicename, location=location, expiration=_expiration_arg(expiration))).status
+    if status:
+        _ledger.renewed(slicename, location, _sharedutil.datetime_get(expiration))
+    return status
+
+
+async def allocate_async(expiration, reservation_request, callback=None, retry_policy=None, create_slice=True):
+    '''asyncio variant of `allocate`. When the calling task is cancelled, we kill the python2 process and deallocate the (possibly partially created) sliver before re-raising.
+    Does not support `min_ready` (nor `replace_failed` and `settled`): we always wait for all nodes. Spares of the request are supported.
+    Args:
+        expiration (int or datetime): Slice expiration time in minutes, or expiration date (local time). Also used as sliver deallocation time.
+        reservation_request (GENIReservationRequest): Request object for allocation.
+        callback (optional function): If set, called with every event the python2 side streams back. See `_Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `set_retry_policy`.
+        create_slice (optional bool): If set, creates (or renews) the slice first. Otherwise, the slice must exist until at least `expiration` (see `create_slice`).
+
+    Returns:
+        List of `metareserve.reservation.Node` on success, `None` otherwise.'''
     allocrequest = _to_internal_request(reservation_request)
-    _, nodes = _py2_exec_get_nodes(cmd, stdin=str(allocrequest))
-    return nodes
+    try:
+        result = await _call_async('allocate', callback=callback, retry_policy=retry_policy, slicename=reservation_request.slicename, expiration=_expiration_arg(expiration), location=reservation_request.location, allocrequest=str(allocrequest), topology=_topology_of(reservation_request), spares=getattr(reservation_request, 'spares', 0), create_slice=create_slice)
+    except asyncio.CancelledError:
+        printw('Allocation for slice "{}" cancelled. Deallocating its sliver...'.format(reservation_request.slicename))
+        await asyncio.shield(deallocate_async(reservation_request.slicename, reservation_request.location, retry_policy=retry_policy)) # Cleanup must finish, even if we get cancelled again.
+        raise
+    if not (result.status and result.nodes):
+        return None
+    _record(result, reservation_request.slicename, reservation_request.location, expiration)
+    return result.nodes
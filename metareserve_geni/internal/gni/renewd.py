@@ -0,0 +1,216 @@
+import datetime
+import json
+import os
+import random
+
+import internal.gni.ledger as _ledger
+import internal.gni.py2bridge as _py2bridge
+import internal.gni.scheduler as _scheduler
+import internal.util.fs as fs
+import internal.util.location as loc
+from internal.util.printer import *
+
+
+'''Renewal daemon: keeps the reservations recorded in the ledger (see `ledger.py`) allocated, by renewing them before they expire.
+Renewing only moves expiration dates, so it is much cheaper than re-running `allocate`.
+Every reservation gets a due time: `margin` minutes before it expires, minus a stable random jitter, so reservations made at the same time do not all hit the aggregates at once.
+When the first reservation is due, we renew it together with all reservations due within the next `batch_window` minutes, in a single python2 call running at most `jobs` GENI calls at once.
+The daemon publishes its schedule in `loc.renewdfile()`, so `geni-reserve renewd --show` can display it from another process.'''
+
+default_margin = 120 # Number of minutes before expiration at which a reservation is due.
+default_batch_window = 30 # Number of minutes: reservations due within this window of the first due reservation are renewed with it.
+default_jitter = 15 # Maximal number of minutes we renew a reservation earlier than its margin requires.
+default_jobs = 8 # Maximal number of GENI calls in flight at once.
+poll_interval = 5*60 # Maximal number of seconds between ledger reads, so we pick up new reservations.
+retry_delay = _scheduler.renew_retry # Number of seconds we wait before retrying a failed renewal.
+
+_date_format = '%Y-%m-%dT%H:%M:%S'
+
+
+class Renewal(object):
+    '''Trivial object holding the planned renewal of a single reservation.
+    Args:
+        slicename (str): Name of the slice.
+        location (str): Location of the sliver.
+        expiration (datetime): Current expiration date.
+        due (datetime): When we renew.
+        error (optional str): Why the last renewal attempt failed, if it did.'''
+    def __init__(self, slicename, location, expiration, due, error=None):
+        self.slicename = slicename
+        self.location = location
+        self.expiration = expiration
+        self.due = due
+        self.error = error
+
+
+    def to_dict(self):
+        return {'slicename': self.slicename, 'location': self.location, 'expiration': self.expiration.strftime(_date_format), 'due': self.due.strftime(_date_format), 'error': self.error}
+
+
+    @staticmethod
+    def from_dict(data):
+        return Renewal(data['slicename'], data['location'], datetime.datetime.strptime(data['expiration'], _date_format), datetime.datetime.strptime(data['due'], _date_format), data.get('error'))
+
+
+def _jitter(slicename, location, expiration, jitter):
+    '''Returns a random number of seconds in [0, `jitter` minutes]. Stable for a given reservation and expiration date, so every process computes the same schedule.'''
+    return random.Random('{}|{}|{}'.format(slicename, location, expiration.strftime(_date_format))).uniform(0, jitter*60)
+
+
+def plan(entries, margin=default_margin, jitter=default_jitter, until=None, slices=None, renewed=None, failures=None, now=None):
+    '''Computes when to renew given reservations. All dates are naive local time, like the dates in the ledger (see `ledger.py`).
+    Args:
+        entries (list(LedgerEntry)): Recorded reservations. Expired reservations, and reservations with unknown expiration date, are skipped.
+        margin (optional int): Number of minutes before expiration at which a reservation is due.
+        jitter (optional int): Maximal number of minutes we renew earlier than `margin` requires.
+        until (optional datetime): If set, we do not renew reservations that already expire at or after this date.
+        slices (optional list(str)): If set, only plans reservations of these slices.
+        renewed (optional dict): Maps (slicename, location) to the expiration date we renewed to, for reservations the ledger may not know the new date of (e.g. because updating it failed).
+        failures (optional dict): Maps (slicename, location) to (retry date, error message) for reservations that failed to renew earlier.
+        now (optional datetime): Current time. Defaults to `datetime.now()`.
+
+    Returns:
+        list of `Renewal`, sorted by due time.'''
+    now = now or datetime.datetime.now()
+    renewed = renewed or dict()
+    failures = failures or dict()
+    renewals = []
+    for entry in entries:
+        key = (entry.slicename, entry.location)
+        expiration = max(entry.expiration, renewed[key]) if entry.expiration and key in renewed else entry.expiration
+        if expiration == None or expiration <= now or (slices and not entry.slicename in slices) or (until and expiration >= until):
+            continue
+        due = expiration - datetime.timedelta(minutes=margin, seconds=_jitter(entry.slicename, entry.location, expiration, jitter))
+        retry_at, error = failures.get(key, (None, None))
+        renewals.append(Renewal(entry.slicename, entry.location, expiration, max(due, retry_at) if retry_at else due, error))
+    return sorted(renewals, key=lambda x: x.due)
+
+
+def batch(renewals, batch_window=default_batch_window, now=None):
+    '''Returns the renewals to perform right now: nothing if no renewal is due yet, otherwise all renewals due within `batch_window` minutes from now.'''
+    now = now or datetime.datetime.now()
+    if not renewals or renewals[0].due > now:
+        return []
+    return [x for x in renewals if x.due <= now + datetime.timedelta(minutes=batch_window)]
+
+
+def target(until=None, now=None):
+    '''Returns the expiration date we renew to: as far away as GENI allows, or `until` if that comes first.'''
+    now = now or datetime.datetime.now()
+    furthest = now + datetime.timedelta(minutes=_scheduler.max_expiration)
+    return min(until, furthest) if until else furthest
+
+
+def renew(renewals, date, jobs=default_jobs, retry_policy=None):
+    '''Renews given reservations in a single batch.
+    Args:
+        renewals (list(Renewal)): Reservations to renew.
+        date (datetime): New expiration date. See `target`.
+        jobs (optional int): Maximal number of GENI calls in flight at once.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls.
+
+    Returns:
+        `dict` mapping (slicename, location) to `True` if that reservation was renewed, `False` otherwise.'''
+    print('Renewing {} reservation(s) until {}: {}.'.format(len(renewals), date.strftime('%Y-%m-%d %H:%M'), ', '.join('{}@{}'.format(x.slicename, x.location) for x in renewals)))
+    return _py2bridge.renew_many([(x.slicename, x.location, date) for x in renewals], jobs=jobs, retry_policy=retry_policy)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError as e:
+        return False
+    except PermissionError as e: # Exists, but belongs to someone else.
+        return True
+
+
+def publish(renewals, next_wakeup, settings, running=True):
+    '''Stores the current schedule of this daemon in `loc.renewdfile()`. Replaces the file atomically, so readers never see a partial schedule.'''
+    data = dict(settings, pid=os.getpid() if running else None, updated=datetime.datetime.now().strftime(_date_format), next_wakeup=next_wakeup.strftime(_date_format) if next_wakeup else None, renewals=[x.to_dict() for x in renewals])
+    try:
+        fs.mkdir(loc.storedir(), exist_ok=True)
+        tmppath = '{}.{}.tmp'.format(loc.renewdfile(), os.getpid())
+        with open(tmppath, 'w') as f:
+            json.dump(data, f, indent=1)
+        os.rename(tmppath, loc.renewdfile())
+    except OSError as e:
+        printw('Could not publish renewal schedule at {}: {}'.format(loc.renewdfile(), e))
+
+
+def load_schedule():
+    '''Reads the schedule published by a renewal daemon.
+    Returns:
+        `dict` with the published schedule (see `publish`) and a "running" key (`True` if the daemon that published it is still running), or `None` if no daemon published a schedule.'''
+    try:
+        with open(loc.renewdfile(), 'r') as f:
+            data = json.load(f)
+        data['renewals'] = [Renewal.from_dict(x) for x in data['renewals']]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return None
+    data['running'] = bool(data.get('pid')) and _pid_alive(data['pid'])
+    return data
+
+
+def running_pid():
+    '''Returns the process id of the running renewal daemon, or `None` if no daemon is running.'''
+    schedule = load_schedule()
+    return schedule['pid'] if schedule and schedule['running'] else None
+
+
+def run(margin=default_margin, batch_window=default_batch_window, jitter=default_jitter, jobs=default_jobs, until=None, slices=None, once=False, retry_policy=None):
+    '''Runs the renewal daemon. Blocks until interrupted, or until `until`.
+    Args:
+        margin (optional int): Number of minutes before expiration at which a reservation is due.
+        batch_window (optional int): Number of minutes: reservations due within this window of the first due reservation are renewed with it.
+        jitter (optional int): Maximal number of minutes we renew earlier than `margin` requires.
+        jobs (optional int): Maximal number of GENI calls in flight at once.
+        until (optional datetime): If set, we keep reservations allocated until this date, and stop afterwards. Otherwise, we renew forever.
+        slices (optional list(str)): If set, only renews reservations of these slices.
+        once (optional bool): If set, performs due renewals (if any) and returns, instead of waiting for later ones. Useful to run from cron.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls.
+
+    Returns:
+        `True` if all renewals we attempted succeeded, `False` otherwise.'''
+    if margin >= _scheduler.max_expiration:
+        printe('Renewal margin must be smaller than {} minutes, the maximal time GENI lets slivers live.'.format(_scheduler.max_expiration))
+        return False
+    other = running_pid()
+    if other and other != os.getpid():
+        printe('A renewal daemon is running already (pid {}). Use "geni-reserve renewd --stop" to stop it.'.format(other))
+        return False
+    settings = {'margin': margin, 'batch_window': batch_window, 'jitter': jitter, 'jobs': jobs, 'until': until.strftime(_date_format) if until else None, 'slices': slices}
+    renewed = dict()
+    failures = dict()
+    renewals = []
+    ok = True
+    publish(renewals, None, settings) # Claims the daemon role right away.
+    try:
+        while True:
+            now = datetime.datetime.now()
+            if until and now >= until:
+                print('Reached {}. Stopping.'.format(until.strftime('%Y-%m-%d %H:%M')))
+                return ok
+            renewals = plan(_ledger.entries(), margin, jitter, until, slices, renewed, failures, now)
+            todo = batch(renewals, batch_window, now)
+            if todo:
+                date = target(until)
+                results = renew(todo, date, jobs, retry_policy)
+                for renewal in todo:
+                    key = (renewal.slicename, renewal.location)
+                    if results.get(key):
+                        renewed[key] = date
+                        failures.pop(key, None)
+                    else:
+                        ok = False
+                        retry_at = datetime.datetime.now() + datetime.timedelta(seconds=retry_delay)
+                        printw('Could not renew slice "{}" at {}. Retrying at {}.'.format(renewal.slicename, renewal.location, retry_at.strftime('%H:%M')))
+                        failures[key] = (retry_at, 'renewal failed at {}'.format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M')))
+                continue # Plan again with the new expiration dates.
+            next_wakeup = min(renewals[0].due, now + datetime.timedelta(seconds=poll_interval)) if renewals else now + datetime.timedelta(seconds=poll_interval)
+            publish(renewals, None if once else next_wakeup, settings)
+            if once:
+                return ok
+            _scheduler.sleep_until(next_wakeup)
+    finally:
+        publish(renewals, None, settings, running=False)
@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+import math
+import time
+
+import internal.gni.py2bridge as _py2bridge
+import internal.gni.shared.boottimes as _boottimes
+from internal.util.printer import *
+
+
+'''Local scheduler for time-slot reservations (see `GENITimeSlotReservationRequest`).
+We request the sliver ahead of the start time, early enough for the nodes to be ready when the slot starts.
+How early depends on the boot times we observed before for the requested site and hardware types (see `shared/boottimes.py`).
+Sliver expiration is set to the end of the slot. GENI does not allow slivers to expire more than `max_expiration` minutes away, so longer slots are renewed while they run.'''
+
+max_expiration = 7199 # Maximal number of minutes from now GENI allows a sliver to expire.
+default_boot_time = 20*60 # Number of seconds we assume nodes need to get ready, for sites and hardware types we never observed.
+boot_time_factor = 1.5 # Booting takes longer than the median regularly. We start this factor times the expected boot time ahead.
+lead_margin = 5*60 # Number of seconds we add for creating the slice and mapping the sliver.
+renew_margin = 60 # Number of minutes before expiration at which we renew.
+renew_retry = 5*60 # Number of seconds between renewal attempts after a failure.
+
+
+class Schedule(object):
+    '''Trivial object holding the plan for a time-slot reservation.
+    Args:
+        submit (datetime): When to request the sliver.
+        start (datetime): When nodes must be ready.
+        end (datetime): When nodes are deallocated.
+        boot_time (float): Number of seconds we expect nodes to need to get ready.'''
+    def __init__(self, submit, start, end, boot_time):
+        self.submit = submit
+        self.start = start
+        self.end = end
+        self.boot_time = boot_time
+
+
+    def expiration(self, now=None):
+        '''Returns the sliver expiration date to request at given time: the end of the slot, or as close to it as GENI allows.'''
+        now = now or datetime.datetime.now()
+        return min(self.end, now + datetime.timedelta(minutes=max_expiration))
+
+
+    def __str__(self):
+        return 'submit at {}, expected boot time {:.0f} minutes, slot {} - {}'.format(self.submit.strftime('%Y-%m-%d %H:%M'), self.boot_time/60, self.start.strftime('%Y-%m-%d %H:%M'), self.end.strftime('%Y-%m-%d %H:%M'))
+
+
+def expected_boot_time(reservation_request, history=None):
+    '''Returns the number of seconds we expect the slowest node of given request to need to get ready.
+    Args:
+        reservation_request (GENITimeSlotReservationRequest): Request to estimate boot time for.
+        history (optional dict): Boot time samples as returned by `boottimes.load()`. Loaded from disk if not given.'''
+    history = history if history != None else _boottimes.load()
+    expectations = [_boottimes.expected(reservation_request.location, x, history) for x in set(y.hw_type for y in reservation_request.profile.entries)]
+    return max((x if x != None else default_boot_time for x in expectations), default=default_boot_time)
+
+
+def plan(reservation_request, now=None, history=None):
+    '''Computes when to request the sliver for given time-slot reservation request.
+    Args:
+        reservation_request (GENITimeSlotReservationRequest): Request to plan.
+        now (optional datetime): Current time. Defaults to `datetime.datetime.now()`.
+        history (optional dict): Boot time samples as returned by `boottimes.load()`. Loaded from disk if not given.
+
+    Raises:
+        ValueError: If the slot already ended.
+
+    Returns:
+        `Schedule`. If the slot starts too soon to get nodes ready in time, we submit right away.'''
+    now = now or datetime.datetime.now()
+    if reservation_request.end <= now:
+        raise ValueError('Time slot ended already at {}.'.format(reservation_request.end))
+    boot_time = expected_boot_time(reservation_request, history)
+    lead = datetime.timedelta(seconds=boot_time*boot_time_factor+lead_margin)
+    return Schedule(max(now, reservation_request.start-lead), reservation_request.start, reservation_request.end, boot_time)
+
+
+def minutes_until(date, now=None):
+    '''Returns the number of whole minutes from now until given date, rounded up.'''
+    now = now or datetime.datetime.now()
+    return max(1, int(math.ceil((date-now).total_seconds()/60)))
+
+
+def _remaining(date):
+    # We sleep at most a minute at once: sleeping clocks may stop during system suspend, wall clock time does not.
+    return min(60, (date-datetime.datetime.now()).total_seconds())
+
+
+def sleep_until(date):
+    '''Blocks until given local time.'''
+    while _remaining(date) > 0:
+        time.sleep(_remaining(date))
+
+
+async def wait_until(date):
+    '''asyncio variant of `sleep_until`.'''
+    while _remaining(date) > 0:
+        await asyncio.sleep(_remaining(date))
+
+
+async def hold(reservation_request, schedule, expiration, callback=None, retry_policy=None):
+    '''Keeps a ready time-slot reservation allocated until the end of its slot, renewing it when needed, and deallocates it at the end.
+    Args:
+        reservation_request (GENITimeSlotReservationRequest): Request we allocated for.
+        schedule (Schedule): Schedule of the request.
+        expiration (datetime): Current expiration date of the sliver.
+        callback (optional function): If set, called with every event the python2 side streams back. See `py2bridge._Result.feed`.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls.
+
+    Returns:
+        `True` if we deallocated the reservation at the end of its slot, `False` if renewing or deallocating failed.'''
+    slicename, location = reservation_request.slicename, reservation_request.location
+    while expiration < schedule.end:
+        await wait_until(expiration - datetime.timedelta(minutes=renew_margin))
+        if datetime.datetime.now() >= expiration:
+            printe('Could not renew slice "{}" at {} before it expired at {}.'.format(slicename, location, expiration))
+            return False
+        target = schedule.expiration()
+        if await _py2bridge.renew_async(slicename, location, target, callback=callback, retry_policy=retry_policy):
+            expiration = target
+        else:
+            printw('Could not renew slice "{}" at {}. Retrying in {} seconds.'.format(slicename, location, renew_retry))
+            await asyncio.sleep(renew_retry)
+    await wait_until(schedule.end)
+    return await _py2bridge.deallocate_async(slicename, location, callback=callback, retry_policy=retry_policy)
@@ -0,0 +1,129 @@
+import datetime
+import gzip
+import io
+import os
+
+'''Compact on-disk snapshot of a site advertisement, so we can answer availability queries without parsing advertisement XML again.
+A snapshot is a gzipped UTF-8 text file. After a few header lines, it holds one tab-separated line per node:
+    <component_id>\t<flags>\t<comma-separated hardware types>
+Flags has "a" if the node is available, and "x" if it can be reserved exclusively (as raw PC), or is "-" for neither.
+Snapshots are written and read one line at a time, so memory use does not grow with the number of nodes.
+This file must remain importable from both python2 and python3.'''
+
+_magic = 'metareserve-geni-advertisement 1'
+_date_format = '%Y-%m-%dT%H:%M:%S'
+
+
+class AdRecord(object):
+    '''Compact description of a single advertised node.'''
+    __slots__ = ('component_id', 'hw_types', 'available', 'exclusive', 'site')
+
+    def __init__(self, component_id, hw_types, available, exclusive, site):
+        self.component_id = component_id
+        self.hw_types = hw_types
+        self.available = available
+        self.exclusive = exclusive
+        self.site = site
+
+
+    @property
+    def name(self):
+        '''Short node name, e.g. "ms0101" for component id "urn:publicid:IDN+utah.cloudlab.us+node+ms0101".'''
+        return self.component_id.rsplit('+', 1)[-1]
+
+
+    def __repr__(self):
+        return 'AdRecord({})'.format(', '.join('{}={}'.format(x, getattr(self, x)) for x in self.__slots__))
+
+
+def index(records):
+    '''Counts nodes we can reserve right now.
+    Args:
+        records (iterable(AdRecord)): Advertised nodes. Consumed once.
+
+    Returns:
+        `dict` mapping hardware type to the number of available nodes we can reserve exclusively (as raw PC) with that type.'''
+    free = dict()
+    for record in records:
+        if record.available and record.exclusive:
+            for hw_type in record.hw_types:
+                free[hw_type] = free.get(hw_type, 0) + 1
+    return free
+
+
+def path(directory, site):
+    '''Returns the path of the snapshot of given site in given directory.'''
+    return os.path.join(directory, '{}.snapshot.gz'.format(site))
+
+
+def write(directory, site, records, fetched=None):
+    '''Writes a snapshot. Replaces any earlier snapshot of the same site atomically, so readers never see a partial snapshot.
+    Args:
+        directory (str): Directory to store the snapshot in. Created if needed.
+        site (str): Name of the site the advertisement belongs to.
+        records (iterable(AdRecord)): Advertised nodes. Consumed once.
+        fetched (optional datetime): Time at which we fetched the advertisement. Defaults to now.
+
+    Returns:
+        Number of nodes written.'''
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if not os.path.isdir(directory): # Someone else may have created it meanwhile.
+                raise
+    destination = path(directory, site)
+    tmppath = '{}.{}.tmp'.format(destination, os.getpid())
+    amount = 0
+    try:
+        with io.TextIOWrapper(gzip.open(tmppath, 'wb'), encoding='utf-8') as f:
+            f.write(u'{}\nsite\t{}\nfetched\t{}\n'.format(_magic, site, (fetched or datetime.datetime.now()).strftime(_date_format)))
+            for record in records:
+                flags = ('a' if record.available else '') + ('x' if record.exclusive else '')
+                f.write(u'{}\t{}\t{}\n'.format(record.component_id, flags or '-', ','.join(record.hw_types)))
+                amount += 1
+        os.rename(tmppath, destination)
+    except BaseException: # Also when `records` raises, e.g. on malformed XML.
+        if os.path.isfile(tmppath):
+            os.remove(tmppath)
+        raise
+    return amount
+
+
+class Snapshot(object):
+    '''Handle to a stored snapshot. Only reads the header on construction.
+    Args:
+        path (str): Path to the snapshot.
+
+    Raises:
+        IOError, OSError: If the snapshot cannot be read.
+        ValueError: If the file is not a snapshot.'''
+    def __init__(self, path):
+        self.path = path
+        with self._open() as f:
+            self.site, self.fetched = self._header(f)
+
+
+    def _open(self):
+        return io.TextIOWrapper(io.BufferedReader(gzip.open(self.path, 'rb')), encoding='utf-8') # python2 `GzipFile` lacks the `read1` that `TextIOWrapper` needs.
+
+
+    def _header(self, f):
+        header = [f.readline().rstrip('\n') for x in range(3)]
+        if header[0] != _magic or not header[1].startswith('site\t') or not header[2].startswith('fetched\t'):
+            raise ValueError('{} is not an advertisement snapshot.'.format(self.path))
+        return (header[1].split('\t', 1)[1], datetime.datetime.strptime(header[2].split('\t', 1)[1], _date_format))
+
+
+    def records(self):
+        '''Generates an `AdRecord` for every stored node, in advertisement order.'''
+        with self._open() as f:
+            self._header(f)
+            for line in f:
+                component_id, flags, hw_types = line.rstrip('\n').split('\t')
+                yield AdRecord(component_id, hw_types.split(',') if hw_types else [], 'a' in flags, 'x' in flags, self.site)
+
+
+    def index(self):
+        '''Returns the availability index of this snapshot. See `index`.'''
+        return index(self.records())
@@ -1,16 +1,22 @@
 from enum import Enum
 import itertools
 
+try:
+    import noderange # python2 has this directory on its path.
+except ImportError:
+    import internal.gni.shared.noderange as noderange
+
 class AllocRequest(object):
-    '''Object to contain GENI python2 reservation requests.'''
+    '''Object to contain GENI python2 reservation requests.
+    Nodes sharing hardware type and image may be added at once, using range notation (see `noderange`). Such entries stay compact until `list()` expands them.'''
     def __init__(self):
-        self.nodes = []
+        self.nodes = [] # `Node` entries, possibly with a name in range notation.
 
 
     def add(self, name, hw_type='c6525-25g', img='urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD'):
         '''Adds node to request. Note: The `name` of the node must be unique. Note: `name` may not contain '|'.
         Args:
-            name: Used as node name. GENI will use this name as hostname for the spawned node.
+            name: Used as node name. GENI will use this name as hostname for the spawned node. If in range notation (e.g. "node[0-199]"), adds all nodes in the range.
             hw_type (optional str): Name of hardware node type to allocate.
             img (optional str): Name of image to deploy on hardware.'''
         name = str(name)
@@ -18,21 +24,23 @@ class AllocRequest(object):
             raise ValueError('Node name "{}" includes illegal character "|"!'.format(name))
         if any(x.isupper() for x in name):
             print('[WARNING] Node name "{}" contains uppercase letters. Transformed to lowercase, because GENI does not understand stuff otherwise.'.format(name))
+        noderange.validate(name)
         self.nodes.append(Node(name.lower(), hw_type, img))
 
 
     def list(self):
-        '''Returns part of or all stored requested nodes, sorted by node name.'''
-        return sorted(self.nodes, key=lambda x: x.name)
+        '''Returns all stored requested nodes, sorted by node name. Entries in range notation are expanded to one `Node` per name.'''
+        return sorted((Node(name, x.hw_type, x.img) for x in self.nodes for name in noderange.expand(x.name)), key=lambda x: x.name)
 
 
     def __str__(self):
-        return '\n'.join(str(node) for node in self.list())
+        '''Returns the compact form of this request: one line per entry, entries in range notation are not expanded.'''
+        return '\n'.join(str(node) for node in self.nodes)
 
 
     def __len__(self):
         '''Returns total number of nodes in request.'''
-        return len(self.nodes)
+        return sum(noderange.count(x.name) for x in self.nodes)
 
 
     @staticmethod
@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+
+'''Historical boot latencies: seconds from requesting a sliver until a node reports ready, per site and hardware type.
+python2 records samples whenever it observes nodes getting ready. Both python2 (readiness polling) and python3 (scheduling) read them.
+This file must remain importable from both python2 and python3.'''
+
+_max_samples = 20 # Number of most recent samples we keep per site and hardware type.
+_lock = threading.Lock()
+
+
+def path():
+    return os.path.join(os.getenv('HOME'), '.metareserve', 'metareserve_geni', 'boottimes.json')
+
+
+def _key(site, hw_type):
+    return '{}|{}'.format(site.lower(), hw_type) # python2 records under aggregate names (e.g. "cl-utah"), python3 looks up locations as users typed them.
+
+
+def load():
+    '''Returns all stored samples as a `dict` mapping "site|hw_type" to a list of seconds. Returns an empty `dict` if nothing is stored.'''
+    try:
+        with open(path(), 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        return dict()
+
+
+def record(site, samples):
+    '''Stores boot latency samples.
+    Args:
+        site (str): Name of the site the nodes booted at.
+        samples (list(tuple(str, float))): List of (hw_type, seconds) samples.'''
+    if not samples:
+        return
+    with _lock:
+        data = load()
+        for hw_type, seconds in samples:
+            key = _key(site, hw_type)
+            data[key] = (data.get(key, []) + [round(seconds, 1)])[-_max_samples:]
+        try:
+            if not os.path.isdir(os.path.dirname(path())):
+                os.makedirs(os.path.dirname(path()))
+            tmppath = '{}.{}.tmp'.format(path(), os.getpid())
+            with open(tmppath, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmppath, path()) # Atomic on posix systems.
+        except (IOError, OSError) as e:
+            pass # History is an optimization, failing to store it is no problem.
+
+
+def expected(site, hw_type, data=None):
+    '''Returns the median boot latency in seconds for given site and hardware type, or `None` if we have no samples.
+    Args:
+        data (optional dict): Samples as returned by `load()`. Loaded from disk if not given.'''
+    samples = sorted((data if data != None else load()).get(_key(site, hw_type), []))
+    if not samples:
+        return None
+    return samples[len(samples)//2]
@@ -1,15 +1,16 @@
 class RawConnectInfo(object):
     '''Object storing needed info to connect to physical allocated resources. Each physical node must have a unique name.'''
-    def __init__(self, name, user, ip_local, ip_public, port=22):
+    def __init__(self, name, user, ip_local, ip_public, port=22, subnet=None):
         self.name = name
         self.user = user
         self.ip_local = ip_local
         self.ip_public = ip_public
         self.port = int(port)
+        self.subnet = subnet or None # Network of `ip_local` in CIDR notation (e.g. "10.0.4.0/22"), if known. Nodes with equal subnets share a LAN.
 
 
     def __str__(self):
-        return '|'.join([self.name, self.user, self.ip_local, self.ip_public, str(self.port)])
+        return '|'.join([self.name, self.user, self.ip_local, self.ip_public, str(self.port)] + ([self.subnet] if self.subnet else []))
 
 
     def __repr__(self):
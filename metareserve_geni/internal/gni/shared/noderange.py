@@ -0,0 +1,90 @@
+import re
+
+'''Compact range notation for node names: "node[0-199]" stands for "node0", "node1", ..., "node199".
+Brackets hold comma-separated numbers and inclusive ranges, e.g. "node[0-3,8,10-11]". Zero-padded bounds (e.g. "node[000-199]") give zero-padded names.
+Ranges are never expanded until someone iterates over them.
+This file must remain importable from both python2 and python3.'''
+
+_pattern = re.compile(r'^([^\[\]]*)\[([0-9,\-]+)\]([^\[\]]*)$')
+
+
+def is_range(name):
+    '''Returns `True` if given name uses range notation, `False` otherwise.'''
+    return '[' in name or ']' in name
+
+
+def _parse(name):
+    '''Parses a name in range notation.
+    Raises:
+        ValueError: If the name is not valid range notation.
+
+    Returns:
+        (`str`, `list(tuple(int, int, int))`, `str`): Prefix, list of (first, last, width) ranges, suffix. Width is the number of digits to zero-pad to (0 for no padding).'''
+    match = _pattern.match(name)
+    if not match:
+        raise ValueError('Cannot parse node range "{}". Expected something like "node[0-199]".'.format(name))
+    prefix, body, suffix = match.groups()
+    ranges = []
+    for part in body.split(','):
+        bounds = part.split('-')
+        if len(bounds) > 2 or not all(bounds):
+            raise ValueError('Cannot parse "{}" in node range "{}".'.format(part, name))
+        first, last = int(bounds[0]), int(bounds[-1])
+        if last < first:
+            raise ValueError('Range "{}" in node range "{}" is empty.'.format(part, name))
+        width = len(bounds[0]) if len(bounds[0]) > 1 and bounds[0].startswith('0') else 0
+        ranges.append((first, last, width))
+    return (prefix, ranges, suffix)
+
+
+def validate(name):
+    '''Raises a `ValueError` if given name uses invalid range notation.'''
+    if is_range(name):
+        _parse(name)
+
+
+def count(name):
+    '''Returns the number of names given name stands for. Names without range notation stand for 1 name.'''
+    if not is_range(name):
+        return 1
+    _, ranges, _ = _parse(name)
+    return sum(last-first+1 for first, last, _ in ranges)
+
+
+def expand(name):
+    '''Generates all names given name stands for, in order. Names without range notation generate only themselves.'''
+    if not is_range(name):
+        yield name
+        return
+    prefix, ranges, suffix = _parse(name)
+    for first, last, width in ranges:
+        for number in range(first, last+1):
+            yield '{}{}{}'.format(prefix, str(number).zfill(width), suffix)
+
+
+
+def _format(prefix, ranges, suffix):
+    parts = [str(first).zfill(width) if first == last else '{}-{}'.format(str(first).zfill(width), str(last).zfill(width)) for first, last, width in ranges]
+    return '{}[{}]{}'.format(prefix, ','.join(parts), suffix)
+
+
+def split(name, amount):
+    '''Splits a name in range notation in two, without expanding it.
+    Args:
+        name (str): Name in range notation.
+        amount (int): Number of names for the first part. Must be between 1 and `count(name)-1`.
+
+    Returns:
+        (`str`, `str`): Range notation for the first `amount` names, and for the remaining names.'''
+    if not 0 < amount < count(name):
+        raise ValueError('Cannot split {} names of node range "{}" (holds {} names).'.format(amount, name, count(name)))
+    prefix, ranges, suffix = _parse(name)
+    head, tail = [], []
+    for first, last, width in ranges:
+        take = min(amount, last-first+1)
+        if take > 0:
+            head.append((first, first+take-1, width))
+        if take < last-first+1:
+            tail.append((first+take, last, width))
+        amount -= take
+    return (_format(prefix, head, suffix), _format(prefix, tail, suffix))
@@ -0,0 +1,56 @@
+import json
+import sys
+
+'''Message framing between the python3 bridge and the python2 worker.
+Every message is a JSON object on a single line. `json.dumps` escapes newlines inside strings, so a newline always ends a frame.
+This file must remain importable from both python2 and python3.'''
+
+
+def _to_native(obj):
+    '''Converts the unicode strings `json.loads` gives us in python2 to regular strings. geni-lib performs `isinstance(x, str)` checks in several places.'''
+    if sys.version_info[0] >= 3:
+        return obj
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    if isinstance(obj, list):
+        return [_to_native(x) for x in obj]
+    if isinstance(obj, dict):
+        return dict((_to_native(k), _to_native(v)) for k, v in obj.items())
+    return obj
+
+
+def encode_message(message):
+    '''Returns given message as a frame (a single line of JSON, including the newline).'''
+    return json.dumps(message)+'\n'
+
+
+def decode_message(line):
+    '''Returns the message contained in given frame, or `None` if the frame is empty.'''
+    if not line.strip(): # Skip empty frames
+        return None
+    return _to_native(json.loads(line))
+
+
+def write_message(stream, message):
+    '''Writes a message to given stream and flushes it.
+    Args:
+        stream: Text stream to write to.
+        message (dict): JSON-serializable message.'''
+    stream.write(encode_message(message))
+    stream.flush()
+
+
+def read_message(stream):
+    '''Reads a message from given stream. Blocks until a full frame is available.
+    Args:
+        stream: Text stream to read from.
+
+    Returns:
+        Read message (dict) on success, `None` if the stream was closed.'''
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        message = decode_message(line)
+        if message != None:
+            return message
@@ -0,0 +1,44 @@
+import random
+
+'''Retry policy for GENI RPCs. Travels from python3 to python2 as a `dict`.
+This file must remain importable from both python2 and python3.'''
+
+
+class RetryPolicy(object):
+    '''Describes how to retry failing GENI RPCs.
+    Args:
+        retries (int): Maximal number of attempts per operation.
+        base_sleep (float): Number of seconds to sleep after the first failed attempt.
+        max_sleep (float): Maximal number of seconds to sleep between attempts.
+        factor (float): Sleep time multiplier after every failed attempt.
+        jitter (float): Relative random deviation applied to every sleep (0.3 means +-30%).
+        deadline (float): Total time budget in seconds per operation, including sleeps. We do not start a sleep that would exceed it.
+        breaker_threshold (int): Number of consecutive failures at an aggregate before its circuit opens. While open, calls to it fail immediately.
+        breaker_reset (float): Number of seconds a circuit stays open before we let a trial call through.'''
+    def __init__(self, retries=5, base_sleep=2, max_sleep=30, factor=2, jitter=0.3, deadline=120, breaker_threshold=8, breaker_reset=60):
+        if retries < 1:
+            raise ValueError('Need at least 1 attempt, found {}.'.format(retries))
+        self.retries = int(retries)
+        self.base_sleep = float(base_sleep)
+        self.max_sleep = float(max_sleep)
+        self.factor = float(factor)
+        self.jitter = float(jitter)
+        self.deadline = float(deadline)
+        self.breaker_threshold = int(breaker_threshold)
+        self.breaker_reset = float(breaker_reset)
+
+
+    def sleep_time(self, attempt):
+        '''Returns the number of seconds to sleep after given (0-indexed) failed attempt.'''
+        base = min(self.max_sleep, self.base_sleep * (self.factor ** attempt))
+        return base * random.uniform(1-self.jitter, 1+self.jitter)
+
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+    @staticmethod
+    def from_dict(data):
+        '''Constructs a `RetryPolicy` from a `dict` made by `to_dict()`.'''
+        return RetryPolicy(**data)
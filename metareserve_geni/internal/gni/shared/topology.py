@@ -0,0 +1,213 @@
+import re
+import socket
+import struct
+
+'''Address plans for the experiment network connecting allocated nodes.
+By default, all nodes share one LAN. Up to 254 nodes, it is 192.168.1.0/24 (as it always was). Larger LANs get an address block sized to their node count.
+Optionally, nodes are split into several LANs: one per group of nodes (by hardware type, or by name prefix), and/or at most a maximal number of nodes per LAN.
+Each LAN gets its own address block. Blocks never overlap.
+This file must remain importable from both python2 and python3.'''
+
+
+class TopologyOptions(object):
+    '''Describes how to connect allocated nodes. Travels from python3 to python2 as a `dict`.
+    Args:
+        max_lan_size (optional int): If set, splits LANs with more nodes into multiple LANs of at most this many nodes. Nodes in different LANs cannot reach each other over the experiment network.
+        group_by (optional str): If set, builds one LAN per group of nodes. Either "hw_type" (group by hardware type) or "prefix" (group by node name without trailing digits, e.g. "server3" belongs to "server").
+        bandwidth (optional int): Bandwidth hint for every LAN interface, in kbps.
+        best_effort (optional bool): If set, allows the aggregate to map LANs over oversubscribed switch links. Makes large LANs much easier to map.'''
+    group_options = ('hw_type', 'prefix')
+
+    def __init__(self, max_lan_size=None, group_by=None, bandwidth=None, best_effort=False):
+        if max_lan_size != None and max_lan_size < 2:
+            raise ValueError('LANs need at least 2 nodes, found max_lan_size={}.'.format(max_lan_size))
+        if group_by != None and not group_by in TopologyOptions.group_options:
+            raise ValueError('Cannot group by "{}". Options: {}.'.format(group_by, ', '.join(TopologyOptions.group_options)))
+        if bandwidth != None and bandwidth <= 0:
+            raise ValueError('Bandwidth must be positive, found {}.'.format(bandwidth))
+        self.max_lan_size = max_lan_size
+        self.group_by = group_by
+        self.bandwidth = bandwidth
+        self.best_effort = bool(best_effort)
+
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+    @staticmethod
+    def from_dict(data):
+        '''Constructs `TopologyOptions` from a `dict` made by `to_dict()`.'''
+        return TopologyOptions(**data)
+
+
+class LanPlan(object):
+    '''Trivial object holding the address plan of a single LAN.
+    Args:
+        name (str): Name of the LAN.
+        network (str): Network address, e.g. "10.0.4.0".
+        prefix (int): Network prefix length, e.g. 22.
+        members (list(tuple(str, str))): (node name, address) pairs.'''
+    def __init__(self, name, network, prefix, members):
+        self.name = name
+        self.network = network
+        self.prefix = prefix
+        self.members = members
+
+    @property
+    def netmask(self):
+        return _to_address((0xffffffff << (32-self.prefix)) & 0xffffffff)
+
+    def __str__(self):
+        return '{} {}/{} ({} nodes)'.format(self.name, self.network, self.prefix, len(self.members))
+
+
+def _to_int(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def _to_address(number):
+    return socket.inet_ntoa(struct.pack('!I', number))
+
+
+def subnet(address, netmask):
+    '''Returns the network of given address in CIDR notation, e.g. ("10.0.5.3", "255.255.252.0") gives "10.0.4.0/22".'''
+    mask = _to_int(netmask)
+    return '{}/{}'.format(_to_address(_to_int(address) & mask), bin(mask).count('1'))
+
+
+def _prefix_for(num_nodes):
+    '''Returns the longest prefix (at most 24) of a block with room for `num_nodes` hosts, excluding network and broadcast addresses.'''
+    bits = 8
+    while (1 << bits) - 2 < num_nodes:
+        bits += 1
+    return 32 - bits
+
+
+def _group_key(node, group_by):
+    if group_by == 'hw_type':
+        return node.hw_type
+    if group_by == 'prefix':
+        return re.sub(r'[0-9]+$', '', node.name) or 'node'
+    return None
+
+
+def plan(nodes, options=None):
+    '''Computes the address plan for given nodes.
+    Args:
+        nodes (list(Node)): Nodes to connect (`allocrequest.Node` or anything else with "name" and "hw_type" attributes), in the order in which they receive addresses.
+        options (optional TopologyOptions): How to connect the nodes. Defaults to one LAN for all nodes.
+
+    Returns:
+        list of `LanPlan`.'''
+    options = options or TopologyOptions()
+    groups = []
+    for node in nodes:
+        key = _group_key(node, options.group_by)
+        found = next((x for x in groups if x[0] == key), None)
+        if found:
+            found[1].append(node)
+        else:
+            groups.append((key, [node]))
+
+    lans = [] # (name, nodes)
+    for key, members in groups:
+        size = options.max_lan_size or len(members)
+        chunks = [members[idx:idx+size] for idx in range(0, len(members), size)]
+        for idx, chunk in enumerate(chunks):
+            parts = ['lan'] + ([re.sub(r'[^a-z0-9-]', '-', key.lower())] if key else []) + ([str(idx)] if len(chunks) > 1 else [])
+            lans.append(('-'.join(parts), chunk))
+
+    if len(lans) == 1 and len(lans[0][1]) <= 254: # Same addresses as we always handed out.
+        return [LanPlan(lans[0][0], '192.168.1.0', 24, [(x.name, '192.168.1.{}'.format(idx+1)) for idx, x in enumerate(lans[0][1])])]
+
+    # Blocks are handed out from 10.0.0.0 on, largest first, so every block is aligned to its own size.
+    plans = [None]*len(lans)
+    current = _to_int('10.0.0.0')
+    for idx in sorted(range(len(lans)), key=lambda x: -len(lans[x][1])):
+        name, members = lans[idx]
+        prefix = _prefix_for(len(members))
+        if prefix < 8:
+            raise ValueError('Cannot address {} nodes in one LAN.'.format(len(members)))
+        plans[idx] = LanPlan(name, _to_address(current), prefix, [(x.name, _to_address(current+pos+1)) for pos, x in enumerate(members)])
+        current += 1 << (32-prefix)
+    if current > _to_int('11.0.0.0'):
+        raise ValueError('Address plan does not fit in 10.0.0.0/8.')
+    return plans
+
+
+def _overlaps(network, size, taken):
+    return any(network < other+other_size and other < network+size for other, other_size in taken)
+
+
+def extend(lans, nodes, existing, options=None):
+    '''Adds nodes to an existing address plan, without changing the LAN or address of any node in it.
+    New nodes join an existing LAN of their group (see `TopologyOptions.group_by`) with room left. Other new nodes get new LANs, in address blocks not overlapping any existing LAN.
+    Args:
+        lans (list(LanPlan)): Current plan. Not modified.
+        nodes (list(Node)): Nodes to add (anything with "name" and "hw_type" attributes), in the order in which they receive addresses.
+        existing (list(Node)): Nodes already in the plan. Used to find the group of existing LANs.
+        options (optional TopologyOptions): How to connect the nodes. Defaults to one LAN for all nodes.
+
+    Returns:
+        list of `LanPlan`: existing LANs (with new members appended), followed by new LANs.'''
+    options = options or TopologyOptions()
+    by_name = dict((x.name, x) for x in existing)
+    plans = [LanPlan(x.name, x.network, x.prefix, list(x.members)) for x in lans]
+    keys = [_group_key(by_name[x.members[0][0]], options.group_by) if x.members and x.members[0][0] in by_name else None for x in plans]
+    leftover = []
+    for node in nodes:
+        key = _group_key(node, options.group_by)
+        for lan_plan, lan_key in zip(plans, keys):
+            hosts = (1 << (32-lan_plan.prefix)) - 2
+            if lan_key != key or len(lan_plan.members) >= min(hosts, options.max_lan_size or hosts):
+                continue
+            network = _to_int(lan_plan.network)
+            used = set(_to_int(address) for _, address in lan_plan.members)
+            lan_plan.members.append((node.name, _to_address(next(x for x in range(network+1, network+hosts+1) if not x in used))))
+            break
+        else:
+            leftover.append(node)
+    if not leftover:
+        return plans
+
+    # Remaining nodes get LANs as if they were a new cluster, moved to free blocks.
+    taken = [(_to_int(x.network), 1 << (32-x.prefix)) for x in plans]
+    names = set(x.name for x in plans)
+    for lan_plan in sorted(plan(leftover, options), key=lambda x: x.prefix):
+        size = 1 << (32-lan_plan.prefix)
+        network = _to_int('10.0.0.0')
+        while _overlaps(network, size, taken):
+            network += size
+        if network+size > _to_int('11.0.0.0'):
+            raise ValueError('Address plan does not fit in 10.0.0.0/8.')
+        taken.append((network, size))
+        name = lan_plan.name
+        idx = 1
+        while name in names:
+            name = '{}-{}'.format(lan_plan.name, idx)
+            idx += 1
+        names.add(name)
+        plans.append(LanPlan(name, _to_address(network), lan_plan.prefix, [(member, _to_address(network+pos+1)) for pos, (member, _) in enumerate(lan_plan.members)]))
+    return plans
+
+
+def current(records):
+    '''Reconstructs the address plan of allocated nodes.
+    Args:
+        records (list): Allocated nodes (anything with "name", "ip_local", "subnet" and "lan" attributes, like `manifest.stream.NodeRecord`). Nodes without experiment network address are skipped.
+
+    Returns:
+        list of `LanPlan`, one per LAN, in order of first appearance.'''
+    plans = []
+    for record in records:
+        if not record.ip_local or not record.subnet:
+            continue
+        name = record.lan or 'lan-{}'.format(record.subnet.replace('/', '-').replace('.', '-'))
+        found = next((x for x in plans if x.name == name), None)
+        if not found:
+            network, prefix = record.subnet.split('/')
+            found = LanPlan(name, network, int(prefix), [])
+            plans.append(found)
+        found.members.append((record.name, record.ip_local))
+    return plans
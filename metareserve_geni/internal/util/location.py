@@ -7,4 +7,19 @@ def storedir():
     return os.path.join(os.getenv('HOME'), '.metareserve', 'metareserve_geni')
 
 def profiledir():
-    return os.path.join(storedir(), 'profiles')
\ No newline at end of file
+    return os.path.join(storedir(), 'profiles')
+
+def environmentfile():
+    return os.path.join(storedir(), 'environment.json')
+
+def ledgerfile():
+    return os.path.join(storedir(), 'ledger.sqlite')
+
+def capacityfile():
+    return os.path.join(storedir(), 'capacity.json')
+
+def advertisementdir():
+    return os.path.join(storedir(), 'advertisements')
+
+def renewdfile():
+    return os.path.join(storedir(), 'renewd.json')
@@ -0,0 +1,35 @@
+import internal.gni.py2bridge as py2bridge
+from internal.gni.shared.retrypolicy import RetryPolicy
+from internal.util.printer import *
+
+# This file provides the commandline options controlling how we retry failing GENI calls, shared by all subcommands talking to GENI.
+
+
+def add_arguments(parser):
+    # Register retry options on given (sub)parser.
+    group = parser.add_argument_group('retry options')
+    group.add_argument('--retries', metavar='amount', default=None, type=int, help='Maximum number of attempts per GENI call (default=5).')
+    group.add_argument('--retry-sleep', dest='retry_sleep', metavar='seconds', default=None, type=float, help='Seconds to wait after the first failed attempt. Doubles after every next failure (default=2).')
+    group.add_argument('--retry-max-sleep', dest='retry_max_sleep', metavar='seconds', default=None, type=float, help='Maximum number of seconds to wait between attempts (default=30).')
+    group.add_argument('--retry-deadline', dest='retry_deadline', metavar='seconds', default=None, type=float, help='Maximum number of seconds spent on one GENI call, including retries (default=120).')
+    group.add_argument('--breaker-threshold', dest='breaker_threshold', metavar='amount', default=None, type=int, help='Consecutive failures at a site before we stop calling it for a while (default=8).')
+
+
+def apply(args):
+    # Sets the retry policy for all following GENI calls from parsed options. Returns `True` on success, `False` on invalid options.
+    options = {
+        'retries': args.retries,
+        'base_sleep': args.retry_sleep,
+        'max_sleep': args.retry_max_sleep,
+        'deadline': args.retry_deadline,
+        'breaker_threshold': args.breaker_threshold,
+    }
+    options = {key: val for key, val in options.items() if val != None}
+    if not options:
+        return True
+    try:
+        py2bridge.set_retry_policy(RetryPolicy(**options))
+        return True
+    except ValueError as e:
+        printe('Invalid retry options: {}'.format(e))
+        return False
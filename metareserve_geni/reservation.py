@@ -1,5 +1,9 @@
+import itertools
+
 from metareserve.reservation import ReservationRequest as _ReservationRequest
 
+import internal.gni.shared.noderange as _noderange
+
 class GENINode(object):
     '''Trivial object holding information about a GENI node.
     Args:
@@ -33,17 +37,65 @@ class GENINode(object):
 
 
 
+class GENINodeRange(object):
+    '''Trivial object holding information about a group of GENI nodes with the same hardware type and image.
+    Nodes are named in range notation, e.g. "node[0-199]" for node0, node1, ..., node199 (see `internal.gni.shared.noderange`).
+    The group stays compact: we only create a `GENINode` per node while iterating over it.
+    Args:
+        name (str): Hostnames for the nodes, in range notation.
+        hw_type (str): Hardware type for all nodes.
+        image (str): OS image to boot on all nodes.'''
+    def __init__(self, name, hw_type, image):
+        _noderange.validate(name)
+        self._name = name
+        self._hw_type = hw_type
+        self._image = image
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def hw_type(self):
+        return self._hw_type
+
+    @property
+    def image(self):
+        return self._image
+
+    @staticmethod
+    def from_string(string):
+        '''Constructs a `GENINodeRange` from a string.'''
+        return GENINodeRange(*string.split('|'))
+
+    def __iter__(self):
+        return (GENINode(x, self._hw_type, self._image) for x in _noderange.expand(self._name))
+
+    def __len__(self):
+        return _noderange.count(self._name)
+
+    def __str__(self):
+        return '|'.join([self._name, self._hw_type, self._image])
+
+
+
 class GENIReservationProfile(object):
-    '''Trivial object to hold a reservation profile.'''
+    '''Trivial object to hold a reservation profile. Holds `GENINode`s and compact `GENINodeRange`s.'''
     def __init__(self):
-        self.nodeprofiles = dict()
+        self.nodeprofiles = dict() # Maps name (possibly in range notation) to `GENINode` or `GENINodeRange`.
 
     @property
-    def nodes(self):
+    def entries(self):
+        '''Iterable of all `GENINode` and `GENINodeRange` entries, without expanding ranges.'''
         return self.nodeprofiles.values()
+
+    @property
+    def nodes(self):
+        '''Iterable of all nodes as `GENINode`. Ranges are expanded while iterating.'''
+        return itertools.chain.from_iterable(x if isinstance(x, GENINodeRange) else (x,) for x in self.nodeprofiles.values())
     
     def add(self, node):
-        '''Add a `GENINodeProfile` to the reservation profile.'''
+        '''Add a `GENINode` or `GENINodeRange` to the reservation profile.'''
         self.nodeprofiles[node.name] = node
 
     @staticmethod
@@ -57,39 +109,49 @@ class GENIReservationProfile(object):
         Returns:
             Constructed `GENIReservationProfile`.'''
         profile = GENIReservationProfile()
-        for idx in range(num_nodes):
-            profile.add(GENINode('node{}'.format(idx), hw_type, image))
+        profile.add(GENINodeRange('node[0-{}]'.format(num_nodes-1), hw_type, image))
         return profile
 
     @staticmethod
     def from_string(string):
-        '''Constructs a `GENIReservationProfile` from a string.'''
+        '''Constructs a `GENIReservationProfile` from a string. Lines are either "name|hw_type|image", or "name[a-b]|hw_type|image" for a `GENINodeRange`.'''
         val = GENIReservationProfile()
-        for line in string.split('\n'):
-            val.add(GENINode.from_string(line))
+        for line in (x.strip() for x in string.split('\n')):
+            if line:
+                val.add(GENINodeRange.from_string(line) if _noderange.is_range(line.split('|', 1)[0]) else GENINode.from_string(line))
         return val
 
     def __str__(self):
-        return '\n'.join(str(x) for x in self.nodes)
+        return '\n'.join(str(x) for x in self.entries)
 
     def __len__(self):
-        return len(self.nodeprofiles)
+        return sum(len(x) if isinstance(x, GENINodeRange) else 1 for x in self.nodeprofiles.values())
 
 
 
 class GENIReservationRequest(_ReservationRequest):
     '''Object representing a regular reservation request (request nodes for X minutes).'''
-    def __init__(self, duration_minutes, location, slicename, reservation_profile):
+    def __init__(self, duration_minutes, location, slicename, reservation_profile, topology=None, spares=0):
         '''Args:
             duration_minutes (int): Number of minutes to reserve nodes.
             location (str): Location for reserved nodes.
             slicename (str): Slicename to use for allocation.
-            reservation_profile (GENIReservationProfile): ReservationProfile to use for allocation.'''
+            reservation_profile (GENIReservationProfile): ReservationProfile to use for allocation.
+            topology (optional TopologyOptions): How to connect the nodes (see `internal.gni.shared.topology`). Defaults to a single LAN.
+            spares (optional int): Number of extra nodes to request for every group of nodes sharing hardware type and image. We keep the first nodes to get ready and release the slowest, so the reservation still has the requested nodes.'''
         super().__init__(len(reservation_profile), duration_minutes, location=location)
         if duration_minutes >= 7200:
             raise ValueError('GENI only allows to allocate for 7199 minutes or less.')
+        if spares < 0:
+            raise ValueError('Number of spare nodes cannot be negative. Found spares={}.'.format(spares))
         self._profile = reservation_profile
         self.slicename = slicename
+        self.topology = topology
+        self.spares = spares
+
+    @property
+    def profile(self):
+        return self._profile
 
     @property
     def nodes(self):
@@ -97,7 +159,7 @@ class GENIReservationRequest(_ReservationRequest):
     
 
     @staticmethod
-    def make(num_nodes, duration_minutes, location, hw_type, image='urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD', slicename='metareserve'):
+    def make(num_nodes, duration_minutes, location, hw_type, image='urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD', slicename='metareserve', spares=0):
         '''Constructs a `GENIReservationRequest` following standard patterns: 1 image for all nodes, 1 hw_type for all nodes, nodes named as node0, node1, ....
         Args:
             num_nodes (int): Number of nodes in reservation.
@@ -106,7 +168,41 @@ class GENIReservationRequest(_ReservationRequest):
             hw_type (str): Hardware specification to use.
             image (str, optional): Image to boot on each node.
             slicename (str, optional): Slicename to use for allocation.
+            spares (int, optional): Number of extra nodes to request. We keep the first `num_nodes` nodes to get ready.
         Returns:
             Constructed `GENIReservationRequest`.'''
         profile = GENIReservationProfile.make(num_nodes, hw_type, image)
-        return GENIReservationRequest(duration_minutes, location, slicename, profile)
\ No newline at end of file
+        return GENIReservationRequest(duration_minutes, location, slicename, profile, spares=spares)
+
+
+class GENITimeSlotReservationRequest(_ReservationRequest):
+    '''Object representing a time-slot reservation request (request nodes from time X to time Y).
+    Nodes are provisioned ahead of time, so that they are ready at the start time. See `internal.gni.scheduler`.'''
+    def __init__(self, start, end, location, slicename, reservation_profile, topology=None, spares=0):
+        '''Args:
+            start (datetime): Local time at which nodes must be ready.
+            end (datetime): Local time at which nodes are deallocated.
+            location (str): Location for reserved nodes.
+            slicename (str): Slicename to use for allocation.
+            reservation_profile (GENIReservationProfile): ReservationProfile to use for allocation.
+            topology (optional TopologyOptions): How to connect the nodes (see `internal.gni.shared.topology`). Defaults to a single LAN.
+            spares (optional int): Number of extra nodes to request for every group of nodes sharing hardware type and image. See `GENIReservationRequest`.'''
+        if end <= start:
+            raise ValueError('Time slot must end after it starts. Found start={}, end={}.'.format(start, end))
+        if spares < 0:
+            raise ValueError('Number of spare nodes cannot be negative. Found spares={}.'.format(spares))
+        super().__init__(len(reservation_profile), int((end-start).total_seconds()+59)//60, location=location)
+        self.start = start
+        self.end = end
+        self._profile = reservation_profile
+        self.slicename = slicename
+        self.topology = topology
+        self.spares = spares
+
+    @property
+    def profile(self):
+        return self._profile
+
+    @property
+    def nodes(self):
+        return [x for x in self._profile.nodes]
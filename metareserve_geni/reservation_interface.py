@@ -1,32 +1,300 @@
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+
+import metareserve
+from metareserve import ReservationInterface as _BaseInterface
 
-from metareserve.reservation import ReservationWait as _ReservationWait
-import metareserve.ReservationInterface as _BaseInterface
 import internal.gni.py2bridge as _py2bridge
+import internal.gni.scheduler as _scheduler
+from internal.util.printer import *
+from reservation import GENIReservationRequest, GENITimeSlotReservationRequest
+
+
+class GENIReservationHandle(object):
+    '''Handle to a reservation that runs in the background. Returned by `GENIReservationInterface.reserve`.
+    A handle goes through these states:
+     - "scheduled": (time-slot reservations only) waiting until it is time to request the sliver (see `handle.schedule`).
+     - "queued": waiting until fewer than `max_concurrent` reservations are in flight.
+     - "allocating": the python2 side is creating the slice and sliver, and waits for nodes to become ready.
+     - "ready": all nodes are ready. `result()` returns the reservation.
+     - "failed", "timed out", "cancelled": no reservation was made. Any partially created sliver has been deallocated.
+     - "stopped": the reservation was ready, and has been deallocated with `GENIReservationInterface.stopReservation`.
+     - "expired": (time-slot reservations only) the slot ended, and the reservation has been deallocated.
+    Time-slot reservations stay in state "ready" during their slot. Meanwhile, we renew them as needed.'''
+
+    def __init__(self, reservation_request, expiration, timeout=None, schedule=None):
+        self.request = reservation_request
+        self.expiration = expiration # Sliver expiration in minutes from allocation. For time-slot reservations, computed when we submit.
+        self.schedule = schedule # `scheduler.Schedule` for time-slot reservations, `None` otherwise.
+        self.timeout = timeout
+        self.state = 'queued'
+        self.node_states = dict() # Maps node name to its last known state.
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._done = concurrent.futures.Future()
+        self._task = None # `asyncio.Task` running the current phase (waiting for the schedule, allocating, holding the time slot). Only touched on the event loop thread.
+        self._cancelled = False
+
+
+    @property
+    def slicename(self):
+        return self.request.slicename
+
+    @property
+    def location(self):
+        return self.request.location
+
+
+    def add_progress_callback(self, callback):
+        '''Registers a function to call with every progress event of this reservation.
+        Events are `dict`s, as streamed back by the python2 side (see `py2bridge._Result.feed`). On every state change, we send a {"type": "state", "state": <new state>} event.
+        Callbacks run on the event loop thread of the interface. They must not block.'''
+        with self._lock:
+            self._callbacks.append(callback)
+
+
+    def _feed(self, event):
+        if event.get('type') == 'node_state':
+            self.node_states[event['name']] = event['state']
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                printw('Progress callback raised {}: {}'.format(type(e).__name__, e))
+
+
+    def _set_state(self, state):
+        self.state = state
+        self._feed({'type': 'state', 'state': state})
+
+
+    def _finish(self, state, reservation=None):
+        self._set_state(state)
+        self._done.set_result(reservation)
+
+
+    def done(self):
+        '''Returns `True` if this reservation reached a final state, `False` otherwise. Does not block.'''
+        return self._done.done()
+
+
+    def wait(self, timeout=None):
+        '''Waits until this reservation reaches a final state.
+        Args:
+            timeout (optional float): Maximal number of seconds to wait. If `None`, waits forever.
+
+        Returns:
+            `True` if the reservation reached a final state, `False` if we timed out.'''
+        done, _ = concurrent.futures.wait([self._done], timeout=timeout)
+        return bool(done)
+
+
+    def result(self, timeout=None):
+        '''Waits for the reservation and returns it.
+        Args:
+            timeout (optional float): Maximal number of seconds to wait. If `None`, waits forever.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the reservation did not reach a final state in time. The reservation keeps running.
+
+        Returns:
+            `metareserve.Reservation` if the reservation became ready, `None` otherwise.'''
+        return self._done.result(timeout=timeout)
+
+
+    def __str__(self):
+        return 'GENIReservationHandle(slice={}, location={}, state={})'.format(self.slicename, self.location, self.state)
+
+
 
 class GENIReservationInterface(_BaseInterface):
+    '''Reserves GENI nodes without blocking.
+    All reservations run on a single background event loop thread. Every in-flight allocation gets its own python2 process, so cancelling one does not disturb the others.
+    Args:
+        max_concurrent (optional int): Maximal number of allocations in flight at once. Further reservations wait in state "queued".
+        timeout (optional float): Default maximal number of seconds an allocation may take, after leaving the queue. If `None`, allocations may take forever.
+        retry_policy (optional RetryPolicy): How to retry failing GENI calls. Defaults to the policy set with `py2bridge.set_retry_policy`.'''
+    def __init__(self, max_concurrent=8, timeout=None, retry_policy=None):
+        super().__init__()
+        if max_concurrent < 1:
+            raise ValueError('Need to allow at least 1 concurrent reservation, found max_concurrent={}.'.format(max_concurrent))
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.retry_policy = retry_policy
+        self._lock = threading.Lock()
+        self._event_loop = None
+        self._semaphore = None # Created on the event loop thread, as older asyncio versions bind it to the loop that exists at creation time.
+        self._handles = []
+        atexit.register(self.shutdown)
+
+
+    def _get_loop(self):
+        '''Returns the background event loop, starting it first if needed.'''
+        with self._lock:
+            if not self._event_loop:
+                self._event_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._event_loop.run_forever, name='metareserve-geni-reservations', daemon=True).start()
+            return self._event_loop
+
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+
+
+    async def _allocate(self, handle):
+        if handle.schedule:
+            handle._set_state('scheduled')
+            handle._task = asyncio.ensure_future(_scheduler.wait_until(handle.schedule.submit))
+            try:
+                await handle._task
+            except asyncio.CancelledError:
+                handle._finish('cancelled')
+                return
+            finally:
+                handle._task = None
+            handle._set_state('queued')
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self._semaphore:
+            if handle._cancelled: # Cancelled while queued.
+                return
+            handle._set_state('allocating')
+            if handle.schedule:
+                expiration_date = handle.schedule.expiration()
+                handle.expiration = _scheduler.minutes_until(expiration_date)
+            allocation = _py2bridge.allocate_async(handle.expiration, handle.request, callback=handle._feed, retry_policy=self.retry_policy)
+            handle._task = asyncio.ensure_future(asyncio.wait_for(allocation, handle.timeout))
+            try:
+                nodes = await handle._task
+            except asyncio.CancelledError:
+                handle._finish('cancelled')
+                return
+            except asyncio.TimeoutError: # `wait_for` cancelled the allocation, which deallocated its sliver.
+                printe('Reservation for slice "{}" at {} did not finish within {} seconds.'.format(handle.slicename, handle.location, handle.timeout))
+                handle._finish('timed out')
+                return
+            except Exception as e:
+                printe('Reservation for slice "{}" at {} raised {}: {}'.format(handle.slicename, handle.location, type(e).__name__, e))
+                handle._finish('failed')
+                return
+            finally:
+                handle._task = None
+        if not nodes:
+            handle._finish('failed')
+            return
+        handle._finish('ready', metareserve.Reservation(nodes))
+        if handle.schedule:
+            handle._task = asyncio.ensure_future(_scheduler.hold(handle.request, handle.schedule, expiration_date, callback=handle._feed, retry_policy=self.retry_policy))
+            try:
+                if await handle._task:
+                    handle._set_state('expired')
+            except asyncio.CancelledError: # `stopReservation` took over.
+                pass
+            finally:
+                handle._task = None
+
 
-    def reserve(reservation_request):
+    def _cancel(self, handle):
+        '''Cancels given reservation. Must run on the event loop thread.'''
+        handle._cancelled = True
+        if handle._task:
+            handle._task.cancel()
+        elif not handle.done(): # Still queued. Nothing to tear down.
+            handle._finish('cancelled')
+
+
+    async def _stop(self, handle):
+        if not handle.done():
+            self._cancel(handle)
+            await asyncio.wrap_future(handle._done)
+            return True
+        if handle.state != 'ready':
+            return True
+        if handle._task: # Stop holding the time slot.
+            handle._task.cancel()
+        status = await _py2bridge.deallocate_async(handle.slicename, handle.location, retry_policy=self.retry_policy)
+        if status:
+            handle._set_state('stopped')
+        return status
+
+
+    def _find(self, reservation):
+        if isinstance(reservation, GENIReservationHandle):
+            return reservation
+        with self._lock:
+            found = next((x for x in self._handles if x.done() and x.result() is reservation), None)
+        if not found:
+            raise ValueError('Can only stop reservations made by this interface. Found "{}".'.format(type(reservation)))
+        return found
+
+
+    def reserve(self, reservation_request, timeout=None, callback=None):
         '''Perform a reservation, as specified by the reservation request.
-        Must return immediately without blocking.
-        Time-consuming reservation systems should use a separate thread for reservation logic.
+        Returns immediately without blocking. The reservation runs in the background.
         Args:
-            reservationRequest (ReservationRequest): Object containing request information.
+            reservation_request (GENIReservationRequest or GENITimeSlotReservationRequest): Object containing request information.
+                                                                                         For time-slot requests, we request the sliver ahead of the start time, so nodes are ready when the slot starts.
+            timeout (optional float): Maximal number of seconds the allocation may take, after leaving the queue. Defaults to the timeout of this interface.
+                                      On timeout, we kill the python2 process and deallocate the sliver.
+            callback (optional function): If set, registered as progress callback. See `GENIReservationHandle.add_progress_callback`.
+
+        Raises:
+            ValueError: If the request has an unsupported type, or its time slot ended already.
 
         Returns:
-            ReservationWait object.'''
-        if (not isinstance(reservation_request, GENIReservationRequest)) and not isinstance(reservation_request, GENITimeSlotReservationRequest):
+            `GENIReservationHandle` to follow, wait for, or cancel the reservation.'''
+        if isinstance(reservation_request, GENITimeSlotReservationRequest):
+            handle = GENIReservationHandle(reservation_request, None, timeout if timeout != None else self.timeout, _scheduler.plan(reservation_request))
+        elif isinstance(reservation_request, GENIReservationRequest):
+            handle = GENIReservationHandle(reservation_request, reservation_request.duration_minutes, timeout if timeout != None else self.timeout)
+        else:
             raise ValueError('Need a GENIReservationRequest or GENITimeSlotReservationRequest to reserve. Found "{}".'.format(type(reservation_request)))
-        expiration = reservation_request.duration_minutes if isinstance(reservation_request, GENIReservationRequest) else reservation_request.duration_end
-        return _ReservationWait(_py2bridge.allocate, expiration, reservation_request)
+        if callback:
+            handle.add_progress_callback(callback)
+        with self._lock:
+            self._handles = [x for x in self._handles if not x.state in ('stopped', 'expired')]
+            self._handles.append(handle)
+        self._submit(self._allocate(handle))
+        return handle
 
 
-    def stopReservation(reservation):
+    def stopReservation(self, reservation):
         '''Stops a reservation.
-        Must return immediately without blocking.
-        Time-consuming reservation systems should use a separate thread for reservation logic.
+        Returns immediately without blocking. If the reservation is still queued or allocating, we cancel it: its python2 process is killed, and its (partially created) sliver deallocated.
+        If the reservation is ready, we deallocate its sliver.
         Args:
-            reservation (Reservation): Object containing reservation.
+            reservation (GENIReservationHandle or metareserve.Reservation): Handle returned by `reserve`, or the reservation it produced.
 
         Returns:
-            Nothing.'''
-        pass
\ No newline at end of file
+            `concurrent.futures.Future`, resolving to `True` once the reservation is stopped, `False` if deallocation failed.'''
+        return self._submit(self._stop(self._find(reservation)))
+
+
+    @property
+    def reservations(self):
+        '''List of `GENIReservationHandle` for all reservations made by this interface that are not stopped or expired.'''
+        with self._lock:
+            return [x for x in self._handles if not x.state in ('stopped', 'expired')]
+
+
+    def shutdown(self, cancel=True):
+        '''Stops the background event loop. Reservations that became ready stay allocated until they expire. Time-slot reservations are no longer renewed.
+        Args:
+            cancel (optional bool): If set, cancels all queued and in-flight reservations (deallocating their slivers) first. Otherwise, waits for them to finish.'''
+        with self._lock:
+            loop = self._event_loop
+            handles = list(self._handles)
+        if not loop:
+            return
+        pending = [x for x in handles if not x.done()]
+        if cancel:
+            for handle in pending:
+                loop.call_soon_threadsafe(self._cancel, handle)
+        concurrent.futures.wait([x._done for x in pending])
+        loop.call_soon_threadsafe(loop.stop)
+        with self._lock:
+            self._event_loop = None
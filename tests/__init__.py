@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules of this project import each other as top-level packages (e.g. `internal.gni.ledger`), relative to the package directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'metareserve_geni'))
@@ -0,0 +1 @@
+collect_ignore = ['py2'] # Python2 tests, see README.
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Python2 modules of this project import each other relative to the py2 and shared directories (e.g. `alloc.retry`, `retrypolicy`).
+_gni = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'metareserve_geni', 'internal', 'gni')
+sys.path[:0] = [os.path.join(_gni, 'py2'), os.path.join(_gni, 'shared')]
+
+
+def load_tests(loader, tests, pattern):
+    '''Keeps `unittest discover tests` (python3) out of this package. Python2 runs it directly, see README.'''
+    return tests
@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+import unittest
+
+import tests.py2
+import adsnapshot
+import manifest.advertisement as advertisement
+
+
+_advertisement = '''<?xml version="1.0" encoding="UTF-8"?>
+<rspec xmlns="http://www.geni.net/resources/rspec/3" xmlns:emulab="http://www.protogeni.net/resources/rspec/ext/emulab/1" type="advertisement">
+  <!-- Comments have no string tag. -->
+  <node component_id="urn:publicid:IDN+utah.cloudlab.us+node+ms0001" component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" exclusive="true">
+    <hardware_type name="m510"><emulab:node_type type_slots="1"/></hardware_type>
+    <hardware_type name="pc"/>
+    <available now="true"/>
+  </node>
+  <node component_id="urn:publicid:IDN+utah.cloudlab.us+node+ms0002" component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" exclusive="true">
+    <hardware_type name="m510"><emulab:node_type type_slots="1"/></hardware_type>
+    <available now="true"/>
+  </node>
+  <node component_id="urn:publicid:IDN+utah.cloudlab.us+node+ms0003" component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" exclusive="true">
+    <hardware_type name="m510"><emulab:node_type type_slots="1"/></hardware_type>
+    <available now="false"/>
+  </node>
+  <node component_id="urn:publicid:IDN+utah.cloudlab.us+node+pcvm1" component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" exclusive="false">
+    <hardware_type name="m510"><emulab:node_type type_slots="10"/></hardware_type>
+    <available now="true"/>
+  </node>
+  <node component_id="urn:publicid:IDN+utah.cloudlab.us+node+hp001" component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" exclusive="true">
+    <hardware_type name="d6515"><emulab:node_type type_slots="1"/></hardware_type>
+    <hardware_type name="d6515-gpu"><emulab:node_type type_slots="1"/></hardware_type>
+    <available now="true"/>
+  </node>
+  <link component_id="urn:publicid:IDN+utah.cloudlab.us+link+link-ms0001:eth1"/>
+</rspec>
+'''
+
+
+def _summary(records):
+    return [(x.name, x.hw_types, x.available, x.exclusive, x.site) for x in records]
+
+
+class RecordsTest(unittest.TestCase):
+    def test_records(self):
+        self.assertEqual(_summary(advertisement.records(_advertisement, 'cl-utah')), [
+            ('ms0001', ['m510'], True, True, 'cl-utah'), # Types without slots do not count.
+            ('ms0002', ['m510'], True, True, 'cl-utah'),
+            ('ms0003', ['m510'], False, True, 'cl-utah'),
+            ('pcvm1', ['m510'], True, False, 'cl-utah'),
+            ('hp001', ['d6515', 'd6515-gpu'], True, True, 'cl-utah')])
+
+
+    def test_index(self):
+        self.assertEqual(adsnapshot.index(advertisement.records(_advertisement, 'cl-utah')), {'m510': 2, 'd6515': 1, 'd6515-gpu': 1})
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_round_trip(self):
+        self.assertEqual(adsnapshot.write(self.directory, 'cl-utah', advertisement.records(_advertisement, 'cl-utah')), 5)
+        stored = adsnapshot.Snapshot(adsnapshot.path(self.directory, 'cl-utah'))
+        self.assertEqual(stored.site, 'cl-utah')
+        self.assertEqual(_summary(stored.records()), _summary(advertisement.records(_advertisement, 'cl-utah')))
+        self.assertEqual(stored.index(), {'m510': 2, 'd6515': 1, 'd6515-gpu': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
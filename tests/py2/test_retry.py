@@ -0,0 +1,127 @@
+import socket
+import unittest
+
+import tests.py2
+import alloc.retry as retry
+from retrypolicy import RetryPolicy
+
+
+class _Clock(object):
+    '''Stand-in for the `time` module. Sleeping advances the clock instantly.'''
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _Calls(object):
+    '''Callable raising given exceptions in order, then returning "ok".'''
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+class RunTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self._time = retry.time
+        retry.time = self.clock
+        retry._circuits.clear()
+        self.policy = RetryPolicy(retries=10, base_sleep=1, jitter=0, deadline=1000, breaker_threshold=3, breaker_reset=60)
+
+    def tearDown(self):
+        retry.time = self._time
+        retry._circuits.clear()
+
+
+    def _run(self, func):
+        return retry.run(func, retry.is_transient, 'agg', self.policy, 'Test call')
+
+
+    def _circuit(self):
+        circuit = retry._circuits['agg']
+        return (circuit.failures, circuit.opened_at)
+
+
+    def test_retries_transient(self):
+        func = _Calls(socket.error('down'), socket.error('down'))
+        self.assertEqual(self._run(func), 'ok')
+        self.assertEqual((func.count, self.clock.sleeps), (3, [1.0, 2.0]))
+        self.assertEqual(self._circuit(), (0, None))
+
+
+    def test_opens(self):
+        func = _Calls(*[socket.error('down')]*10)
+        self.assertRaises(socket.error, self._run, func)
+        self.assertEqual(func.count, 3) # Gave up once the circuit opened, with attempts left.
+        self.assertEqual(self._circuit(), (3, self.clock.now))
+
+        func = _Calls()
+        self.assertRaises(retry.CircuitOpenError, self._run, func)
+        self.assertEqual(func.count, 0)
+
+
+    def test_half_open_closes(self):
+        self.assertRaises(socket.error, self._run, _Calls(*[socket.error('down')]*10))
+        self.clock.now += 59
+        self.assertRaises(retry.CircuitOpenError, self._run, _Calls())
+        self.clock.now += 1
+        func = _Calls()
+        self.assertEqual(self._run(func), 'ok')
+        self.assertEqual(func.count, 1)
+        self.assertEqual(self._circuit(), (0, None))
+
+
+    def test_half_open_reopens(self):
+        self.assertRaises(socket.error, self._run, _Calls(*[socket.error('down')]*10))
+        self.clock.now += 60
+        func = _Calls(*[socket.error('down')]*10)
+        self.assertRaises(socket.error, self._run, func)
+        self.assertEqual(func.count, 1) # A single failing trial call re-opens the circuit.
+        self.assertEqual(self._circuit(), (3, self.clock.now))
+
+
+    def test_non_retryable_keeps_state(self):
+        self.assertEqual(self._run(_Calls(socket.error('down'), socket.error('down'))), 'ok')
+        retry._circuits['agg'].failures = 2
+        func = _Calls(ValueError('bad request'))
+        self.assertRaises(ValueError, self._run, func)
+        self.assertEqual(func.count, 1)
+        self.assertEqual(self._circuit(), (2, None))
+
+        self.assertRaises(socket.error, self._run, _Calls(*[socket.error('down')]*10))
+        self.clock.now += 60
+        self.assertRaises(ValueError, self._run, _Calls(ValueError('bad request'))) # Trial call of a half-open circuit.
+        self.assertEqual(self._circuit(), (2, None))
+        self.assertRaises(socket.error, self._run, _Calls(*[socket.error('down')]*10))
+        self.assertEqual(self._circuit(), (3, self.clock.now)) # Not counted as success: next failure re-opens.
+
+
+    def test_deadline(self):
+        self.policy = RetryPolicy(retries=10, base_sleep=4, factor=2, jitter=0, deadline=10, breaker_threshold=100)
+        func = _Calls(*[socket.error('down')]*10)
+        self.assertRaises(socket.error, self._run, func)
+        self.assertEqual((func.count, self.clock.sleeps), (2, [4.0])) # Sleeping 8 more seconds would exceed the deadline.
+
+
+    def test_attempts(self):
+        self.policy = RetryPolicy(retries=3, base_sleep=1, jitter=0, breaker_threshold=100)
+        func = _Calls(*[socket.error('down')]*10)
+        self.assertRaises(socket.error, self._run, func)
+        self.assertEqual((func.count, len(self.clock.sleeps)), (3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
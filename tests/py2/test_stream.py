@@ -0,0 +1,100 @@
+import unittest
+
+import tests.py2
+import manifest.stream as stream
+from manifest.manifest import Manifest
+
+
+_manifest = '''<?xml version="1.0" encoding="UTF-8"?>
+<rspec xmlns="http://www.geni.net/resources/rspec/3" xmlns:emulab="http://www.protogeni.net/resources/rspec/ext/emulab/1" type="manifest" expires="2030-01-01T12:00:00Z">
+  <!-- Comments have no string tag. -->
+  <node client_id="server0" component_id="urn:publicid:IDN+utah.cloudlab.us+node+ms0001" component_manager_id="urn:publicid:IDN+utah.cloudlab.us+authority+cm" exclusive="true">
+    <sliver_type name="raw-pc"><disk_image name="urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD"/></sliver_type>
+    <hardware_type name="m510"/>
+    <interface client_id="server0:if0" mac_address="0123456789ab">
+      <ip address="10.0.0.1" type="ipv4" netmask="255.255.252.0"/>
+    </interface>
+    <services><login authentication="ssh-keys" hostname="ms0001.utah.cloudlab.us" port="22" username="someuser"/></services>
+    <host name="server0.slice.project.utah.cloudlab.us" ipv4="128.110.0.1"/>
+  </node>
+  <node client_id="client0" component_id="urn:publicid:IDN+clemson.cloudlab.us+node+clnode010" component_manager_id="urn:publicid:IDN+clemson.cloudlab.us+authority+cm" exclusive="true">
+    <sliver_type name="raw-pc"/>
+    <interface client_id="client0:if0" mac_address="0123456789ac">
+      <ip address="10.0.1.7" type="ipv4" netmask="255.255.252.0"/>
+    </interface>
+    <services>
+      <login authentication="ssh-keys" hostname="clnode010.clemson.cloudlab.us" port="2222" username="someuser"/>
+      <login authentication="ssh-keys" hostname="clnode010.clemson.cloudlab.us" port="22" username="otheruser"/>
+    </services>
+    <emulab:vnode name="clnode010" hardware_type="c6525-25g"/>
+    <host name="client0.slice.project.clemson.cloudlab.us" ipv4="130.127.133.10"/>
+  </node>
+  <link client_id="lan0">
+    <interface_ref client_id="server0:if0"/>
+    <interface_ref client_id="client0:if0"/>
+  </link>
+</rspec>
+'''
+
+
+def _legacy(text):
+    '''Connect info as the previous parser (`xmltodict` to nested dicts) produced it. It only handled nodes with a single login.'''
+    import xmltodict
+    nodes = xmltodict.parse(text)['rspec']['node']
+    return [(str(x['@client_id']), str(x['services']['login']['@username']), str(x['interface']['ip']['@address']), str(x['host']['@ipv4']), int(x['services']['login']['@port'])) for x in nodes]
+
+
+class ParseTest(unittest.TestCase):
+    def test_nodes(self):
+        expires, records = stream.parse(_manifest)
+        self.assertEqual(expires, '2030-01-01T12:00:00Z')
+        self.assertEqual([(x.name, x.hw_type, x.component_id, x.image) for x in records], [
+            ('server0', 'm510', 'urn:publicid:IDN+utah.cloudlab.us+node+ms0001', 'urn:publicid:IDN+emulab.net+image+emulab-ops//UBUNTU20-64-STD'),
+            ('client0', 'c6525-25g', 'urn:publicid:IDN+clemson.cloudlab.us+node+clnode010', None)])
+
+
+    def test_addresses(self):
+        _, records = stream.parse(_manifest)
+        self.assertEqual([(x.ip_local, x.ip_public, x.subnet, x.lan) for x in records], [
+            ('10.0.0.1', '128.110.0.1', '10.0.0.0/22', 'lan0'),
+            ('10.0.1.7', '130.127.133.10', '10.0.0.0/22', 'lan0')])
+
+
+    def test_logins(self):
+        _, records = stream.parse(_manifest)
+        self.assertEqual([(x.user, x.port) for x in records], [('someuser', 22), ('someuser', 2222)]) # First login wins.
+
+
+    def test_legacy(self):
+        text = _manifest.replace('      <login authentication="ssh-keys" hostname="clnode010.clemson.cloudlab.us" port="22" username="otheruser"/>\n', '')
+        infos = Manifest(text).get_connect_info()
+        self.assertEqual([(x.name, x.user, x.ip_local, x.ip_public, x.port) for x in infos], _legacy(text))
+        self.assertEqual([str(x) for x in infos], ['server0|someuser|10.0.0.1|128.110.0.1|22|10.0.0.0/22', 'client0|someuser|10.0.1.7|130.127.133.10|2222|10.0.0.0/22'])
+
+
+    def test_missing_expiration(self):
+        text = _manifest.replace(' expires="2030-01-01T12:00:00Z"', '')
+        expires, records = stream.parse(text)
+        self.assertEqual((expires, len(records)), (None, 2))
+
+
+    def test_expiration(self):
+        manifest = Manifest(_manifest)
+        self.assertEqual((manifest.expiration.isoformat(), len(manifest)), ('2030-01-01T12:00:00', 2))
+
+
+    def test_without_interface(self):
+        text = _manifest.replace('<interface client_id="client0:if0" mac_address="0123456789ac">\n      <ip address="10.0.1.7" type="ipv4" netmask="255.255.252.0"/>\n    </interface>', '')
+        _, records = stream.parse(text)
+        self.assertEqual((records[1].ip_local, records[1].subnet, records[1].lan), ('', None, None))
+        self.assertEqual(records[0].lan, 'lan0')
+
+
+    def test_file(self):
+        from io import BytesIO
+        expires, records = stream.parse(BytesIO(_manifest.encode('utf-8')))
+        self.assertEqual((expires, [x.name for x in records]), ('2030-01-01T12:00:00Z', ['server0', 'client0']))
+
+
+if __name__ == '__main__':
+    unittest.main()
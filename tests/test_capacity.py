@@ -0,0 +1,136 @@
+import datetime
+import gzip
+import os
+import tempfile
+import unittest
+
+import tests
+import internal.gni.capacity as capacity
+import internal.gni.shared.adsnapshot as adsnapshot
+import internal.util.location as loc
+from internal.gni.shared.adsnapshot import AdRecord
+from reservation import GENINode, GENINodeRange, GENIReservationProfile
+
+
+def _records(site='cl-utah'):
+    return [
+        AdRecord('urn:publicid:IDN+utah.cloudlab.us+node+ms0001', ['m510'], True, True, site),
+        AdRecord('urn:publicid:IDN+utah.cloudlab.us+node+ms0002', ['m510'], False, True, site),
+        AdRecord('urn:publicid:IDN+utah.cloudlab.us+node+pcvm1', ['m510'], True, False, site),
+        AdRecord('urn:publicid:IDN+utah.cloudlab.us+node+hp001', ['d6515', 'd6515-gpu'], True, True, site)]
+
+
+def _summary(records):
+    return [(x.name, x.hw_types, x.available, x.exclusive, x.site) for x in records]
+
+
+class DemandTest(unittest.TestCase):
+    def test_demand(self):
+        profile = GENIReservationProfile()
+        profile.add(GENINodeRange('node[0-199]', 'm510', 'img'))
+        profile.add(GENINode('gpu0', 'd6515', 'img'))
+        profile.add(GENINode('node200', 'm510', 'img'))
+        self.assertEqual(capacity.demand(profile), {'m510': 201, 'd6515': 1})
+
+
+    def test_shortfall(self):
+        site = capacity.SiteCapacity('cl-utah', {'m510': 150, 'd6515': 2}, datetime.datetime.now())
+        self.assertEqual(site.shortfall({'m510': 201, 'd6515': 1, 'c6525-25g': 3}), {'m510': 51, 'c6525-25g': 3})
+        self.assertEqual(site.shortfall({'m510': 150}), {})
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def test_round_trip(self):
+        fetched = datetime.datetime(2030, 1, 1, 12, 0, 0)
+        self.assertEqual(adsnapshot.write(self.directory.name, 'cl-utah', iter(_records()), fetched), 4)
+        stored = adsnapshot.Snapshot(adsnapshot.path(self.directory.name, 'cl-utah'))
+        self.assertEqual((stored.site, stored.fetched), ('cl-utah', fetched))
+        self.assertEqual(_summary(stored.records()), _summary(_records()))
+        self.assertEqual(stored.index(), adsnapshot.index(_records()))
+        self.assertEqual(stored.index(), {'m510': 1, 'd6515': 1, 'd6515-gpu': 1})
+
+
+    def test_replace(self):
+        adsnapshot.write(self.directory.name, 'cl-utah', _records())
+        adsnapshot.write(self.directory.name, 'cl-utah', _records()[:1])
+        self.assertEqual(len(list(adsnapshot.Snapshot(adsnapshot.path(self.directory.name, 'cl-utah')).records())), 1)
+        self.assertEqual(os.listdir(self.directory.name), ['cl-utah.snapshot.gz']) # No temporary files left.
+
+
+    def test_failed_write(self):
+        def _broken():
+            yield _records()[0]
+            raise ValueError('malformed advertisement')
+        adsnapshot.write(self.directory.name, 'cl-utah', _records())
+        with self.assertRaises(ValueError):
+            adsnapshot.write(self.directory.name, 'cl-utah', _broken())
+        self.assertEqual(len(list(adsnapshot.Snapshot(adsnapshot.path(self.directory.name, 'cl-utah')).records())), 4) # Earlier snapshot survives.
+        self.assertEqual(os.listdir(self.directory.name), ['cl-utah.snapshot.gz'])
+
+
+    def test_not_a_snapshot(self):
+        path = adsnapshot.path(self.directory.name, 'cl-utah')
+        with gzip.open(path, 'wb') as f:
+            f.write(b'<rspec/>\n')
+        with self.assertRaises(ValueError):
+            adsnapshot.Snapshot(path)
+
+
+class IndexTest(unittest.TestCase):
+    '''Availability index cache, with the python2 side replaced by a stand-in.'''
+    def setUp(self):
+        self.home = tempfile.TemporaryDirectory()
+        self.env_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home.name
+        self.bridge_capacity = capacity._py2bridge.capacity
+        self.fetches = []
+        capacity._py2bridge.capacity = self._capacity
+
+    def tearDown(self):
+        capacity._py2bridge.capacity = self.bridge_capacity
+        os.environ['HOME'] = self.env_home
+        self.home.cleanup()
+
+
+    def _capacity(self, locations, callback=None, retry_policy=None):
+        self.fetches.append(list(locations))
+        answers = {'cl-utah': {'m510': 3}, 'cl-clemson': {'c6525-25g': 5}}
+        for location in locations:
+            if location in answers:
+                adsnapshot.write(loc.advertisementdir(), location, _records(location)) # Like the python2 side does while parsing.
+        return dict((x, answers[x]) for x in locations if x in answers)
+
+
+    def test_cache(self):
+        sites = capacity.get(['cl-utah', 'apt'])
+        self.assertEqual((sites['cl-utah'].free, sites['apt']), ({'m510': 3}, None))
+        sites = capacity.get(['cl-utah', 'cl-clemson'])
+        self.assertEqual(dict((x, y.free) for x, y in sites.items()), {'cl-utah': {'m510': 3}, 'cl-clemson': {'c6525-25g': 5}})
+        self.assertEqual(self.fetches, [['cl-utah', 'apt'], ['cl-clemson']]) # Stored index of cl-utah is fresh enough.
+        capacity.get(['cl-utah'], max_age=0)
+        self.assertEqual(self.fetches[-1], ['cl-utah'])
+
+
+    def test_load_store(self):
+        capacity.get(['cl-utah', 'cl-clemson'])
+        loaded = capacity._load()
+        self.assertEqual(dict((x, y.free) for x, y in loaded.items()), {'cl-utah': {'m510': 3}, 'cl-clemson': {'c6525-25g': 5}})
+        self.assertLess(loaded['cl-utah'].age, 60)
+
+
+    def test_available_nodes(self):
+        self.assertEqual([x.name for x in capacity.available_nodes('cl-utah')], ['ms0001', 'hp001'])
+        self.assertEqual([x.name for x in capacity.available_nodes('cl-utah', hw_types=['d6515-gpu'])], ['hp001'])
+        self.assertEqual(len(self.fetches), 1) # Second query answered from the stored snapshot.
+        self.assertEqual(capacity.available_nodes('apt'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
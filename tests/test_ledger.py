@@ -0,0 +1,59 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+import tests
+import internal.gni.ledger as ledger
+import internal.gni.py2bridge as py2bridge
+
+
+class _Result(object):
+    '''Stand-in for `py2bridge._Result` after an allocation.'''
+    def __init__(self, expiration):
+        self.manifest = {'expiration': expiration, 'location': 'cl-utah'}
+        self.infos = ['node0|10.0.0.1|1.2.3.4|22|user']
+
+
+class LedgerClockTest(unittest.TestCase):
+    '''Manifests report expiration dates in UTC. The ledger stores and compares local time.'''
+    def setUp(self):
+        self.env = dict((x, os.environ.get(x)) for x in ('HOME', 'TZ'))
+        self.home = tempfile.TemporaryDirectory()
+        os.environ['HOME'] = self.home.name
+        os.environ['TZ'] = 'EST+05' # Fixed UTC-5, no daylight saving time.
+        time.tzset()
+
+
+    def tearDown(self):
+        for key, value in self.env.items():
+            if value == None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        time.tzset()
+        self.home.cleanup()
+
+
+    def test_local_date(self):
+        self.assertEqual(py2bridge._local_date('2030-01-01T12:00:00'), datetime.datetime(2030, 1, 1, 7, 0, 0))
+
+
+    def test_record_manifest_expiration(self):
+        utc = datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+        py2bridge._record(_Result(utc.strftime('%Y-%m-%dT%H:%M:%S')), 'slice', 'cl-utah')
+        entry = ledger.get('slice', 'cl-utah')
+        self.assertNotEqual(entry, None)
+        self.assertLess(abs((entry.expiration - (datetime.datetime.now() + datetime.timedelta(hours=2))).total_seconds()), 5)
+
+
+    def test_expired_manifest_expiration(self):
+        utc = datetime.datetime.utcnow() - datetime.timedelta(hours=2) # Would look 3 hours in the future if read as local time.
+        py2bridge._record(_Result(utc.strftime('%Y-%m-%dT%H:%M:%S')), 'slice', 'cl-utah')
+        self.assertEqual(ledger.get('slice', 'cl-utah'), None)
+        self.assertTrue(ledger.entries()[0].expired)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+import tests
+import internal.gni.shared.noderange as noderange
+
+
+class ExpandTest(unittest.TestCase):
+    cases = [ # (name, expanded names)
+        ('node0', ['node0']),
+        ('node[7]', ['node7']),
+        ('node[0-3]', ['node0', 'node1', 'node2', 'node3']),
+        ('node[0-1,5,8-9]', ['node0', 'node1', 'node5', 'node8', 'node9']),
+        ('node[08-11]', ['node08', 'node09', 'node10', 'node11']),
+        ('n[1-2]-worker', ['n1-worker', 'n2-worker']),
+    ]
+
+    def test_expand(self):
+        for name, names in self.cases:
+            with self.subTest(name=name):
+                self.assertEqual(list(noderange.expand(name)), names)
+                self.assertEqual(noderange.count(name), len(names))
+
+
+    def test_large_range(self):
+        names = list(noderange.expand('node[0-199]'))
+        self.assertEqual((len(names), names[0], names[-1]), (200, 'node0', 'node199'))
+        self.assertEqual(noderange.count('node[0-199]'), 200)
+        self.assertEqual(noderange.count('node[000-199]'), 200)
+        self.assertEqual(list(noderange.expand('node[000-199]'))[7], 'node007')
+
+
+class MalformedTest(unittest.TestCase):
+    cases = ['node[', 'node]', 'node[]', 'node[0-]', 'node[-3]', 'node[3-1]', 'node[1-2-3]', 'node[a-b]', 'node[0-1][2-3]', 'node[[0-1]]', 'node[0,,1]']
+
+    def test_malformed(self):
+        for name in self.cases:
+            with self.subTest(name=name):
+                with self.assertRaises(ValueError):
+                    noderange.validate(name)
+                with self.assertRaises(ValueError):
+                    noderange.count(name)
+
+
+    def test_plain_names(self):
+        for name in ('node0', 'master', 'a-b'):
+            with self.subTest(name=name):
+                noderange.validate(name)
+                self.assertFalse(noderange.is_range(name))
+
+
+class SplitTest(unittest.TestCase):
+    cases = [ # (name, amount, head, tail)
+        ('node[0-199]', 50, 'node[0-49]', 'node[50-199]'),
+        ('node[0-1]', 1, 'node[0]', 'node[1]'),
+        ('node[0-3,8,10-11]', 5, 'node[0-3,8]', 'node[10-11]'),
+        ('node[0-3,8,10-11]', 2, 'node[0-1]', 'node[2-3,8,10-11]'),
+        ('node[008-011]', 2, 'node[008-009]', 'node[010-011]'),
+    ]
+
+    def test_split(self):
+        for name, amount, head, tail in self.cases:
+            with self.subTest(name=name, amount=amount):
+                self.assertEqual(noderange.split(name, amount), (head, tail))
+
+
+    def test_round_trip(self):
+        for name, _, _, _ in self.cases:
+            for amount in range(1, noderange.count(name)):
+                with self.subTest(name=name, amount=amount):
+                    head, tail = noderange.split(name, amount)
+                    self.assertEqual(noderange.count(head), amount)
+                    self.assertEqual(list(noderange.expand(head))+list(noderange.expand(tail)), list(noderange.expand(name)))
+
+
+    def test_invalid_amount(self):
+        for amount in (0, 4, -1):
+            with self.subTest(amount=amount):
+                with self.assertRaises(ValueError):
+                    noderange.split('node[0-3]', amount)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import datetime
+import unittest
+
+import tests
+import internal.gni.placement as placement
+import internal.gni.shared.boottimes as boottimes
+from internal.gni.capacity import SiteCapacity
+from reservation import GENINode, GENINodeRange, GENIReservationProfile
+
+
+def _profile(*entries):
+    profile = GENIReservationProfile()
+    for entry in entries:
+        profile.add(entry)
+    return profile
+
+
+def _sites(**free):
+    '''Returns sites in keyword order (the order of preference), e.g. `_sites(utah={'m510': 4})`.'''
+    now = datetime.datetime.now()
+    return dict((name, SiteCapacity(name, counts, now) if counts != None else None) for name, counts in free.items())
+
+
+def _layout(chosen):
+    '''Returns a placement as `dict` mapping location to sorted (name, hw_type) pairs.'''
+    return dict((location, sorted((x.name, x.hw_type) for x in profile.entries)) for location, profile in chosen.profiles.items())
+
+
+_history = {boottimes._key('fast', 'm510'): [300], boottimes._key('slow', 'm510'): [1500]} # Seconds to get ready.
+
+
+class PlanTest(unittest.TestCase):
+    def test_one_site_fits(self):
+        chosen = placement.plan(_profile(GENINodeRange('node[0-3]', 'm510', 'img')), _sites(utah={'m510': 10}, clemson={'m510': 10}), history={})
+        self.assertEqual(_layout(chosen), {'utah': [('node[0-3]', 'm510')]}) # First site in order of preference.
+
+
+    def test_fewest_sites_first(self):
+        chosen = placement.plan(_profile(GENINodeRange('node[0-3]', 'm510', 'img')), _sites(slow={'m510': 4}, fast={'m510': 2}), history=_history)
+        self.assertEqual(chosen.locations, ['slow']) # One slow site beats two sites, even though the other site is faster.
+
+
+    def test_fastest_boot_time(self):
+        chosen = placement.plan(_profile(GENINodeRange('node[0-3]', 'm510', 'img')), _sites(slow={'m510': 4}, fast={'m510': 4}), history=_history)
+        self.assertEqual(chosen.locations, ['fast'])
+        self.assertEqual(chosen.boot_time, 300)
+
+
+    def test_split_across_sites(self):
+        profile = _profile(GENINodeRange('node[0-5]', 'c6525-25g', 'img'), GENINode('master', 'm510', 'img'))
+        chosen = placement.plan(profile, _sites(utah={'m510': 1, 'c6525-25g': 4}, clemson={'c6525-25g': 4}), history={})
+        self.assertEqual(_layout(chosen), {'utah': [('master', 'm510'), ('node[0-3]', 'c6525-25g')], 'clemson': [('node[4-5]', 'c6525-25g')]})
+
+
+    def test_max_sites_too_small(self):
+        profile = _profile(GENINodeRange('node[0-5]', 'c6525-25g', 'img'))
+        sites = _sites(utah={'c6525-25g': 4}, clemson={'c6525-25g': 4})
+        self.assertEqual(placement.plan(profile, sites, max_sites=1, history={}), None)
+        self.assertEqual(len(placement.plan(profile, sites, max_sites=2, history={}).locations), 2)
+
+
+    def test_not_enough_nodes(self):
+        self.assertEqual(placement.plan(_profile(GENINodeRange('node[0-5]', 'm510', 'img')), _sites(utah={'m510': 3}, clemson={'m510': 2}), history={}), None)
+
+
+    def test_unknown_sites_skipped(self):
+        chosen = placement.plan(_profile(GENINode('node0', 'm510', 'img')), _sites(utah=None, clemson={'m510': 1}), history={})
+        self.assertEqual(chosen.locations, ['clemson'])
+
+
+    def test_spares_once_per_group_per_site(self):
+        profile = _profile(GENINodeRange('node[0-5]', 'c6525-25g', 'img'), GENINode('master', 'm510', 'img'))
+        sites = _sites(utah={'m510': 3, 'c6525-25g': 6}, clemson={'c6525-25g': 4})
+        # Each site requests `spares` extra nodes for every (hw_type, image) group it gets.
+        self.assertEqual(_layout(placement.plan(profile, sites, history={}, spares=1)), {'utah': [('master', 'm510'), ('node[0-4]', 'c6525-25g')], 'clemson': [('node[5]', 'c6525-25g')]})
+        self.assertEqual(_layout(placement.plan(profile, sites, history={}, spares=2)), {'utah': [('master', 'm510'), ('node[0-3]', 'c6525-25g')], 'clemson': [('node[4-5]', 'c6525-25g')]})
+        self.assertEqual(placement.plan(profile, sites, history={}, spares=3), None) # utah has room for 1 master and 2 spares only.
+
+
+    def test_spares_per_image(self):
+        profile = _profile(GENINode('a', 'm510', 'img1'), GENINode('b', 'm510', 'img2'))
+        self.assertEqual(placement.plan(profile, _sites(utah={'m510': 3}), history={}, spares=1), None) # Two groups: 2 nodes and 2 spares.
+        self.assertEqual(placement.plan(profile, _sites(utah={'m510': 4}), history={}, spares=1).locations, ['utah'])
+
+
+class TakeTest(unittest.TestCase):
+    def test_take(self):
+        head, tail = placement._take(GENINodeRange('node[0-5]', 'm510', 'img'), 2)
+        self.assertEqual((head.name, tail.name, tail.hw_type, tail.image), ('node[0-1]', 'node[2-5]', 'm510', 'img'))
+
+
+    def test_take_all(self):
+        entry = GENINodeRange('node[0-5]', 'm510', 'img')
+        self.assertEqual(placement._take(entry, 6), (entry, None))
+        self.assertEqual(placement._take(entry, 10), (entry, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+import tests
+import internal.gni.ledger as ledger
+import internal.gni.py2bridge as py2bridge
+import internal.gni.renewd as renewd
+from internal.gni.ledger import LedgerEntry
+
+
+class _Result(object):
+    '''Stand-in for `py2bridge._Result` after an allocation.'''
+    def __init__(self, expiration):
+        self.manifest = {'expiration': expiration, 'location': 'cl-utah'}
+        self.infos = ['node0|10.0.0.1|1.2.3.4|22|user']
+
+
+class PlanTest(unittest.TestCase):
+    now = datetime.datetime(2030, 1, 1, 12, 0, 0)
+
+    def _entry(self, slicename, expiration):
+        return LedgerEntry(slicename, 'cl-utah', expiration, [], self.now)
+
+
+    def test_due(self):
+        expiration = self.now + datetime.timedelta(hours=10)
+        renewals = renewd.plan([self._entry('slice', expiration)], margin=120, jitter=15, now=self.now)
+        self.assertEqual(len(renewals), 1)
+        jitter = datetime.timedelta(seconds=renewd._jitter('slice', 'cl-utah', expiration, 15))
+        self.assertEqual(renewals[0].due, expiration - datetime.timedelta(minutes=120) - jitter)
+        self.assertTrue(datetime.timedelta(0) <= jitter <= datetime.timedelta(minutes=15))
+
+
+    def test_skips_expired(self):
+        entries = [self._entry('gone', self.now - datetime.timedelta(minutes=1)), self._entry('unknown', None), self._entry('slice', self.now + datetime.timedelta(hours=3))]
+        self.assertEqual([x.slicename for x in renewd.plan(entries, now=self.now)], ['slice'])
+
+
+    def test_sorted_by_due(self):
+        entries = [self._entry('late', self.now + datetime.timedelta(hours=9)), self._entry('early', self.now + datetime.timedelta(hours=4))]
+        self.assertEqual([x.slicename for x in renewd.plan(entries, now=self.now)], ['early', 'late'])
+
+
+class PlanClockTest(unittest.TestCase):
+    '''Reservations recorded from a manifest (UTC) must become due before they expire, on hosts west of UTC too.'''
+    def setUp(self):
+        self.env = dict((x, os.environ.get(x)) for x in ('HOME', 'TZ'))
+        self.home = tempfile.TemporaryDirectory()
+        os.environ['HOME'] = self.home.name
+        os.environ['TZ'] = 'BRT+03' # Fixed UTC-3, no daylight saving time.
+        time.tzset()
+
+
+    def tearDown(self):
+        for key, value in self.env.items():
+            if value == None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        time.tzset()
+        self.home.cleanup()
+
+
+    def test_due_before_expiration(self):
+        utc = datetime.datetime.utcnow() + datetime.timedelta(hours=4)
+        py2bridge._record(_Result(utc.strftime('%Y-%m-%dT%H:%M:%S')), 'slice', 'cl-utah')
+        renewals = renewd.plan(ledger.entries(), margin=120, jitter=15)
+        self.assertEqual(len(renewals), 1)
+        left = renewals[0].expiration - renewals[0].due
+        self.assertTrue(datetime.timedelta(minutes=120) <= left <= datetime.timedelta(minutes=135))
+        self.assertLess(abs((renewals[0].expiration - (datetime.datetime.now() + datetime.timedelta(hours=4))).total_seconds()), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
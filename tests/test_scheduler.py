@@ -0,0 +1,87 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+import tests
+import internal.gni.scheduler as scheduler
+import internal.gni.shared.boottimes as boottimes
+from reservation import GENINode, GENINodeRange, GENIReservationProfile, GENITimeSlotReservationRequest
+
+
+_now = datetime.datetime(2030, 1, 1, 12, 0, 0)
+
+
+def _request(start, end, location='cl-utah', *entries):
+    profile = GENIReservationProfile()
+    for entry in entries or (GENINodeRange('node[0-3]', 'm510', 'img'),):
+        profile.add(entry)
+    return GENITimeSlotReservationRequest(start, end, location, 'slice', profile)
+
+
+class PlanTest(unittest.TestCase):
+    def test_lead_from_history(self):
+        history = {boottimes._key('cl-utah', 'm510'): [500, 600, 700]}
+        schedule = scheduler.plan(_request(_now + datetime.timedelta(hours=5), _now + datetime.timedelta(hours=8)), now=_now, history=history)
+        self.assertEqual(schedule.boot_time, 600) # Median.
+        self.assertEqual(schedule.submit, _now + datetime.timedelta(hours=5, seconds=-(600*scheduler.boot_time_factor+scheduler.lead_margin)))
+
+
+    def test_slowest_type(self):
+        history = {boottimes._key('cl-utah', 'm510'): [300], boottimes._key('cl-utah', 'd6515'): [900]}
+        request = _request(_now + datetime.timedelta(hours=5), _now + datetime.timedelta(hours=8), 'cl-utah', GENINode('node0', 'm510', 'img'), GENINode('node1', 'd6515', 'img'))
+        self.assertEqual(scheduler.plan(request, now=_now, history=history).boot_time, 900)
+
+
+    def test_default_boot_time(self):
+        history = {boottimes._key('cl-clemson', 'm510'): [60]} # Other site.
+        schedule = scheduler.plan(_request(_now + datetime.timedelta(hours=5), _now + datetime.timedelta(hours=8)), now=_now, history=history)
+        self.assertEqual(schedule.boot_time, scheduler.default_boot_time)
+
+
+    def test_starts_soon(self):
+        schedule = scheduler.plan(_request(_now + datetime.timedelta(minutes=10), _now + datetime.timedelta(hours=1)), now=_now, history={})
+        self.assertEqual(schedule.submit, _now) # Too late to wait, submit right away.
+
+
+    def test_ended(self):
+        with self.assertRaises(ValueError):
+            scheduler.plan(_request(_now - datetime.timedelta(hours=2), _now), now=_now, history={})
+
+
+class ExpirationTest(unittest.TestCase):
+    def test_short_slot(self):
+        schedule = scheduler.Schedule(_now, _now, _now + datetime.timedelta(hours=3), 600)
+        self.assertEqual(schedule.expiration(now=_now), _now + datetime.timedelta(hours=3))
+
+
+    def test_clamped(self):
+        schedule = scheduler.Schedule(_now, _now, _now + datetime.timedelta(days=10), 600)
+        self.assertEqual(schedule.expiration(now=_now), _now + datetime.timedelta(minutes=scheduler.max_expiration))
+        later = _now + datetime.timedelta(days=9, hours=23)
+        self.assertEqual(schedule.expiration(now=later), schedule.end) # Last renewal reaches the end of the slot.
+
+
+class HistoryTest(unittest.TestCase):
+    '''python2 records boot times under `location_str(aggregate)`, the geni-lib aggregate name (e.g. "cl-utah"). python3 looks up the location users gave.'''
+    def setUp(self):
+        self.env_home = os.environ.get('HOME')
+        self.home = tempfile.TemporaryDirectory()
+        os.environ['HOME'] = self.home.name
+
+    def tearDown(self):
+        os.environ['HOME'] = self.env_home
+        self.home.cleanup()
+
+
+    def test_recorded_by_python2(self):
+        boottimes.record('cl-utah', [('m510', 420.0)])
+        for location in ('cl-utah', 'Cl-Utah', 'CL-UTAH'):
+            with self.subTest(location=location):
+                schedule = scheduler.plan(_request(_now + datetime.timedelta(hours=5), _now + datetime.timedelta(hours=8), location), now=_now)
+                self.assertEqual(schedule.boot_time, 420.0)
+                self.assertEqual(boottimes.expected(location, 'm510'), 420.0) # As `placement` looks it up.
+
+
+if __name__ == '__main__':
+    unittest.main()
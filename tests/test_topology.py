@@ -0,0 +1,117 @@
+import unittest
+
+import tests
+import internal.gni.shared.topology as topology
+from internal.gni.shared.topology import LanPlan, TopologyOptions
+
+
+class _Node(object):
+    def __init__(self, name, hw_type='m510'):
+        self.name = name
+        self.hw_type = hw_type
+
+
+class _Record(object):
+    '''Stand-in for `manifest.stream.NodeRecord`.'''
+    def __init__(self, name, ip_local, subnet, lan):
+        self.name = name
+        self.ip_local = ip_local
+        self.subnet = subnet
+        self.lan = lan
+
+
+def _nodes(amount, hw_type='m510'):
+    return [_Node('node{}'.format(x), hw_type) for x in range(amount)]
+
+
+def _summary(plans):
+    return [(x.name, '{}/{}'.format(x.network, x.prefix), len(x.members)) for x in plans]
+
+
+class PlanTest(unittest.TestCase):
+    def test_254_nodes(self):
+        plans = topology.plan(_nodes(254))
+        self.assertEqual(_summary(plans), [('lan', '192.168.1.0/24', 254)])
+        self.assertEqual((plans[0].members[0], plans[0].members[-1], plans[0].netmask), (('node0', '192.168.1.1'), ('node253', '192.168.1.254'), '255.255.255.0'))
+
+
+    def test_255_nodes(self):
+        plans = topology.plan(_nodes(255))
+        self.assertEqual(_summary(plans), [('lan', '10.0.0.0/23', 255)])
+        self.assertEqual((plans[0].members[0], plans[0].members[-1], plans[0].netmask), (('node0', '10.0.0.1'), ('node254', '10.0.0.255'), '255.255.254.0'))
+
+
+    def test_1000_nodes(self):
+        plans = topology.plan(_nodes(1000))
+        self.assertEqual(_summary(plans), [('lan', '10.0.0.0/22', 1000)])
+        self.assertEqual((plans[0].members[-1], plans[0].netmask), (('node999', '10.0.3.232'), '255.255.252.0'))
+        self.assertEqual(len(set(address for _, address in plans[0].members)), 1000)
+
+
+    def test_lan_size(self):
+        plans = topology.plan(_nodes(250), TopologyOptions(max_lan_size=100))
+        self.assertEqual(_summary(plans), [('lan-0', '10.0.0.0/24', 100), ('lan-1', '10.0.1.0/24', 100), ('lan-2', '10.0.2.0/24', 50)])
+        self.assertEqual((plans[1].members[0], plans[2].members[-1]), (('node100', '10.0.1.1'), ('node249', '10.0.2.50')))
+
+
+    def test_group_by_hw_type(self):
+        plans = topology.plan(_nodes(2, 'c6525-25g') + [_Node('m{}'.format(x)) for x in range(300)], TopologyOptions(group_by='hw_type'))
+        self.assertEqual(_summary(plans), [('lan-c6525-25g', '10.0.2.0/24', 2), ('lan-m510', '10.0.0.0/23', 300)]) # Largest block first, so blocks stay aligned.
+
+
+    def test_group_by_prefix(self):
+        plans = topology.plan([_Node('server1'), _Node('client1'), _Node('server2')], TopologyOptions(group_by='prefix'))
+        self.assertEqual(_summary(plans), [('lan-server', '10.0.0.0/24', 2), ('lan-client', '10.0.1.0/24', 1)])
+        self.assertEqual(plans[0].members, [('server1', '10.0.0.1'), ('server2', '10.0.0.2')])
+
+
+    def test_invalid_options(self):
+        for kwargs in ({'max_lan_size': 1}, {'group_by': 'rack'}, {'bandwidth': 0}):
+            with self.subTest(**kwargs):
+                with self.assertRaises(ValueError):
+                    TopologyOptions(**kwargs)
+
+
+class ExtendTest(unittest.TestCase):
+    def _existing(self, amount):
+        nodes = _nodes(amount)
+        return (nodes, topology.plan(nodes))
+
+
+    def test_keeps_addresses(self):
+        existing, lans = self._existing(2)
+        plans = topology.extend(lans, [_Node('node2'), _Node('node3')], existing)
+        self.assertEqual(_summary(plans), [('lan', '192.168.1.0/24', 4)])
+        self.assertEqual(plans[0].members, [('node0', '192.168.1.1'), ('node1', '192.168.1.2'), ('node2', '192.168.1.3'), ('node3', '192.168.1.4')])
+        self.assertEqual(len(lans[0].members), 2) # Input plan is not modified.
+
+
+    def test_fills_gaps(self):
+        existing = [_Node('node0'), _Node('node2')]
+        lans = [LanPlan('lan', '192.168.1.0', 24, [('node0', '192.168.1.1'), ('node2', '192.168.1.3')])]
+        plans = topology.extend(lans, [_Node('node1')], existing)
+        self.assertEqual(plans[0].members[-1], ('node1', '192.168.1.2'))
+
+
+    def test_full_lan(self):
+        existing, lans = self._existing(254)
+        plans = topology.extend(lans, [_Node('extra0'), _Node('extra1')], existing)
+        self.assertEqual(_summary(plans), [('lan', '192.168.1.0/24', 254), ('lan-1', '10.0.0.0/24', 2)])
+        self.assertEqual(plans[1].members, [('extra0', '10.0.0.1'), ('extra1', '10.0.0.2')])
+
+
+    def test_lan_size(self):
+        existing, lans = self._existing(3)
+        plans = topology.extend(lans, [_Node('node3')], existing, TopologyOptions(max_lan_size=3))
+        self.assertEqual(_summary(plans), [('lan', '192.168.1.0/24', 3), ('lan-1', '10.0.0.0/24', 1)])
+
+
+    def test_current(self):
+        records = [_Record('node0', '10.0.0.1', '10.0.0.0/23', 'lan'), _Record('node1', None, None, None), _Record('node2', '10.0.0.2', '10.0.0.0/23', 'lan')]
+        plans = topology.current(records)
+        self.assertEqual(_summary(plans), [('lan', '10.0.0.0/23', 2)])
+        self.assertEqual(plans[0].members, [('node0', '10.0.0.1'), ('node2', '10.0.0.2')])
+
+
+if __name__ == '__main__':
+    unittest.main()